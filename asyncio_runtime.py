@@ -0,0 +1,568 @@
+"""Asyncio runtime module.
+
+It runs watch, bells, function buttons, display and manual watch setup
+as asyncio tasks in one process, instead of five processes started
+by main module. Tasks communicate through local clock, local mailboxes
+and flags, there is no pickling and no process spawning.
+
+Blocking calls, journal writes and display transfers, run in small
+thread pool executor, so they do not stop the event loop. GPIO output
+calls are fast and they are made directly from tasks, handle motor
+pulses are timed by the event loop.
+"""
+
+import asyncio
+import collections
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional
+
+import hardware
+from bells import BellRingings, BellSchedule, bell_programs, record_ring
+from buttons import ButtonEvent, ButtonInput
+from channels import LocalDoorbell, LocalMailbox
+from clock import LocalClock
+from compositor import FLUSH_INTERVAL
+from display import Screen
+from function_buttons import FunctionButtons, get_program_states
+from function_buttons import buttons as function_button_pins
+from hardware import GPIO
+from journal import JOURNAL_FILE, MINUTE_HANDLE_NAME, MINUTES_ON_DIAL, Journal
+from manual_watch_setup import ManualWatchSetup
+from manual_watch_setup import input_pins as manual_watch_setup_pins
+from metrics import Metrics
+from overrides import OVERRIDES_FILE
+from schedule import ScheduleWatcher
+from utils import HOUSEKEEPING_INTERVAL, async_delay_until
+from watch import (
+    BOTH_HANDLES,
+    CATCH_UP_STEP_GAP,
+    CONCURRENT_CATCH_UP,
+    HANDLE_NAMES,
+    HOUR_HANDLE,
+    JOURNAL_SYNC_DELAY,
+    MARK_SYNCHRONIZED,
+    MINUTE_HANDLE,
+    MOVE,
+    SET_POSITION,
+    TickScheduler,
+    WatchController,
+    execute_handle_command,
+    handle_delay,
+    record_handle_move,
+)
+
+# Threads for blocking calls, one journal write
+# and one display transfer can run at the same time.
+HARDWARE_WORKERS = 2
+
+
+async def pulse_handles(handle) -> float:
+    """This function moves handle, or both handles, like move_*_handle functions.
+
+    Motors are turned on and each of them is turned off after its handle
+    delay, the delays are waited for without blocking the event loop.
+    It returns for how long motors were turned on.
+    """
+    pins = handle if handle == BOTH_HANDLES else (handle,)
+    print(f"-=- start moving: {HANDLE_NAMES[handle]} -=-")
+    for pin in pins:
+        GPIO.output(pin, GPIO.HIGH)
+    start_time = hardware.clock.monotonic()
+    for pin in sorted(pins, key=handle_delay):
+        await async_delay_until(start_time + handle_delay(pin))
+        GPIO.output(pin, GPIO.LOW)
+    on_time = hardware.clock.monotonic() - start_time
+    print(f"-=- stop moving: {HANDLE_NAMES[handle]} -=-")
+    return on_time
+
+
+class AsyncHandleMotors:
+    """This class moves handles and records moves in the journal.
+
+    It has the same interface as HandleMotors, but commands do not block,
+    every command returns future which is done when command is done.
+    Commands are executed one by one in order they were given. Journal
+    is written in executor thread while motor pulse runs on the event loop.
+    """
+
+    def __init__(self, executor: Executor, journal_path: str = JOURNAL_FILE) -> None:
+        self._executor = executor
+        self._journal = Journal(journal_path)
+        self._commands = asyncio.Queue()
+        self._metrics = Metrics("handle_motors")
+        # Time between move request and pulse start of the last move.
+        self.pulse_start_latency = 0.0
+
+    def start(self) -> asyncio.Task:
+        """
+        Recover watch state from the journal and start task which executes commands.
+        """
+        self._journal.recover()
+        return asyncio.create_task(self._execute_commands())
+
+    async def _execute_commands(self) -> None:
+        loop = asyncio.get_running_loop()
+        journal = self._journal
+        metrics = self._metrics
+        commands_depth = metrics.queue_depth("handle_commands")
+        while True:
+            metrics.loop_iterations.inc()
+            metrics.export()
+            # Sync the journal if there is no new command for a while.
+            timeout = JOURNAL_SYNC_DELAY if journal.unsynced else HOUSEKEEPING_INTERVAL
+            try:
+                command, argument, requested_at, done = await asyncio.wait_for(
+                    self._commands.get(), timeout
+                )
+            except asyncio.TimeoutError:
+                if journal.unsynced:
+                    await loop.run_in_executor(self._executor, journal.sync)
+                continue
+            commands_depth.set(self._commands.qsize())
+
+            if command == MOVE:
+                latency = await self._move(argument, requested_at)
+                self.pulse_start_latency = latency
+            else:
+                latency = await loop.run_in_executor(
+                    self._executor,
+                    execute_handle_command,
+                    journal,
+                    command,
+                    argument,
+                    requested_at,
+                )
+            done.set_result(latency)
+
+    async def _move(self, handle, requested_at: float) -> float:
+        loop = asyncio.get_running_loop()
+        journal = self._journal
+        journal.append_intent(HANDLE_NAMES[handle])
+        latency = hardware.clock.monotonic() - requested_at
+        # Make the intent durable while handle moves.
+        intent_synced = loop.run_in_executor(self._executor, journal.sync)
+        on_time = await pulse_handles(handle)
+        record_handle_move(self._metrics, handle, latency, on_time)
+        await intent_synced
+        await loop.run_in_executor(
+            self._executor, journal.append_commit, HANDLE_NAMES[handle]
+        )
+        return latency
+
+    def _send(self, command: str, argument) -> asyncio.Future:
+        done = asyncio.get_running_loop().create_future()
+        self._commands.put_nowait((command, argument, hardware.clock.monotonic(), done))
+        return done
+
+    def move(self, handle: int) -> asyncio.Future:
+        """
+        Request handle move, future result is pulse start latency.
+        """
+        return self._send(MOVE, handle)
+
+    def set_position(self, position: int) -> asyncio.Future:
+        """
+        Record watch position set by hand.
+        """
+        return self._send(SET_POSITION, position)
+
+    def mark_synchronized(self) -> asyncio.Future:
+        """
+        Record that handles are synchronized, even though minute handle moved last.
+        """
+        return self._send(MARK_SYNCHRONIZED, None)
+
+    def watch_position(self) -> int:
+        """
+        Get watch position, minute of 12 hours shown by handles.
+        """
+        return self._journal.state.position
+
+    def minute_handle_last_moved(self) -> bool:
+        """
+        This function checks if minute handle last moved.
+        """
+        return self._journal.state.last_moved == MINUTE_HANDLE_NAME
+
+    def handles_synchronized(self) -> bool:
+        """
+        This function checks if handles are synchronized,
+        see HandleMotors.handles_synchronized().
+        """
+        return not self.minute_handle_last_moved()
+
+
+class LocalEventInbox:
+    """
+    This class is subscriber which hands button events over to the event loop,
+    every event rings the local doorbell.
+    """
+
+    def __init__(self, doorbell: LocalDoorbell) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._doorbell = doorbell
+        self._events = collections.deque()
+
+    def __call__(self, event: ButtonEvent) -> None:
+        # Subscribers may be called from button input thread.
+        self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: ButtonEvent) -> None:
+        self._events.append(event)
+        self._doorbell.ring()
+
+    def depth(self) -> int:
+        """
+        Get number of events waiting to be read.
+        """
+        return len(self._events)
+
+    def get(self) -> Optional[ButtonEvent]:
+        """
+        Get the oldest event, None if there are no events.
+        """
+        if not self._events:
+            return None
+        return self._events.popleft()
+
+
+class Runtime:
+    """
+    This class holds clock, channels and flags which tasks share.
+    """
+
+    def __init__(self, executor: Executor) -> None:
+        self.executor = executor
+        self.clock = LocalClock()
+        # Mailboxes share doorbell with the clock, so display
+        # can wait for any of them.
+        self.watch_setup_mailbox = LocalMailbox(self.clock.doorbell)
+        self.ringing_mailbox = LocalMailbox(self.clock.doorbell)
+        self.manual_watch_setup_mailbox = LocalMailbox(self.clock.doorbell)
+        self.handle_motors = AsyncHandleMotors(executor)
+        # Program states for bells, sent on every program states change.
+        self.states_queue_for_bells = asyncio.Queue()
+        # Bell programs which should start ringing.
+        self.ring_queue = asyncio.Queue()
+        # Time between ring request and ringing start of the last program.
+        self.ring_start_latency = 0.0
+        # Flags which replace messages between processes.
+        self.manual_watch_setup = False
+        self.automatic_watch_setup = False
+        # Button events ring the same doorbell as the clock.
+        self.button_input = ButtonInput(
+            sorted(set(function_button_pins + manual_watch_setup_pins))
+        )
+        self.function_button_events = LocalEventInbox(self.clock.doorbell)
+        self.button_input.subscribe(self.function_button_events, function_button_pins)
+        self.manual_watch_setup_events = LocalEventInbox(self.clock.doorbell)
+        self.button_input.subscribe(
+            self.manual_watch_setup_events, manual_watch_setup_pins
+        )
+
+
+async def watch_setup(minutes: int, runtime: Runtime) -> None:
+    """
+    This function moves hour and minute handles as many times as the
+    watch is late (in minutes), see watch.watch_setup().
+    """
+    handle_motors = runtime.handle_motors
+
+    # First check if handles moved identically in last handle movement.
+    if not handle_motors.handles_synchronized():
+        # If they not, move hour handle to synchronize them.
+        print("Hour handle has not moved last time!")
+        await handle_motors.move(HOUR_HANDLE)
+        minutes = minutes - 1
+        if minutes == 0:
+            print("   ** Watch setup is done. **")
+            return
+
+    # Watch has 12 hours dial, so it never has to move more than 12 hours.
+    iterations = minutes % MINUTES_ON_DIAL
+
+    print(f"--- Required {iterations} iterations. ---")
+
+    for iteration in range(iterations):
+        print(f"      # {iteration + 1}. watch setup iteration.")
+
+        if CONCURRENT_CATCH_UP:
+            await handle_motors.move(BOTH_HANDLES)
+        else:
+            await handle_motors.move(MINUTE_HANDLE)
+            await handle_motors.move(HOUR_HANDLE)
+
+        runtime.watch_setup_mailbox.put(iterations - iteration - 1)
+
+        # Give the mechanism a moment before the next step.
+        if iteration + 1 < iterations:
+            await asyncio.sleep(CATCH_UP_STEP_GAP)
+
+    print("   ** Watch setup is done. **")
+
+
+async def watch_task(runtime: Runtime) -> None:
+    """
+    This task publishes tick every second, moves handles when it is time
+    for it and starts watch setup when watch time is not correct.
+    """
+    watch_controller = WatchController()
+    tick_scheduler = TickScheduler()
+    # Watch setup which is currently running.
+    watch_setup_task: Optional[asyncio.Task] = None
+    metrics = Metrics("watch")
+    tick_lateness = metrics.histogram(
+        "belfry_tick_lateness_seconds", "How late watch wakes up for tick."
+    )
+    catch_up_minutes = metrics.counter(
+        "belfry_catch_up_minutes_total", "Minutes caught up by watch setup."
+    )
+
+    while True:
+        # Wait for the next second, get current date and time.
+        deadline, current_datetime = tick_scheduler.schedule_next_tick()
+        tick_lateness.observe(await async_delay_until(deadline))
+
+        # Publish tick to other tasks.
+        runtime.clock.publish(current_datetime)
+        metrics.loop_iterations.inc()
+        metrics.export()
+
+        if runtime.manual_watch_setup:
+            continue
+
+        if watch_setup_task is not None:
+            if not watch_setup_task.done():
+                continue
+            # Raise exception if watch setup failed.
+            watch_setup_task.result()
+            watch_setup_task = None
+            watch_controller.app_on_startup = False
+            runtime.watch_setup_mailbox.put(None)
+            runtime.automatic_watch_setup = False
+
+        time_delta = watch_controller.setup_needed(
+            current_datetime, runtime.handle_motors.watch_position()
+        )
+        if time_delta:
+            runtime.automatic_watch_setup = True
+            catch_up_minutes.inc(time_delta)
+            runtime.watch_setup_mailbox.put(time_delta)
+            watch_setup_task = asyncio.create_task(watch_setup(time_delta, runtime))
+            continue
+
+        watch_controller.move_handles(current_datetime, runtime.handle_motors)
+
+
+async def bells_task(runtime: Runtime) -> None:
+    """
+    This task requests ringing for all bell programs which are due.
+    """
+    # Built-in programs are kept if schedule file is not valid.
+    bell_schedule = BellSchedule(bell_programs, get_program_states())
+    schedule_watcher = ScheduleWatcher()
+    overrides_watcher = ScheduleWatcher(OVERRIDES_FILE)
+    bell_schedule.reload_file()
+    bell_schedule.reload_overrides()
+    last_sequence = 0
+    metrics = Metrics("bells")
+    states_depth = metrics.queue_depth("program_states")
+
+    while True:
+        tick = await runtime.clock.wait_for_tick(last_sequence, HOUSEKEEPING_INTERVAL)
+        metrics.loop_iterations.inc()
+        metrics.export()
+
+        # Get funciton buttons states on their change.
+        states_queue = runtime.states_queue_for_bells
+        states_depth.set(states_queue.qsize())
+        while not states_queue.empty():
+            bell_schedule.set_program_states(states_queue.get_nowait())
+
+        # Load schedule and overrides files again on their change, between ticks.
+        if schedule_watcher.changed():
+            bell_schedule.reload_file()
+        if overrides_watcher.changed():
+            bell_schedule.reload_overrides()
+
+        if tick is None:
+            continue
+        last_sequence = tick.sequence
+
+        for bell_program in bell_schedule.due(tick):
+            runtime.ring_queue.put_nowait((bell_program, hardware.clock.monotonic()))
+
+
+async def bell_actuator_task(runtime: Runtime) -> None:
+    """
+    This task rings bells, see bells.bell_actuator_worker().
+    """
+    bell_ringings = BellRingings(runtime.ringing_mailbox)
+    metrics = Metrics("bell_actuator")
+    commands_depth = metrics.queue_depth("ring_commands")
+
+    while True:
+        metrics.loop_iterations.inc()
+        metrics.export()
+        # Wait for new program until the first active ringing ends,
+        # wake up sometimes for housekeeping.
+        timeout = HOUSEKEEPING_INTERVAL
+        next_end = bell_ringings.next_end()
+        if next_end is not None:
+            timeout = min(timeout, max(next_end - hardware.clock.monotonic(), 0))
+        try:
+            program, requested_at = await asyncio.wait_for(
+                runtime.ring_queue.get(), timeout
+            )
+        except asyncio.TimeoutError:
+            program = None
+        now = hardware.clock.monotonic()
+        commands_depth.set(runtime.ring_queue.qsize())
+
+        if program is not None:
+            runtime.ring_start_latency = now - requested_at
+            record_ring(metrics, program, runtime.ring_start_latency)
+            bell_ringings.start(program, now)
+
+        bell_ringings.stop_ended(now)
+
+
+async def function_buttons_task(runtime: Runtime) -> None:
+    """
+    This task handles function button events and sends program states
+    to bells on every program states change.
+    """
+    buttons_and_states = FunctionButtons()
+    buttons_and_states.show_states()
+    button_events = runtime.function_button_events
+    last_sequence = 0
+    metrics = Metrics("function_buttons")
+    events_depth = metrics.queue_depth("button_events")
+
+    while True:
+        await runtime.clock.doorbell.wait_for(
+            lambda: runtime.clock.sequence() != last_sequence or button_events.depth(),
+            HOUSEKEEPING_INTERVAL,
+        )
+        metrics.loop_iterations.inc()
+        metrics.export()
+        events_depth.set(button_events.depth())
+
+        changed = False
+        while button_events.depth():
+            event = button_events.get()
+            # Function buttons are used for watch setup during manual watch setup.
+            if not runtime.manual_watch_setup:
+                changed = buttons_and_states.handle_event(event) or changed
+
+        tick = runtime.clock.read()
+        if tick is not None and tick.sequence != last_sequence:
+            last_sequence = tick.sequence
+            # If state is elapsed set state to False.
+            changed = buttons_and_states.expire(tick) or changed
+
+        if changed:
+            runtime.states_queue_for_bells.put_nowait(
+                list(buttons_and_states.program_states)
+            )
+
+        # Manual watch setup uses LEDs while it is performed.
+        if not runtime.manual_watch_setup:
+            buttons_and_states.show_states()
+
+
+async def display_task(runtime: Runtime) -> None:
+    """
+    This task shows composed layers on the display every time
+    new tick or new state is published.
+    """
+    loop = asyncio.get_running_loop()
+    screen = Screen(
+        runtime.clock,
+        runtime.watch_setup_mailbox,
+        runtime.ringing_mailbox,
+        runtime.manual_watch_setup_mailbox,
+    )
+
+    last_flush = 0.0
+    metrics = Metrics("display")
+
+    while True:
+        await runtime.clock.doorbell.wait_for(screen.changed, HOUSEKEEPING_INTERVAL)
+        metrics.loop_iterations.inc()
+        metrics.export()
+        # Do not flush more often than I2C bus can keep up with.
+        await async_delay_until(last_flush + FLUSH_INTERVAL)
+        screen.record_mailboxes(metrics)
+        screen.update()
+        await loop.run_in_executor(runtime.executor, screen.flush, metrics)
+        last_flush = hardware.clock.monotonic()
+
+
+async def manual_watch_setup_task(runtime: Runtime) -> None:
+    """
+    This task handles watch setup switch and button events.
+    """
+    setup = ManualWatchSetup(runtime.manual_watch_setup_mailbox)
+    button_events = runtime.manual_watch_setup_events
+    metrics = Metrics("manual_watch_setup")
+    events_depth = metrics.queue_depth("button_events")
+
+    while True:
+        metrics.loop_iterations.inc()
+        metrics.export()
+        events_depth.set(button_events.depth())
+        timeout = HOUSEKEEPING_INTERVAL
+        next_repeat = setup.next_repeat()
+        if next_repeat is not None:
+            timeout = min(timeout, max(next_repeat - hardware.clock.monotonic(), 0))
+        await runtime.clock.doorbell.wait_for(
+            lambda: button_events.depth()
+            or setup.automatic_watch_setup != runtime.automatic_watch_setup,
+            timeout,
+        )
+        setup.automatic_watch_setup = runtime.automatic_watch_setup
+
+        messages = [setup.update()]
+        while button_events.depth():
+            messages.append(setup.handle_event(button_events.get()))
+        setup.repeat(hardware.clock.monotonic())
+
+        for message in messages:
+            if message == "Manual watch setup started.":
+                runtime.manual_watch_setup = True
+            elif message == "Manual watch setup done.":
+                await runtime.handle_motors.set_position(setup.watch_position)
+                runtime.manual_watch_setup = False
+
+
+def start_tasks(runtime: Runtime) -> list[asyncio.Task]:
+    """
+    Recover watch state and start all belfry tasks and button input.
+    """
+    return [
+        asyncio.create_task(runtime.button_input.run()),
+        runtime.handle_motors.start(),
+        asyncio.create_task(display_task(runtime)),
+        asyncio.create_task(function_buttons_task(runtime)),
+        asyncio.create_task(bell_actuator_task(runtime)),
+        asyncio.create_task(bells_task(runtime)),
+        asyncio.create_task(watch_task(runtime)),
+        asyncio.create_task(manual_watch_setup_task(runtime)),
+    ]
+
+
+async def belfry() -> None:
+    """
+    Run all belfry tasks until one of them fails.
+    """
+    with ThreadPoolExecutor(HARDWARE_WORKERS) as executor:
+        runtime = Runtime(executor)
+        await asyncio.gather(*start_tasks(runtime))
+
+
+def run() -> None:
+    """
+    Run belfry in asyncio runtime.
+    """
+    asyncio.run(belfry())
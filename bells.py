@@ -5,11 +5,21 @@ It starts ringing when it is time for it.
 
 import datetime
 import multiprocessing
+import os
+import queue
+from typing import Optional
 
-import RPi.GPIO as GPIO
-
+import hardware
+from channels import Mailbox
+from clock import ClockTick, MinuteBoundaries, SharedClock
+from function_buttons import buttons as function_button_pins
 from function_buttons import get_program_states
-from utils import delay
+from hardware import GPIO
+from liturgical_calendar import MINUTES_IN_DAY, expand_date_rules, minute_of_date
+from metrics import Metrics
+from overrides import OVERRIDES_FILE, OverrideIndex, load_overrides, prune_overrides
+from schedule import BELL_SCHEDULE_FILE, ScheduleWatcher, load_schedule
+from utils import HOUSEKEEPING_INTERVAL
 
 # Use Raspberry Pi 4B board pin numbers.
 GPIO.setmode(GPIO.BCM)
@@ -25,6 +35,12 @@ BELL_D = 26
 """
 Bell A is the largest, bell D is the smallest
 """
+# Bells by names used in bell schedule file.
+bell_names = {"A": BELL_A, "B": BELL_B, "C": BELL_C, "D": BELL_D}
+
+
+# Ringing starts at most this late, if ticks come late or they are skipped.
+MAX_RING_LATENESS = 60  # [s]
 
 # Set up the GPIO modes.
 output_pins = [BELL_A, BELL_B, BELL_C, BELL_D]
@@ -36,7 +52,8 @@ Bell programs are presets for ringing, in bell program
 is described when to ring, how long to ring, whether function
 button activates program and which bells should ring.
 
-To add new bell program add new element in this dict.
+These programs are used only if bell schedule file does not exist,
+to change programs edit bell_schedule.toml, see schedule module.
 """
 bell_programs = [
     # Every day
@@ -195,72 +212,391 @@ def parse_bell_program_for_display(bell_program: dict) -> str:
     return message_for_display
 
 
-def ring(program: dict, message_queue: multiprocessing.Queue) -> None:
+class BellRingings:
+    """This class keeps track of bells which are ringing.
+
+    Each bell keeps end times of all ringings which use it and it rings
+    as long as it has at least one of them, so overlapping programs
+    which share the bell are merged instead of fighting over the pin.
+    Display shows the newest active program until all ringings end.
+    """
+
+    def __init__(self, ringing_mailbox) -> None:
+        self._ringing_mailbox = ringing_mailbox
+        self._bell_ringings = {bell: [] for bell in output_pins}
+        self._active_programs = []
+
+    def next_end(self) -> Optional[float]:
+        """
+        Get perf counter time when the first active ringing ends,
+        None if nothing is ringing.
+        """
+        if not self._active_programs:
+            return None
+        return min(end for end, _ in self._active_programs)
+
+    def start(self, program: dict, now: float) -> None:
+        """
+        Start ringing as described in program passed to it.
+        """
+        end = now + program["duration"]
+        for bell in program["bells"]:
+            if not self._bell_ringings[bell]:
+                GPIO.output(bell, GPIO.HIGH)
+            self._bell_ringings[bell].append(end)
+        self._active_programs.append((end, program))
+
+        print(f"Start ringing: {program['name']}.")
+        self._ringing_mailbox.put(parse_bell_program_for_display(program))
+
+    def stop_ended(self, now: float) -> None:
+        """
+        Stop bells which have no more active ringings.
+        """
+        for bell, ends in self._bell_ringings.items():
+            if ends and max(ends) <= now:
+                GPIO.output(bell, GPIO.LOW)
+            ends[:] = [ringing_end for ringing_end in ends if ringing_end > now]
+
+        ended_programs = [item for item in self._active_programs if item[0] <= now]
+        if not ended_programs:
+            return
+        self._active_programs = [
+            item for item in self._active_programs if item[0] > now
+        ]
+        for _, ended_program in ended_programs:
+            print(f"Stop ringing: {ended_program['name']}.")
+        if self._active_programs:
+            # Show the newest program which still rings.
+            self._ringing_mailbox.put(
+                parse_bell_program_for_display(self._active_programs[-1][1])
+            )
+        else:
+            # Notify the display that ringing is complete.
+            self._ringing_mailbox.put(None)
+
+
+def record_ring(metrics: Metrics, program: dict, ring_start_latency: float) -> None:
+    """
+    Record started ringing and its start latency in metrics.
+    """
+    metrics.counter(
+        "belfry_rings_total", "Started ringings.", program=program["name"]
+    ).inc()
+    metrics.histogram(
+        "belfry_ring_start_latency_seconds",
+        "Time between ring request and ringing start.",
+    ).observe(ring_start_latency)
+
+
+def bell_actuator_worker(
+    commands: multiprocessing.Queue,
+    ringing_mailbox: Mailbox,
+    ring_start_latency: multiprocessing.Value,
+) -> None:
+    """
+    This is main function of bell actuator worker process.
+    """
+    bell_ringings = BellRingings(ringing_mailbox)
+    metrics = Metrics("bell_actuator")
+    commands_depth = metrics.queue_depth("ring_commands")
+
+    while True:
+        metrics.loop_iterations.inc()
+        metrics.export()
+        # Wait for new program until the first active ringing ends,
+        # wake up sometimes for housekeeping.
+        timeout = HOUSEKEEPING_INTERVAL
+        next_end = bell_ringings.next_end()
+        if next_end is not None:
+            timeout = min(timeout, max(next_end - hardware.clock.monotonic(), 0))
+        try:
+            program, requested_at = commands.get(timeout=timeout)
+        except queue.Empty:
+            program = None
+        now = hardware.clock.monotonic()
+        commands_depth.set(commands.qsize())
+
+        if program is not None:
+            ring_start_latency.value = now - requested_at
+            record_ring(metrics, program, ring_start_latency.value)
+            bell_ringings.start(program, now)
+
+        bell_ringings.stop_ended(now)
+
+
+class BellActuator:
+    """This class controls long-lived worker process which rings bells.
+
+    Worker is started only once, so ringing starts without process
+    spawning overhead.
+    """
+
+    def __init__(self, ringing_mailbox: Mailbox) -> None:
+        self._commands = multiprocessing.Queue()
+        self._ringing_mailbox = ringing_mailbox
+        # Time between ring request and ringing start of the last program.
+        self.ring_start_latency = multiprocessing.Value("d", 0.0)
+
+    def start(self) -> None:
+        """
+        Start worker process.
+        """
+        multiprocessing.Process(
+            target=bell_actuator_worker,
+            args=(self._commands, self._ringing_mailbox, self.ring_start_latency),
+            daemon=True,
+        ).start()
+
+    def ring(self, program: dict) -> None:
+        """
+        Request ringing as described in program passed to it.
+        """
+        self._commands.put((program, hardware.clock.monotonic()))
+
+
+def minute_of_week(weekday: int, hour: int, minute: int) -> int:
+    """
+    Convert weekday, hour and minute to minute of the week.
+    """
+    return weekday * MINUTES_IN_DAY + hour * 60 + minute
+
+
+def compile_weekly_schedule(programs: list[dict]) -> dict[int, list[dict]]:
+    """This function compiles bell programs into minute of the week lookup table.
+
+    Only programs with listed days are compiled here, function button
+    programs are compiled separately because they depend on program states.
     """
-    This function handles ringing as described in program
-    passed to it.
+    weekly_schedule = {}
+    for program in programs:
+        for day in program["day"]:
+            key = minute_of_week(day, program["hour"], program["minute"])
+            weekly_schedule.setdefault(key, []).append(program)
+    return weekly_schedule
+
+
+def compile_yearly_schedule(programs: list[dict], year: int) -> dict[int, list[dict]]:
+    """This function expands date rules of bell programs into lookup table
+    of the year, keys are minutes of date.
+
+    Table is sorted by time. It has to be compiled again every year,
+    because feasts which depend on Easter move.
     """
-    print(f"Start ringing: {program['name']}.")
-    message_queue.put(f"Ringing {parse_bell_program_for_display(program)}")
+    events = []
+    for program in programs:
+        for date in expand_date_rules(program.get("dates", []), year):
+            key = minute_of_date(date, program["hour"], program["minute"])
+            events.append((key, program))
+    yearly_schedule = {}
+    for key, program in sorted(events, key=lambda event: event[0]):
+        yearly_schedule.setdefault(key, []).append(program)
+    return yearly_schedule
 
-    # Start ringing.
-    for bell in program["bells"]:
-        GPIO.output(bell, GPIO.HIGH)
 
-    delay(seconds=program["duration"])
+def compile_function_button_schedule(
+    programs: list[dict], program_states: list[bool]
+) -> dict[int, list[dict]]:
+    """This function compiles activated function button programs into
+    minute of the day lookup table.
 
-    # Stop ringing.
-    for bell in program["bells"]:
-        GPIO.output(bell, GPIO.LOW)
+    It has to be compiled again on every program states change.
+    """
+    function_button_schedule = {}
+    for program in programs:
+        if program["function_button"] is None:
+            continue
+        if program_states[program["function_button"]]:
+            key = program["hour"] * 60 + program["minute"]
+            function_button_schedule.setdefault(key, []).append(program)
+    return function_button_schedule
 
-    print(f"Stop ringing: {program['name']}.")
-    # Notify the parent process that ringing is complete.
-    message_queue.put(f"Stop ringing")
+
+def programs_due(
+    weekly_schedule: dict[int, list[dict]],
+    yearly_schedule: dict[int, list[dict]],
+    function_button_schedule: dict[int, list[dict]],
+    overrides: OverrideIndex,
+    minute: datetime.datetime,
+) -> list[dict]:
+    """
+    Get bell programs which should start ringing at the minute.
+    """
+    date = minute.date()
+    weekly_key = minute_of_week(minute.weekday(), minute.hour, minute.minute)
+    yearly_key = minute_of_date(date, minute.hour, minute.minute)
+    daily_key = minute.hour * 60 + minute.minute
+    programs = (
+        weekly_schedule.get(weekly_key, [])
+        + yearly_schedule.get(yearly_key, [])
+        + function_button_schedule.get(daily_key, [])
+    )
+    return overrides.apply(date.toordinal(), yearly_key, programs)
+
+
+def load_bell_programs(path: str = BELL_SCHEDULE_FILE) -> list[dict]:
+    """
+    Load bell programs from schedule file, built-in programs if it does not exist.
+    """
+    if not os.path.exists(path):
+        return bell_programs
+    return load_schedule(path, bell_names, len(function_button_pins))
+
+
+class BellSchedule:
+    """This class keeps bell programs compiled into lookup tables.
+
+    Function button programs are compiled again only when
+    program states change, date rules are expanded again only when
+    year changes. Programs are replaced on schedule file
+    change, tables are compiled before they replace old ones, so due()
+    never sees half loaded schedule. Overrides are indexed the same way
+    on overrides file change, expired ones are pruned every day.
+    Programs are due at every minute which time crossed since
+    the previous tick, so late or skipped tick does not miss ringing.
+    """
+
+    def __init__(self, programs: list[dict], program_states: list[bool]) -> None:
+        self.program_states = program_states
+        self.date = hardware.clock.now().date()
+        self.overrides = OverrideIndex()
+        self.boundaries = MinuteBoundaries(MAX_RING_LATENESS)
+        self.reload(programs)
+
+    def reload(self, programs: list[dict]) -> None:
+        """
+        Compile new programs and replace old ones.
+        """
+        weekly_schedule = compile_weekly_schedule(programs)
+        yearly_schedule = compile_yearly_schedule(programs, self.date.year)
+        function_button_schedule = compile_function_button_schedule(
+            programs, self.program_states
+        )
+        self.programs = programs
+        self.weekly_schedule = weekly_schedule
+        self.yearly_schedule = yearly_schedule
+        self.function_button_schedule = function_button_schedule
+
+    def reload_file(self, path: str = BELL_SCHEDULE_FILE) -> bool:
+        """This function loads schedule file and replaces programs.
+
+        If file is not valid, old programs are kept. It returns True
+        if programs are replaced.
+        """
+        start_time = hardware.clock.monotonic()
+        try:
+            self.reload(load_bell_programs(path))
+        except Exception as error:
+            # Schedule which cannot be loaded or compiled never stops the bells.
+            print(f"Bell schedule is not loaded: {error}")
+            return False
+        elapsed = hardware.clock.monotonic() - start_time
+        print(f"Bell schedule loaded in {elapsed * 1000:.1f} ms.")
+        return True
+
+    def reload_overrides(self, path: str = OVERRIDES_FILE) -> bool:
+        """This function prunes expired overrides, loads overrides file
+        and replaces overrides index.
+
+        If file is not valid, old overrides are kept. It returns True
+        if overrides are replaced.
+        """
+        start_time = hardware.clock.monotonic()
+        try:
+            pruned = prune_overrides(path, self.date)
+            overrides = load_overrides(path, bell_names)
+        except (OSError, ValueError) as error:
+            print(f"Bell overrides are not loaded: {error}")
+            return False
+        self.overrides = OverrideIndex(overrides, bell_names)
+        elapsed = hardware.clock.monotonic() - start_time
+        print(
+            f"Bell overrides loaded in {elapsed * 1000:.1f} ms,"
+            f" {len(overrides)} active, {pruned} pruned."
+        )
+        return True
+
+    def set_program_states(self, program_states: list[bool]) -> None:
+        """
+        Compile function button programs for new program states.
+        """
+        self.program_states = program_states
+        self.function_button_schedule = compile_function_button_schedule(
+            self.programs, program_states
+        )
+        print(f"Program state 0: {program_states[0]}.")
+        print(f"Program state 1: {program_states[1]}.")
+
+    def due(self, tick: ClockTick) -> list[dict]:
+        """
+        Get bell programs which should start ringing at minutes
+        crossed since the previous tick.
+        """
+        programs = []
+        for minute in self.boundaries.crossed(tick.to_datetime()):
+            date = minute.date()
+            if date != self.date:
+                if date.year != self.date.year:
+                    self.yearly_schedule = compile_yearly_schedule(
+                        self.programs, date.year
+                    )
+                self.date = date
+                self.reload_overrides()
+            programs += programs_due(
+                self.weekly_schedule,
+                self.yearly_schedule,
+                self.function_button_schedule,
+                self.overrides,
+                minute,
+            )
+        return programs
 
 
 def bells(
-    current_datetime_queue_in: multiprocessing.Queue,
+    shared_clock: SharedClock,
     states_queue_in: multiprocessing.Queue,
-    message_queue_for_display: multiprocessing.Queue,
+    ringing_mailbox: Mailbox,
 ) -> None:
     """This is main bell function.
 
     It calls bell ringing.
     """
-    program_states = get_program_states()
+    # Built-in programs are kept if schedule file is not valid.
+    bell_schedule = BellSchedule(bell_programs, get_program_states())
+    schedule_watcher = ScheduleWatcher()
+    overrides_watcher = ScheduleWatcher(OVERRIDES_FILE)
+    bell_schedule.reload_file()
+    bell_schedule.reload_overrides()
 
-    while True:
-        if not current_datetime_queue_in.empty():
-            recieved_message = current_datetime_queue_in.get()
+    # Worker which rings bells.
+    bell_actuator = BellActuator(ringing_mailbox)
+    bell_actuator.start()
 
-            # Convert str to datetime.
-            current_datetime = datetime.datetime.strptime(
-                recieved_message, "%d/%m/%y %H:%M:%S"
-            )
+    last_sequence = 0
+    metrics = Metrics("bells")
+    states_depth = metrics.queue_depth("program_states")
+
+    while True:
+        # Block until the next tick is published.
+        tick = shared_clock.wait_for_tick(last_sequence, HOUSEKEEPING_INTERVAL)
+        metrics.loop_iterations.inc()
+        metrics.export()
+        states_depth.set(states_queue_in.qsize())
 
-            # Go through all programs and check if it is time for ringing.
-            for bell_program in bell_programs:
-                if not bell_program["day"]:
-                    if program_states[bell_program["function_button"]]:
-                        if current_datetime.hour == bell_program["hour"]:
-                            if current_datetime.minute == bell_program["minute"]:
-                                if current_datetime.second == 0:
-                                    multiprocessing.Process(
-                                        target=ring,
-                                        args=(bell_program, message_queue_for_display),
-                                    ).start()
-                elif current_datetime.weekday() in bell_program["day"]:
-                    if current_datetime.hour == bell_program["hour"]:
-                        if current_datetime.minute == bell_program["minute"]:
-                            if current_datetime.second == 0:
-                                multiprocessing.Process(
-                                    target=ring,
-                                    args=(bell_program, message_queue_for_display),
-                                ).start()
         # Get funciton buttons states on their change.
-        if not states_queue_in.empty():
-            program_states = states_queue_in.get()
-            print(f"Program state 0: {program_states[0]}.")
-            print(f"Program state 1: {program_states[1]}.")
-        else:
+        while not states_queue_in.empty():
+            bell_schedule.set_program_states(states_queue_in.get())
+
+        # Load schedule and overrides files again on their change, between ticks.
+        if schedule_watcher.changed():
+            bell_schedule.reload_file()
+        if overrides_watcher.changed():
+            bell_schedule.reload_overrides()
+
+        if tick is None:
             continue
+        last_sequence = tick.sequence
+
+        # Start ringing for all programs which are due now.
+        for bell_program in bell_schedule.due(tick):
+            bell_actuator.ring(bell_program)
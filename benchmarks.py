@@ -0,0 +1,844 @@
+"""Benchmarks module.
+
+This module measures timing, latency and CPU usage of belfry, it runs
+against fake hardware on any Linux machine, or against real hardware
+on the Raspberry Pi, where it moves handles and rings bells:
+
+    python3 benchmarks.py
+    python3 benchmarks.py runtime lcd --json results.json --compare baseline.json
+    python3 benchmarks.py --hardware real
+
+Results can be saved as JSON and compared with results of previous run.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from time import perf_counter, process_time
+
+import hardware
+from channels import Mailbox
+from journal import JOURNAL_FILE
+from utils import delay
+
+# Benchmarks run against this hardware backend, it is set by --hardware option.
+HARDWARE_BACKEND = hardware.FAKE
+
+DELAY_DURATIONS = [0.001, 0.01, 0.1, 1.0]  # [s]
+DELAY_REPETITIONS = 10
+
+# Catch-up benchmark runs handle moves this much faster than real ones.
+CATCH_UP_TIME_SCALE = 0.02
+CATCH_UP_MINUTES = 20
+
+LCD_REPETITIONS = 5
+
+# Button benchmark presses button this many times, each press is short.
+BUTTON_PRESSES = 20
+BUTTON_PRESS_DURATION = 0.04  # [s]
+BUTTON_POLL_INTERVAL = 0.1  # [s]
+
+# Watch offsets which are corrected by holding up button.
+KEY_REPEAT_OFFSETS = [10, 60, 180, 360]  # [min]
+
+# Watch tick benchmark waits for this many ticks.
+TICK_BENCHMARK_TICKS = 10
+
+# Each runtime layout runs this long, measuring starts after warm-up.
+RUNTIME_BENCHMARK_SECONDS = 20  # [s]
+RUNTIME_BENCHMARK_WARMUP = 3  # [s]
+# Runtime layout is started at this second of the minute, so measuring
+# covers minute handle move, ringing at the full minute and hour handle move.
+RUNTIME_BENCHMARK_START_SECOND = 45  # [s]
+# Benchmark bell program rings this long.
+RING_BENCHMARK_DURATION = 3  # [s]
+
+# Calendar benchmark expands these date rules, feasts of the year,
+# each of them rung at several times of the day.
+CALENDAR_BENCHMARK_RULES = """
+    01-01 01-06 02-02 03-19 03-25 06-24 06-29 08-15 11-01 11-02 12-08 12-25 12-26
+    easter-46 easter-7 easter-3 easter-2 easter-1 easter easter+1 easter+39
+    easter+49 easter+50 easter+56 easter+60 sun>=11-27 sun>=11-27+7
+    sun>=11-27+14 sun>=11-27+21 sun>=11-20 lastsun-10 sun>=05-08
+""".split()
+CALENDAR_BENCHMARK_TIMES = ["06:45", "07:00", "09:45", "10:00", "12:00", "18:15"]
+CALENDAR_BENCHMARK_REPETITIONS = 20
+
+
+def spin_delay(seconds: float) -> float:
+    """
+    Previous delay implementation which busy-waits for the whole duration.
+    """
+    start_time = perf_counter()
+    while perf_counter() < start_time + seconds:
+        pass
+    return perf_counter() - start_time - seconds
+
+
+def benchmark_delay(delay_function, seconds: float, repetitions: int) -> dict:
+    """
+    Measure CPU time and timing error of the delay function.
+    """
+    errors = []
+    cpu_start = process_time()
+    for _ in range(repetitions):
+        start_time = perf_counter()
+        delay_function(seconds)
+        errors.append(perf_counter() - start_time - seconds)
+    cpu_time = process_time() - cpu_start
+    return {
+        "cpu_ratio": cpu_time / (seconds * repetitions),
+        "mean_error": sum(errors) / len(errors),
+        "max_error": max(errors),
+    }
+
+
+def run_delay_benchmarks() -> dict:
+    """
+    Compare spinning delay with sleeping delay.
+    """
+    print(
+        f"{'function':<12}{'duration':>10}{'cpu':>8}{'mean err':>12}{'max err':>12}"
+    )
+    results = {}
+    for seconds in DELAY_DURATIONS:
+        for name, delay_function in [("spin_delay", spin_delay), ("delay", delay)]:
+            result = benchmark_delay(delay_function, seconds, DELAY_REPETITIONS)
+            results[f"{name} {seconds}s"] = result
+            print(
+                f"{name:<12}{seconds:>9}s{result['cpu_ratio']:>7.0%}"
+                f"{result['mean_error'] * 1e6:>10.1f}us"
+                f"{result['max_error'] * 1e6:>10.1f}us"
+            )
+    return results
+
+
+def benchmark_catch_up(watch, minutes: int) -> float:
+    """This function measures how long watch setup takes to catch up minutes.
+
+    It runs in temporary directory so real logs are not changed.
+    It returns catch-up time scaled back to real seconds.
+    """
+    working_directory = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            with open(JOURNAL_FILE, "w") as txt_file:
+                txt_file.write("S 00:00 hour_handle\n")
+            # Watch setup and handle motors worker print every step.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                handle_motors = watch.HandleMotors()
+                handle_motors.start()
+                start_time = perf_counter()
+                watch.watch_setup(
+                    minutes,
+                    multiprocessing.Queue(),
+                    handle_motors,
+                    Mailbox(multiprocessing.Condition()),
+                )
+                elapsed = perf_counter() - start_time
+                handle_motors.stop()
+    finally:
+        os.chdir(working_directory)
+    return elapsed / CATCH_UP_TIME_SCALE
+
+
+def run_catch_up_benchmarks() -> dict:
+    """This function compares sequential and concurrent watch setup catch-up.
+
+    It runs against fake GPIO, with handle delays scaled by CATCH_UP_TIME_SCALE.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    import watch
+
+    watch.MINUTE_HANDLE_DELAY *= CATCH_UP_TIME_SCALE
+    watch.HOUR_HANDLE_DELAY *= CATCH_UP_TIME_SCALE
+    watch.CATCH_UP_STEP_GAP *= CATCH_UP_TIME_SCALE
+
+    results = {}
+    for concurrent in [False, True]:
+        watch.CONCURRENT_CATCH_UP = concurrent
+        elapsed = benchmark_catch_up(watch, CATCH_UP_MINUTES)
+        name = "concurrent" if concurrent else "sequential"
+        results[name] = {
+            "elapsed": elapsed,
+            "per_minute": elapsed / CATCH_UP_MINUTES,
+        }
+        print(
+            f"{name:<12}{CATCH_UP_MINUTES:>4} minutes{elapsed:>9.1f}s"
+            f"{elapsed / CATCH_UP_MINUTES:>8.2f}s per minute"
+        )
+    return results
+
+
+def benchmark_lcd_update(lcd1602, batch_transfers: bool) -> dict:
+    """This function measures full screen update of 16x2 display.
+
+    Update latency is time spent in driver (sleeping) plus time
+    which transfers would take on real I2C bus, on real bus it is
+    already included in driver time.
+    """
+    lcd1602.BATCH_TRANSFERS = batch_transfers
+    lcd1602.BUS = lcd1602.smbus.SMBus(1)
+    start_time = perf_counter()
+    for _ in range(LCD_REPETITIONS):
+        lcd1602.write(0, 0, "18/10/26        ")
+        lcd1602.write(0, 1, "08:27:07        ")
+    driver_time = (perf_counter() - start_time) / LCD_REPETITIONS
+    return {
+        "latency": driver_time + bus_time(lcd1602.BUS) / LCD_REPETITIONS,
+        "transfers": lcd1602.BUS.transfers / LCD_REPETITIONS,
+        "bytes": lcd1602.BUS.bytes_written / LCD_REPETITIONS,
+    }
+
+
+def bus_time(bus) -> float:
+    """
+    Get time which transfers would take on real I2C bus, zero for real bus.
+    """
+    return getattr(bus, "bus_time", 0.0)
+
+
+def run_lcd_benchmarks() -> dict:
+    """
+    Compare byte by byte and batched full screen updates of 16x2 display.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    import lcd1602
+
+    lcd1602.init(0x27, 1)
+    results = {}
+    for batch_transfers in [False, True]:
+        result = benchmark_lcd_update(lcd1602, batch_transfers)
+        name = "batched" if batch_transfers else "byte by byte"
+        results[name] = result
+        print(
+            f"{name:<14}{result['latency'] * 1000:>8.1f}ms per screen"
+            f"{result['transfers']:>6.0f} transfers{result['bytes']:>6.0f} B"
+        )
+    return results
+
+
+def run_lcd_tick_benchmarks() -> dict:
+    """This function compares bytes written to I2C bus and update latency per tick
+    when date and time are written as whole lines and when only changed
+    characters are sent.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    import lcd1602
+
+    lcd1602.init(0x27, 1)
+    start = datetime.datetime(2026, 10, 18, 8, 27, 0)
+    ticks = [start + datetime.timedelta(seconds=second) for second in range(60)]
+    results = {}
+
+    for name, show_tick in [
+        (
+            "write lines",
+            lambda tick: (
+                lcd1602.write(0, 0, tick.strftime("%d/%m/%y")),
+                lcd1602.write(0, 1, tick.strftime("%H:%M:%S")),
+            ),
+        ),
+        (
+            "show frame",
+            lambda tick: lcd1602.show(
+                [tick.strftime("%d/%m/%y"), tick.strftime("%H:%M:%S")]
+            ),
+        ),
+    ]:
+        lcd1602.clear()
+        bytes_before = lcd1602.BYTES_WRITTEN
+        bus_time_before = bus_time(lcd1602.BUS)
+        start_time = perf_counter()
+        for tick in ticks:
+            show_tick(tick)
+        driver_time = perf_counter() - start_time
+        update_time = driver_time + bus_time(lcd1602.BUS) - bus_time_before
+        results[name] = {
+            "bytes": (lcd1602.BYTES_WRITTEN - bytes_before) / len(ticks),
+            "latency": update_time / len(ticks),
+        }
+        print(
+            f"{name:<14}{results[name]['bytes']:>8.1f} B per tick"
+            f"{results[name]['latency'] * 1000:>8.2f}ms per tick"
+        )
+    return results
+
+
+def press_buttons(gpio, pin: int) -> list[float]:
+    """
+    Press button with contact bounce, at random moments, and return press times.
+    """
+    import random
+
+    press_times = []
+    for _ in range(BUTTON_PRESSES):
+        time.sleep(random.uniform(0.1, 0.2))
+        press_times.append(perf_counter())
+        gpio.inject_edges(pin, [(0, gpio.LOW), (0.001, gpio.HIGH), (0.001, gpio.LOW)])
+        time.sleep(BUTTON_PRESS_DURATION)
+        gpio.inject_edges(pin, [(0, gpio.HIGH), (0.001, gpio.LOW), (0.001, gpio.HIGH)])
+    time.sleep(0.2)
+    return press_times
+
+
+def run_button_benchmarks() -> dict:
+    """This function compares polling buttons every 100 ms with edge detection.
+
+    Short presses are injected into fake GPIO, it is measured how many
+    of them are detected and how long it takes.
+    """
+    import threading
+
+    gpio = hardware.use(HARDWARE_BACKEND)
+    if not hasattr(gpio, "inject_edges"):
+        print("Button presses can be injected only into fake GPIO, skipped.")
+        return {}
+
+    from buttons import PRESS, ButtonInput
+
+    pin = 16
+    gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    # Previous implementation reads button level every poll interval.
+    detected = []
+    stop = threading.Event()
+
+    def poll() -> None:
+        previous_pressed = False
+        while not stop.is_set():
+            pressed = not gpio.input(pin)
+            if pressed and not previous_pressed:
+                detected.append(perf_counter())
+            previous_pressed = pressed
+            time.sleep(BUTTON_POLL_INTERVAL)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    press_times = press_buttons(gpio, pin)
+    stop.set()
+    poller.join()
+    presses = {"polling": (press_times, detected)}
+
+    detected = []
+    button_input = ButtonInput([pin])
+    button_input.subscribe(
+        lambda event: detected.append(perf_counter()) if event.kind == PRESS else None
+    )
+    button_input.start()
+    press_times = press_buttons(gpio, pin)
+    gpio.remove_event_detect(pin)
+    presses["edges"] = (press_times, detected)
+
+    results = {}
+    for name, (press_times, detected) in presses.items():
+        # Each detection belongs to the last press before it.
+        latencies = [
+            detected_at - max(press for press in press_times if press <= detected_at)
+            for detected_at in detected
+        ]
+        results[name] = {
+            "detected_ratio": len(detected) / len(press_times),
+            "mean_latency": statistics.mean(latencies),
+        }
+        print(
+            f"{name:<10}{len(detected):>4}/{len(press_times)} presses detected"
+            f"{statistics.mean(latencies) * 1000:>8.1f}ms mean latency"
+        )
+    return results
+
+
+def hold_time(key_repeat, minutes: int) -> float:
+    """
+    Get how long up button has to be held to change minutes by given offset.
+    """
+    # The first step is made on press.
+    changed = 1
+    now = 0.0
+    key_repeat.press(0, now)
+    while changed < minutes:
+        now = key_repeat.next_deadline()
+        for _, multiplier in key_repeat.due(now):
+            changed += multiplier
+    return now
+
+
+def run_key_repeat_benchmarks() -> dict:
+    """
+    Compare hold time of one minute step per 100 ms poll with accelerating repeat.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    from buttons import KeyRepeat
+
+    results = {}
+    for minutes in KEY_REPEAT_OFFSETS:
+        polled = minutes * BUTTON_POLL_INTERVAL
+        accelerated = hold_time(KeyRepeat(), minutes)
+        results[f"{minutes} minutes"] = {"polled": polled, "accelerated": accelerated}
+        print(
+            f"{minutes:>4} minutes  polled{polled:>6.1f}s"
+            f"  accelerated{accelerated:>6.1f}s"
+        )
+    return results
+
+
+def run_calendar_benchmarks() -> dict:
+    """
+    Measure how long it takes to expand date rules of bell programs into a year.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    import bells
+    from schedule import parse_schedule
+
+    programs = parse_schedule(
+        {
+            "program": [
+                {
+                    "name": "Blagdan",
+                    "bells": ["A", "B", "C", "D"],
+                    "time": start_time,
+                    "dates": CALENDAR_BENCHMARK_RULES,
+                    "duration": 120,
+                }
+                for start_time in CALENDAR_BENCHMARK_TIMES
+            ]
+        },
+        bells.bell_names,
+        len(bells.function_button_pins),
+    )
+    year = datetime.date.today().year
+    start_time = perf_counter()
+    for repetition in range(CALENDAR_BENCHMARK_REPETITIONS):
+        yearly_schedule = bells.compile_yearly_schedule(programs, year + repetition)
+    expand_time = (perf_counter() - start_time) / CALENDAR_BENCHMARK_REPETITIONS
+    print(
+        f"calendar year{expand_time * 1000:>10.2f}ms"
+        f"{len(yearly_schedule):>6} ringing times"
+    )
+    return {"expand_time": expand_time, "ringing_times": len(yearly_schedule)}
+
+
+def lateness_statistics(lateness: list[float]) -> dict:
+    """
+    Get mean, standard deviation and maximum of lateness.
+    """
+    return {
+        "mean": statistics.mean(lateness),
+        "jitter": statistics.pstdev(lateness),
+        "max": max(lateness),
+    }
+
+
+def run_tick_benchmarks() -> dict:
+    """This function measures how late watch wakes up for ticks.
+
+    It waits for wall-clock seconds with tick scheduler, like watch does,
+    without any other load.
+    """
+    hardware.use(HARDWARE_BACKEND)
+
+    from watch import TickScheduler
+
+    tick_scheduler = TickScheduler()
+    lateness = []
+    for _ in range(TICK_BENCHMARK_TICKS):
+        current_datetime = tick_scheduler.wait_for_next_tick()
+        lateness.append(time.time() - current_datetime.timestamp())
+    result = lateness_statistics(lateness)
+    print(
+        f"watch tick{result['mean'] * 1e6:>10.1f}us mean"
+        f"{result['jitter'] * 1e6:>10.1f}us jitter{result['max'] * 1e6:>10.1f}us max"
+    )
+    return result
+
+
+def process_tree(pid: int) -> list[int]:
+    """
+    Get process and all its descendants, read from /proc.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # Process name in parentheses can contain spaces.
+        parent = int(stat[stat.rfind(")") + 2 :].split()[1])
+        children.setdefault(parent, []).append(int(entry))
+    tree = [pid]
+    for process in tree:
+        tree.extend(children.get(process, []))
+    return tree
+
+
+def process_cpu_time(pid: int) -> float:
+    """
+    Get user and system CPU time of the process, all its threads included.
+    """
+    with open(f"/proc/{pid}/stat", "r") as stat_file:
+        stat = stat_file.read()
+    fields = stat[stat.rfind(")") + 2 :].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def process_rss(pid: int) -> float:
+    """
+    Get resident set size of the process in MB.
+    """
+    with open(f"/proc/{pid}/status", "r") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def process_memory(pid: int) -> float:
+    """This function gets proportional set size of the process in MB.
+
+    Pages shared between processes are split between them, so PSS of
+    forked processes can be summed. RSS is used if PSS is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as smaps_file:
+            for line in smaps_file:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return process_rss(pid)
+
+
+async def observe_asyncio_runtime(seconds: float) -> list[float]:
+    """
+    Run belfry tasks and measure how late every tick is seen by other tasks.
+    """
+    import asyncio_runtime
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(asyncio_runtime.HARDWARE_WORKERS) as executor:
+        runtime = asyncio_runtime.Runtime(executor)
+        tasks = asyncio_runtime.start_tasks(runtime)
+        lateness = []
+        last_sequence = 0
+        end = perf_counter() + seconds
+        while perf_counter() < end:
+            tick = await runtime.clock.wait_for_tick(last_sequence, 1)
+            if tick is not None:
+                lateness.append(time.time() - tick.epoch)
+                last_sequence = tick.sequence
+        for task in tasks:
+            task.cancel()
+    return lateness
+
+
+def observe_processes(seconds: float) -> list[float]:
+    """
+    Start belfry processes and measure how late every tick is seen
+    by other processes.
+    """
+    import main
+
+    shared_clock = main.start_processes()
+    lateness = []
+    last_sequence = 0
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        tick = shared_clock.wait_for_tick(last_sequence, 1)
+        if tick is not None:
+            lateness.append(time.time() - tick.epoch)
+            last_sequence = tick.sequence
+    return lateness
+
+
+def record_transitions(gpio, transitions: multiprocessing.Queue) -> None:
+    """
+    Send every output call with its wall-clock time to the queue,
+    from all processes which are forked afterwards.
+    """
+    output = gpio.output
+
+    def recorded_output(pin: int, value: int) -> None:
+        output(pin, value)
+        transitions.put((time.time(), pin, value))
+
+    gpio.output = recorded_output
+
+
+def received(transitions: multiprocessing.Queue) -> list[tuple]:
+    """
+    Get everything which was put into the queue.
+    """
+    items = []
+    try:
+        while True:
+            items.append(transitions.get(timeout=0.5))
+    except queue.Empty:
+        return items
+
+
+def pulse_duration_errors(transitions: list[tuple]) -> list[float]:
+    """
+    Get how much longer than their handle delay handle motor pulses were.
+    """
+    from watch import HOUR_HANDLE, MINUTE_HANDLE, handle_delay
+
+    errors = []
+    pulse_starts = {}
+    for wall_time, pin, level in transitions:
+        if pin not in (MINUTE_HANDLE, HOUR_HANDLE):
+            continue
+        if level:
+            pulse_starts.setdefault(pin, wall_time)
+        elif pin in pulse_starts:
+            errors.append(wall_time - pulse_starts.pop(pin) - handle_delay(pin))
+    return errors
+
+
+def run_layout(
+    layout: str, seconds: float, results: multiprocessing.Queue, backend: str
+) -> None:
+    """This function runs belfry in one runtime layout.
+
+    It runs in temporary directory with journal which matches current
+    time, so watch does not start watch setup, and with bell program
+    which rings at the next full minute. Ticks seen in the warm-up
+    are left out of the results.
+    """
+    os.setpgrp()
+    sys.stdout = open(os.devnull, "w")
+    # Belfry processes are forked, as on the Raspberry Pi.
+    multiprocessing.set_start_method("fork", force=True)
+
+    gpio = hardware.use(backend)
+    transitions = multiprocessing.Queue()
+    record_transitions(gpio, transitions)
+
+    import bells
+    from journal import position_to_string
+    from watch import watch_position_from_time
+
+    repository = os.path.dirname(os.path.abspath(__file__))
+    directory = tempfile.mkdtemp()
+    shutil.copy(os.path.join(repository, "function_buttons.txt"), directory)
+    os.chdir(directory)
+    with open(JOURNAL_FILE, "w") as txt_file:
+        position = watch_position_from_time(datetime.datetime.now())
+        txt_file.write(f"S {position_to_string(position)} hour_handle\n")
+
+    ring_at = (datetime.datetime.now() + datetime.timedelta(minutes=1)).replace(
+        second=0, microsecond=0
+    )
+    bells.bell_programs.append(
+        {
+            "name": "Benchmark",
+            "function_button": None,
+            "bells": [bells.BELL_A],
+            "hour": ring_at.hour,
+            "minute": ring_at.minute,
+            "day": [ring_at.weekday()],
+            "duration": RING_BENCHMARK_DURATION,
+        }
+    )
+
+    if layout == "asyncio":
+        lateness = asyncio.run(observe_asyncio_runtime(seconds))
+    else:
+        lateness = observe_processes(seconds)
+
+    transitions = received(transitions)
+    ring_starts = [
+        wall_time - ring_at.timestamp()
+        for wall_time, pin, level in transitions
+        if pin == bells.BELL_A and level
+    ]
+    results.put(
+        {
+            "lateness": lateness[RUNTIME_BENCHMARK_WARMUP:],
+            "ring_start_latency": ring_starts[0] if ring_starts else None,
+            "pulse_duration_errors": pulse_duration_errors(transitions),
+        }
+    )
+
+
+def benchmark_runtime(layout: str) -> dict:
+    """This function measures memory, CPU use and latencies of runtime layout.
+
+    Layout runs in fresh interpreter in its own process group, memory
+    and CPU time are measured for every its process. Layout is started
+    at RUNTIME_BENCHMARK_START_SECOND, so handles move and bell rings
+    while it is measured.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    seconds = RUNTIME_BENCHMARK_WARMUP + RUNTIME_BENCHMARK_SECONDS
+    time.sleep((RUNTIME_BENCHMARK_START_SECOND - time.time()) % 60)
+    process = context.Process(
+        target=run_layout, args=(layout, seconds, results, HARDWARE_BACKEND)
+    )
+    process.start()
+    try:
+        time.sleep(RUNTIME_BENCHMARK_WARMUP)
+        cpu_start = {
+            pid: process_cpu_time(pid) for pid in process_tree(process.pid)
+        }
+        time.sleep(RUNTIME_BENCHMARK_SECONDS)
+        per_process = [
+            {
+                "cpu_ratio": (process_cpu_time(pid) - cpu_start.get(pid, 0.0))
+                / RUNTIME_BENCHMARK_SECONDS,
+                "rss": process_rss(pid),
+                "pss": process_memory(pid),
+            }
+            for pid in process_tree(process.pid)
+        ]
+        layout_results = results.get(timeout=seconds)
+    finally:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.join()
+
+    pulse_errors = layout_results["pulse_duration_errors"]
+    return {
+        "processes": len(per_process),
+        "memory": sum(usage["pss"] for usage in per_process),
+        "rss": sum(usage["rss"] for usage in per_process),
+        "cpu_ratio": sum(usage["cpu_ratio"] for usage in per_process),
+        "per_process": per_process,
+        "tick_to_consumer": lateness_statistics(layout_results["lateness"]),
+        "ring_start_latency": layout_results["ring_start_latency"],
+        "pulse_duration_error": {
+            "mean": statistics.mean(pulse_errors),
+            "max": max(pulse_errors, key=abs),
+        }
+        if pulse_errors
+        else None,
+    }
+
+
+def run_runtime_benchmarks() -> dict:
+    """
+    Compare five processes layout with asyncio runtime.
+    """
+    results = {}
+    for layout in ["processes", "asyncio"]:
+        result = benchmark_runtime(layout)
+        results[layout] = result
+        lateness = result["tick_to_consumer"]
+        print(
+            f"{layout:<10}{result['processes']:>3} processes"
+            f"{result['memory']:>7.1f} MB PSS{result['rss']:>7.1f} MB RSS"
+            f"{result['cpu_ratio']:>7.1%} CPU"
+        )
+        print(
+            f"{'':<10}tick to consumer{lateness['mean'] * 1000:>7.2f}ms mean"
+            f"{lateness['jitter'] * 1000:>7.2f}ms jitter"
+            f"{lateness['max'] * 1000:>7.2f}ms max"
+        )
+        if result["ring_start_latency"] is not None:
+            print(
+                f"{'':<10}ring start{result['ring_start_latency'] * 1000:>7.2f}ms"
+                " after full minute"
+            )
+        if result["pulse_duration_error"] is not None:
+            print(
+                f"{'':<10}handle pulse"
+                f"{result['pulse_duration_error']['mean'] * 1000:>7.2f}ms mean error"
+                f"{result['pulse_duration_error']['max'] * 1000:>7.2f}ms max"
+            )
+    return results
+
+
+BENCHMARKS = {
+    "delay": run_delay_benchmarks,
+    "ticks": run_tick_benchmarks,
+    "catch_up": run_catch_up_benchmarks,
+    "lcd": run_lcd_benchmarks,
+    "lcd_tick": run_lcd_tick_benchmarks,
+    "buttons": run_button_benchmarks,
+    "key_repeat": run_key_repeat_benchmarks,
+    "calendar": run_calendar_benchmarks,
+    "runtime": run_runtime_benchmarks,
+}
+
+
+def compare_results(baseline: dict, results: dict, name: str = "") -> None:
+    """
+    Print change of every number in results against baseline results.
+    """
+    for key, value in results.items():
+        path = f"{name}.{key}" if name else key
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare_results(previous, value, path)
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)):
+            change = (value - previous) / abs(previous) if previous else 0.0
+            print(f"{path:<56}{previous:>11.4g}{value:>11.4g}{change:>+9.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run belfry benchmarks.")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        metavar="benchmark",
+        help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}",
+    )
+    parser.add_argument(
+        "--hardware", choices=[hardware.FAKE, hardware.REAL], default=hardware.FAKE
+    )
+    parser.add_argument("--json", help="save results to JSON file")
+    parser.add_argument("--compare", help="compare results with saved JSON file")
+    arguments = parser.parse_args()
+    HARDWARE_BACKEND = arguments.hardware
+    # Positional list default is checked against choices, so names are checked here.
+    for name in arguments.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(
+                f"unknown benchmark {name!r}, benchmarks are {', '.join(BENCHMARKS)}"
+            )
+    if not arguments.benchmarks:
+        arguments.benchmarks = list(BENCHMARKS)
+
+    results = {}
+    for name in arguments.benchmarks:
+        print(f"== {name}")
+        results[name] = BENCHMARKS[name]()
+
+    if arguments.json:
+        with open(arguments.json, "w") as json_file:
+            json.dump(
+                {
+                    "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "hardware": HARDWARE_BACKEND,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                json_file,
+                indent=2,
+            )
+    if arguments.compare:
+        with open(arguments.compare, "r") as json_file:
+            baseline = json.load(json_file)
+        print(f"== compared with {arguments.compare} ({baseline['date']})")
+        compare_results(baseline["results"], results)
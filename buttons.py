@@ -0,0 +1,301 @@
+"""Buttons input module.
+
+Buttons and switches are not polled, GPIO edge detection calls back
+on every edge and the edge is timestamped right away. Edges of one
+button which come one after another inside debounce window are
+contact bounce, level is read only when the button settles down, and
+the event gets timestamp of the first edge.
+
+Subscribers get press, release and long press events. Buttons are
+pressed when input pin is LOW. Events are dispatched by dispatcher
+thread, or by event loop task in asyncio runtime. Key repeat turns held keys into
+repeated steps which grow the longer the key is held.
+"""
+
+import asyncio
+import collections
+import queue
+import threading
+from typing import NamedTuple, Optional
+
+import hardware
+from hardware import GPIO
+
+# Button events.
+PRESS = "press"
+RELEASE = "release"
+LONG_PRESS = "long_press"
+
+# Edges are ignored for this long after the edge which changed the level.
+DEBOUNCE_TIME = 0.03  # [s]
+# Button which is held this long sends long press event.
+LONG_PRESS_TIME = 1.0  # [s]
+
+# Held key starts repeating after this delay and then repeats every interval,
+# never slower than one step per 100 ms poll which was used before.
+REPEAT_DELAY = 0.1  # [s]
+REPEAT_INTERVAL = 0.1  # [s]
+# Acceleration curve, (held for [s], step multiplier) pairs.
+REPEAT_ACCELERATION = [(0, 1), (3, 5), (6, 15)]
+
+
+class ButtonEvent(NamedTuple):
+    """
+    Debounced button event.
+    """
+
+    pin: int
+    kind: str
+    # Monotonic time of the first edge, or when long press was reached.
+    timestamp: float
+
+
+class ButtonInput:
+    """This class turns GPIO edges into debounced button events.
+
+    GPIO calls back from its own thread, edges are only timestamped
+    there and handed over to dispatcher thread which debounces them
+    and calls subscribers. Press and release are sent on the first edge
+    which changes the level, then edges are ignored for debounce time
+    and level is read again when it passes. Subscribers are called from dispatcher
+    thread, so they should only hand the event over. Input started
+    by run() dispatches in the event loop instead.
+    """
+
+    def __init__(
+        self,
+        pins: list[int],
+        debounce_time: float = DEBOUNCE_TIME,
+        long_press_time: float = LONG_PRESS_TIME,
+    ) -> None:
+        self.pins = list(pins)
+        self.debounce_time = debounce_time
+        self.long_press_time = long_press_time
+        self._subscribers = []
+        self._edges = queue.Queue()
+        # Event loop and its wakeup event if input is run by the loop.
+        self._loop = None
+        self._wakeup = None
+        self._pressed = {}
+        # Time when buttons which are settling down are read again.
+        self._settled_at = {}
+        # Time when held buttons reach long press.
+        self._long_press_at = {}
+
+    def subscribe(self, callback, pins: Optional[list[int]] = None) -> None:
+        """
+        Call back with events of given pins, or of all pins if pins are not given.
+        Subscribers have to be added before input is started.
+        """
+        self._subscribers.append((callback, None if pins is None else set(pins)))
+
+    def start(self) -> None:
+        """
+        Start edge detection, buttons which are already pressed send press event.
+        """
+        self._start_detection()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    async def run(self) -> None:
+        """
+        Start edge detection and dispatch events in the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._start_detection()
+        while True:
+            timeout = None
+            deadline = self._next_deadline()
+            if deadline is not None:
+                timeout = max(deadline - hardware.clock.monotonic(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._process(hardware.clock.monotonic())
+
+    def pressed(self, pin: int) -> bool:
+        """
+        Check if button is pressed, as of the last debounced event.
+        """
+        return self._pressed.get(pin, False)
+
+    def _start_detection(self) -> None:
+        now = hardware.clock.monotonic()
+        for pin in self.pins:
+            self._pressed[pin] = False
+            self._settle(pin, now)
+            GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._edge)
+
+    def _edge(self, pin: int) -> None:
+        timestamp = hardware.clock.monotonic()
+        if self._loop is None:
+            self._edges.put((pin, timestamp))
+        else:
+            self._loop.call_soon_threadsafe(self._add_edge, pin, timestamp)
+
+    def _add_edge(self, pin: int, timestamp: float) -> None:
+        # Edges of button which is settling down are bounces.
+        if pin not in self._settled_at:
+            self._settled_at[pin] = timestamp + self.debounce_time
+            self._settle(pin, timestamp)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _emit(self, pin: int, kind: str, timestamp: float) -> None:
+        event = ButtonEvent(pin, kind, timestamp)
+        for callback, pins in self._subscribers:
+            if pins is None or pin in pins:
+                callback(event)
+
+    def _settle(self, pin: int, timestamp: float) -> None:
+        """
+        Read level of button and send event if it changed.
+        """
+        pressed = not GPIO.input(pin)
+        if pressed == self._pressed[pin]:
+            return
+        self._pressed[pin] = pressed
+        if pressed:
+            self._long_press_at[pin] = timestamp + self.long_press_time
+            self._emit(pin, PRESS, timestamp)
+        else:
+            self._long_press_at.pop(pin, None)
+            self._emit(pin, RELEASE, timestamp)
+
+    def _next_deadline(self) -> Optional[float]:
+        deadlines = list(self._settled_at.values()) + list(self._long_press_at.values())
+        if not deadlines:
+            return None
+        return min(deadlines)
+
+    def _dispatch(self) -> None:
+        while True:
+            timeout = None
+            deadline = self._next_deadline()
+            if deadline is not None:
+                timeout = max(deadline - hardware.clock.monotonic(), 0)
+            try:
+                self._add_edge(*self._edges.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            self._process(hardware.clock.monotonic())
+
+    def _process(self, now: float) -> None:
+        """
+        Read again buttons whose debounce time has passed
+        and send long presses which are due by now.
+        """
+        for pin in [
+            pin for pin, settled_at in self._settled_at.items() if settled_at <= now
+        ]:
+            # Level could change back while edges were ignored, short tap.
+            self._settle(pin, self._settled_at.pop(pin))
+
+        for pin in [
+            pin
+            for pin, long_press_at in self._long_press_at.items()
+            if long_press_at <= now
+        ]:
+            self._emit(pin, LONG_PRESS, self._long_press_at.pop(pin))
+
+
+class EventInbox:
+    """This class is subscriber which collects events for a process.
+
+    Every event rings the doorbell, so the process can wait for
+    button events together with other channels which share the doorbell.
+    """
+
+    def __init__(self, doorbell) -> None:
+        self._doorbell = doorbell
+        self._events = collections.deque()
+
+    def __call__(self, event: ButtonEvent) -> None:
+        with self._doorbell:
+            self._events.append(event)
+            self._doorbell.notify_all()
+
+    def depth(self) -> int:
+        """
+        Get number of events waiting to be read.
+        """
+        return len(self._events)
+
+    def get(self) -> Optional[ButtonEvent]:
+        """
+        Get the oldest event, None if there are no events.
+        """
+        if not self._events:
+            return None
+        return self._events.popleft()
+
+
+class KeyRepeat:
+    """This class repeats keys while they are held.
+
+    Owner calls press() and release() on key events and due() when
+    next_deadline() is reached. Every repeat has step multiplier from
+    the acceleration curve, so the longer key is held the larger steps are.
+    """
+
+    def __init__(
+        self,
+        delay: float = REPEAT_DELAY,
+        interval: float = REPEAT_INTERVAL,
+        acceleration: list[tuple[float, int]] = REPEAT_ACCELERATION,
+    ) -> None:
+        self.delay = delay
+        self.interval = interval
+        self.acceleration = acceleration
+        # Held keys, time when they were pressed and time of their next repeat.
+        self._held = {}
+
+    def press(self, key: int, timestamp: float) -> None:
+        """
+        Start repeating key which was pressed at timestamp.
+        """
+        self._held[key] = (timestamp, timestamp + self.delay)
+
+    def release(self, key: int) -> None:
+        """
+        Stop repeating key.
+        """
+        self._held.pop(key, None)
+
+    def release_all(self) -> None:
+        """
+        Stop repeating all keys.
+        """
+        self._held.clear()
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Get monotonic time of the next repeat, None if no key is held.
+        """
+        if not self._held:
+            return None
+        return min(next_repeat for _, next_repeat in self._held.values())
+
+    def multiplier(self, held_for: float) -> int:
+        """
+        Get step multiplier of key which is held for given time.
+        """
+        multiplier = 1
+        for threshold, step_multiplier in self.acceleration:
+            if held_for >= threshold:
+                multiplier = step_multiplier
+        return multiplier
+
+    def due(self, now: float) -> list[tuple[int, int]]:
+        """
+        Get (key, step multiplier) of all repeats which are due by now.
+        """
+        repeats = []
+        for key, (pressed_at, next_repeat) in self._held.items():
+            while next_repeat <= now:
+                repeats.append((key, self.multiplier(next_repeat - pressed_at)))
+                next_repeat += self.interval
+            self._held[key] = (pressed_at, next_repeat)
+        return repeats
@@ -0,0 +1,170 @@
+"""Channels module.
+
+It contains "latest value wins" mailbox used for state-like streams,
+like ringing status, which are sent between processes.
+Unlike queue, mailbox keeps only the newest value, so the consumer
+always gets the current state and backlog can not grow.
+Local doorbell and mailbox are used between asyncio tasks of one process.
+"""
+
+import asyncio
+import ctypes
+import multiprocessing
+import pickle
+from typing import Any, Optional
+
+# Maximum size of pickled mailbox value.
+MAILBOX_SIZE = 256  # [B]
+
+
+class Mailbox:
+    """This class is single slot shared memory channel.
+
+    Putting new value overwrites the previous one even if it was not read,
+    overwritten values are counted as coalesced.
+    Mailbox shares doorbell (condition) with other channels,
+    so consumer can wait for change on any of them.
+    """
+
+    def __init__(
+        self,
+        doorbell: multiprocessing.Condition,
+        initial_value: Any = None,
+        size: int = MAILBOX_SIZE,
+    ) -> None:
+        self._doorbell = doorbell
+        self._buffer = multiprocessing.RawArray(ctypes.c_char, size)
+        self._length = multiprocessing.RawValue(ctypes.c_int)
+        self._sequence = multiprocessing.RawValue(ctypes.c_int64)
+        self._read_sequence = multiprocessing.RawValue(ctypes.c_int64)
+        self._coalesced = multiprocessing.RawValue(ctypes.c_int64)
+        self._write(initial_value)
+
+    def _write(self, value: Any) -> None:
+        data = pickle.dumps(value)
+        if len(data) > len(self._buffer):
+            raise ValueError(f"Mailbox value is larger than {len(self._buffer)} B.")
+        self._buffer[: len(data)] = data
+        self._length.value = len(data)
+
+    def put(self, value: Any) -> None:
+        """
+        Overwrite value in mailbox and notify consumer.
+        """
+        with self._doorbell:
+            if self.depth():
+                # Previous value was not read, consumer will get only the new one.
+                self._coalesced.value += 1
+            self._write(value)
+            self._sequence.value += 1
+            self._doorbell.notify_all()
+
+    def get(self) -> Any:
+        """
+        Get the newest value from mailbox.
+        """
+        with self._doorbell:
+            self._read_sequence.value = self._sequence.value
+            return pickle.loads(self._buffer[: self._length.value])
+
+    def depth(self) -> int:
+        """
+        Get number of values waiting to be read, it is never more than one.
+        """
+        return int(self._sequence.value != self._read_sequence.value)
+
+    def coalesced(self) -> int:
+        """
+        Get number of values which were overwritten before they were read.
+        """
+        return self._coalesced.value
+
+
+def wait_for_change(
+    doorbell: multiprocessing.Condition, predicate, timeout: Optional[float] = None
+) -> bool:
+    """
+    Block until predicate becomes True or timeout expires, predicate is checked
+    every time something rings the doorbell.
+    """
+    with doorbell:
+        return doorbell.wait_for(predicate, timeout)
+
+
+class LocalDoorbell:
+    """This class is doorbell for asyncio tasks of one process.
+
+    Every ring wakes up all tasks which are waiting, it is rung
+    only from the event loop thread.
+    """
+
+    def __init__(self) -> None:
+        self._rung = asyncio.Event()
+
+    def ring(self) -> None:
+        """
+        Wake up all waiting tasks.
+        """
+        self._rung.set()
+        self._rung = asyncio.Event()
+
+    async def wait_for(self, predicate, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until predicate becomes True or timeout expires, predicate is checked
+        every time something rings the doorbell.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not predicate():
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._rung.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+        return True
+
+
+class LocalMailbox:
+    """
+    This class is single slot channel between asyncio tasks of one process,
+    it has the same interface as Mailbox.
+    """
+
+    def __init__(self, doorbell: LocalDoorbell, initial_value: Any = None) -> None:
+        self._doorbell = doorbell
+        self._value = initial_value
+        self._sequence = 0
+        self._read_sequence = 0
+        self._coalesced = 0
+
+    def put(self, value: Any) -> None:
+        """
+        Overwrite value in mailbox and notify consumer.
+        """
+        if self.depth():
+            # Previous value was not read, consumer will get only the new one.
+            self._coalesced += 1
+        self._value = value
+        self._sequence += 1
+        self._doorbell.ring()
+
+    def get(self) -> Any:
+        """
+        Get the newest value from mailbox.
+        """
+        self._read_sequence = self._sequence
+        return self._value
+
+    def depth(self) -> int:
+        """
+        Get number of values waiting to be read, it is never more than one.
+        """
+        return int(self._sequence != self._read_sequence)
+
+    def coalesced(self) -> int:
+        """
+        Get number of values which were overwritten before they were read.
+        """
+        return self._coalesced
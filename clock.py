@@ -0,0 +1,227 @@
+"""Shared clock module.
+
+Watch process publishes current time to shared memory once per tick,
+other processes read it without pickling or parsing strings.
+Any number of processes can read the shared clock, publishing
+costs the same no matter how many processes are reading it.
+Local clock is used by asyncio tasks of one process.
+"""
+
+import ctypes
+import datetime
+import multiprocessing
+from typing import NamedTuple, Optional
+
+from channels import LocalDoorbell
+
+# Indexes of fields in shared memory.
+SEQUENCE = 0
+EPOCH = 1
+YEAR = 2
+MONTH = 3
+DAY = 4
+HOUR = 5
+MINUTE = 6
+SECOND = 7
+WEEKDAY = 8
+FIELDS_COUNT = 9
+
+
+class ClockTick(NamedTuple):
+    """
+    Snapshot of the shared clock.
+    """
+
+    sequence: int
+    epoch: int
+    year: int
+    month: int
+    day: int
+    hour: int
+    minute: int
+    second: int
+    weekday: int
+
+    def to_datetime(self) -> datetime.datetime:
+        return datetime.datetime(
+            self.year, self.month, self.day, self.hour, self.minute, self.second
+        )
+
+    def date_string(self) -> str:
+        return f"{self.day:02}/{self.month:02}/{self.year % 100:02}"
+
+    def time_string(self) -> str:
+        return f"{self.hour:02}:{self.minute:02}:{self.second:02}"
+
+
+class MinuteBoundaries:
+    """This class finds minute boundaries which time crossed since the last check.
+
+    Every boundary in interval (last, now] is returned exactly once, so
+    event at full minute is not missed when tick comes late or it is
+    skipped, and it does not happen twice. Boundaries which are older
+    than max lateness are dropped, event would be too late for them.
+    """
+
+    def __init__(self, max_lateness: float) -> None:
+        self.max_lateness = datetime.timedelta(seconds=max_lateness)
+        # The last checked instant, None before the first check.
+        self.last: Optional[datetime.datetime] = None
+
+    def crossed(self, now: datetime.datetime) -> list[datetime.datetime]:
+        """
+        Get minute boundaries in interval (last, now] and make now the last instant.
+        """
+        # Start from now on the first check and when clock was set back for
+        # more than max lateness, boundary at now counts like at any other tick.
+        # If clock was set back less than that, wait until it catches up.
+        if self.last is None or self.last - now > self.max_lateness:
+            self.last = now - datetime.timedelta(microseconds=1)
+        if now <= self.last:
+            return []
+
+        minute = datetime.timedelta(minutes=1)
+        first = (self.last + minute).replace(second=0, microsecond=0)
+        # The oldest boundary which is not too late.
+        oldest = now - self.max_lateness - datetime.timedelta(microseconds=1) + minute
+        oldest = oldest.replace(second=0, microsecond=0)
+        if first < oldest:
+            dropped = (min(oldest, now + minute) - first) // minute
+            print(f"{dropped} minute boundaries are too late, skipped.")
+            first = oldest
+        self.last = now
+
+        boundaries = []
+        while first <= now:
+            boundaries.append(first)
+            first += minute
+        return boundaries
+
+
+class SharedClock:
+    """This class is single writer shared memory clock.
+
+    Writer increments sequence number before and after writing fields
+    (sequence is odd while writing), so readers can detect torn reads
+    and read again. After publishing, all waiting readers are notified.
+    """
+
+    def __init__(self, doorbell: Optional[multiprocessing.Condition] = None) -> None:
+        self._fields = multiprocessing.RawArray(ctypes.c_int64, FIELDS_COUNT)
+        # Condition which is notified on every tick, it can be shared with
+        # mailboxes so readers can wait for any of them.
+        if doorbell is None:
+            doorbell = multiprocessing.Condition()
+        self.doorbell = doorbell
+
+    def publish(self, current_datetime: datetime.datetime) -> None:
+        """
+        Publish current datetime to all readers.
+        """
+        fields = self._fields
+        fields[SEQUENCE] += 1
+        fields[EPOCH] = int(current_datetime.timestamp())
+        fields[YEAR] = current_datetime.year
+        fields[MONTH] = current_datetime.month
+        fields[DAY] = current_datetime.day
+        fields[HOUR] = current_datetime.hour
+        fields[MINUTE] = current_datetime.minute
+        fields[SECOND] = current_datetime.second
+        fields[WEEKDAY] = current_datetime.weekday()
+        fields[SEQUENCE] += 1
+        with self.doorbell:
+            self.doorbell.notify_all()
+
+    def read(self) -> Optional[ClockTick]:
+        """
+        Read the last published tick, None if nothing is published yet.
+        """
+        while True:
+            sequence = self._fields[SEQUENCE]
+            if sequence % 2:
+                # Writer is in the middle of publishing.
+                continue
+            values = self._fields[:]
+            if values[SEQUENCE] == sequence:
+                break
+        if sequence == 0:
+            return None
+        return ClockTick(*values)
+
+    def wait_for_tick(
+        self, last_sequence: int, timeout: Optional[float] = None
+    ) -> Optional[ClockTick]:
+        """This function blocks until tick newer than last sequence is published.
+
+        It returns the new tick or None if timeout expired.
+        """
+        with self.doorbell:
+            published = self.doorbell.wait_for(
+                lambda: self._fields[SEQUENCE] > last_sequence, timeout
+            )
+        if not published:
+            return None
+        return self.read()
+
+    def sequence(self) -> int:
+        """
+        Get sequence number of the last published tick.
+        """
+        return self._fields[SEQUENCE]
+
+
+class LocalClock:
+    """
+    This class is clock for asyncio tasks of one process,
+    it has the same interface as SharedClock.
+    """
+
+    def __init__(self, doorbell: Optional[LocalDoorbell] = None) -> None:
+        if doorbell is None:
+            doorbell = LocalDoorbell()
+        self.doorbell = doorbell
+        self._tick = None
+
+    def publish(self, current_datetime: datetime.datetime) -> None:
+        """
+        Publish current datetime to all readers.
+        """
+        self._tick = ClockTick(
+            self.sequence() + 1,
+            int(current_datetime.timestamp()),
+            current_datetime.year,
+            current_datetime.month,
+            current_datetime.day,
+            current_datetime.hour,
+            current_datetime.minute,
+            current_datetime.second,
+            current_datetime.weekday(),
+        )
+        self.doorbell.ring()
+
+    def read(self) -> Optional[ClockTick]:
+        """
+        Read the last published tick, None if nothing is published yet.
+        """
+        return self._tick
+
+    async def wait_for_tick(
+        self, last_sequence: int, timeout: Optional[float] = None
+    ) -> Optional[ClockTick]:
+        """This function waits until tick newer than last sequence is published.
+
+        It returns the new tick or None if timeout expired.
+        """
+        if not await self.doorbell.wait_for(
+            lambda: self.sequence() > last_sequence, timeout
+        ):
+            return None
+        return self._tick
+
+    def sequence(self) -> int:
+        """
+        Get sequence number of the last published tick.
+        """
+        if self._tick is None:
+            return 0
+        return self._tick.sequence
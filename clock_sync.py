@@ -0,0 +1,133 @@
+"""Clock synchronization module.
+
+Raspberry Pi has no real time clock, after boot system time is wrong
+until NTP sets it. Belfry waits at startup until kernel tells that
+system clock is synchronized, which it reads with adjtimex() system
+call, or with timedatectl where adjtimex() is not available:
+
+    timedatectl show --property=NTPSynchronized --value
+
+Belfry starts anyway when sync does not happen in the timeout, for
+example without internet connection, then watch and bells catch up
+when the clock is set later.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import subprocess
+from typing import Callable, Optional
+
+import hardware
+
+# The longest wait for clock sync, it is configured by environment variable.
+CLOCK_SYNC_TIMEOUT = float(os.environ.get("BELFRY_CLOCK_SYNC_TIMEOUT", 120))  # [s]
+CLOCK_SYNC_POLL_INTERVAL = 0.5  # [s]
+
+# Clock state returned by adjtimex() while clock is not synchronized.
+TIME_ERROR = 5
+
+TIMEDATECTL_TIMEOUT = 5  # [s]
+
+
+class Timex(ctypes.Structure):
+    """
+    Linux struct timex, only status is read.
+    """
+
+    _fields_ = [
+        ("modes", ctypes.c_uint),
+        ("offset", ctypes.c_long),
+        ("freq", ctypes.c_long),
+        ("maxerror", ctypes.c_long),
+        ("esterror", ctypes.c_long),
+        ("status", ctypes.c_int),
+        ("constant", ctypes.c_long),
+        ("precision", ctypes.c_long),
+        ("tolerance", ctypes.c_long),
+        ("time_sec", ctypes.c_long),
+        ("time_usec", ctypes.c_long),
+        ("tick", ctypes.c_long),
+        ("ppsfreq", ctypes.c_long),
+        ("jitter", ctypes.c_long),
+        ("shift", ctypes.c_int),
+        ("stabil", ctypes.c_long),
+        ("jitcnt", ctypes.c_long),
+        ("calcnt", ctypes.c_long),
+        ("errcnt", ctypes.c_long),
+        ("stbcnt", ctypes.c_long),
+        ("tai", ctypes.c_int),
+        # Reserved by kernel, more than enough with 64-bit time too.
+        ("reserved", ctypes.c_int * 32),
+    ]
+
+
+def adjtimex_synchronized() -> Optional[bool]:
+    """
+    Ask kernel if clock is synchronized, None if adjtimex() is not available.
+    """
+    library = ctypes.util.find_library("c")
+    if library is None:
+        return None
+    try:
+        adjtimex = ctypes.CDLL(library, use_errno=True).adjtimex
+    except (AttributeError, OSError):
+        return None
+    # Zero modes only reads the state.
+    state = adjtimex(ctypes.byref(Timex()))
+    if state < 0:
+        return None
+    return state != TIME_ERROR
+
+
+def timedatectl_synchronized() -> Optional[bool]:
+    """
+    Ask systemd if clock is synchronized, None if timedatectl is not available.
+    """
+    try:
+        result = subprocess.run(
+            ["timedatectl", "show", "--property=NTPSynchronized", "--value"],
+            capture_output=True,
+            text=True,
+            timeout=TIMEDATECTL_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() == "yes"
+
+
+def clock_synchronized() -> bool:
+    """This function tells if system clock is synchronized.
+
+    Clock is taken as synchronized when neither adjtimex() nor
+    timedatectl can tell, belfry cannot wait for sync it cannot see.
+    """
+    for check in (adjtimex_synchronized, timedatectl_synchronized):
+        synchronized = check()
+        if synchronized is not None:
+            return synchronized
+    return True
+
+
+def wait_for_clock_sync(
+    timeout: float = CLOCK_SYNC_TIMEOUT,
+    synchronized: Callable[[], bool] = clock_synchronized,
+    poll_interval: float = CLOCK_SYNC_POLL_INTERVAL,
+) -> tuple[bool, float]:
+    """This function waits until system clock is synchronized or timeout passes.
+
+    Sync check is a parameter, so fake one from fake_hardware module
+    can be used off the Raspberry Pi. It returns if clock is
+    synchronized and how long it waited.
+    """
+    start = hardware.clock.monotonic()
+    deadline = start + timeout
+    while True:
+        if synchronized():
+            return True, hardware.clock.monotonic() - start
+        now = hardware.clock.monotonic()
+        if now >= deadline:
+            return False, now - start
+        hardware.clock.sleep(min(poll_interval, deadline - now))
@@ -0,0 +1,64 @@
+"""Screen compositor module.
+
+Everything which is shown on 16x2 display is drawn in layers, layer
+with the highest priority which is visible wins. Composed frame is
+flushed to the display at once, only changed characters are sent.
+"""
+
+from typing import Optional
+
+from lcd1602 import ROWS, show
+
+# Layer priorities, layer with higher priority covers the lower ones.
+CLOCK_PRIORITY = 0
+WATCH_SETUP_PRIORITY = 1
+RINGING_PRIORITY = 2
+MANUAL_WATCH_SETUP_PRIORITY = 3
+
+# Display is flushed at most this often, changes which come quicker,
+# like held button repeats, are flushed together.
+FLUSH_INTERVAL = 0.05  # [s]
+
+
+class Layer:
+    """
+    Layer holds one frame (one string for each display row),
+    it is hidden when it has no frame.
+    """
+
+    def __init__(self, priority: int) -> None:
+        self.priority = priority
+        self.frame = None
+
+    def set(self, frame: Optional[list[str]]) -> None:
+        """
+        Set frame of the layer, None hides the layer.
+        """
+        self.frame = frame
+
+    def visible(self) -> bool:
+        return self.frame is not None
+
+
+class Compositor:
+    """
+    Compositor composes layers into one frame and flushes it to the display.
+    """
+
+    def __init__(self, layers: list[Layer]) -> None:
+        self.layers = sorted(layers, key=lambda layer: layer.priority, reverse=True)
+
+    def compose(self) -> list[str]:
+        """
+        Get frame of the top visible layer, empty frame if no layer is visible.
+        """
+        for layer in self.layers:
+            if layer.visible():
+                return layer.frame
+        return [""] * ROWS
+
+    def flush(self) -> None:
+        """
+        Show composed frame on the display.
+        """
+        show(self.compose())
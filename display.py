@@ -1,63 +1,160 @@
 """Module for displaying informations on 16x2 display.
 
-It displays current date and time, watch setup informations and
-ringing informations.
+It displays current date and time, watch setup informations,
+ringing informations and manual watch setup.
 """
 
-import multiprocessing
+import hardware
+import lcd1602
+from channels import Mailbox, wait_for_change
+from clock import SharedClock
+from compositor import (
+    CLOCK_PRIORITY,
+    FLUSH_INTERVAL,
+    MANUAL_WATCH_SETUP_PRIORITY,
+    RINGING_PRIORITY,
+    WATCH_SETUP_PRIORITY,
+    Compositor,
+    Layer,
+)
+from metrics import Metrics
+from utils import HOUSEKEEPING_INTERVAL, delay_until
 
-from lcd1602 import clear, write
+
+class Screen:
+    """This class draws the clock and states from mailboxes in display layers.
+
+    It is used by display process and by asyncio runtime, clock and
+    mailboxes only have to share the doorbell.
+    """
+
+    def __init__(
+        self, clock, watch_setup_mailbox, ringing_mailbox, manual_watch_setup_mailbox
+    ) -> None:
+        self.clock = clock
+        self.watch_setup_mailbox = watch_setup_mailbox
+        self.ringing_mailbox = ringing_mailbox
+        self.manual_watch_setup_mailbox = manual_watch_setup_mailbox
+        self.clock_layer = Layer(CLOCK_PRIORITY)
+        self.watch_setup_layer = Layer(WATCH_SETUP_PRIORITY)
+        self.ringing_layer = Layer(RINGING_PRIORITY)
+        self.manual_watch_setup_layer = Layer(MANUAL_WATCH_SETUP_PRIORITY)
+        self.compositor = Compositor(
+            [
+                self.clock_layer,
+                self.watch_setup_layer,
+                self.ringing_layer,
+                self.manual_watch_setup_layer,
+            ]
+        )
+        # Sequence of the last displayed tick.
+        self.last_sequence = 0
+
+    def changed(self) -> bool:
+        """
+        Check if new tick or new state is published.
+        """
+        return self.clock.sequence() != self.last_sequence or any(
+            mailbox.depth()
+            for mailbox in [
+                self.watch_setup_mailbox,
+                self.ringing_mailbox,
+                self.manual_watch_setup_mailbox,
+            ]
+        )
+
+    def update(self) -> None:
+        """
+        Draw new tick and new states in their layers.
+        """
+        # Manual watch setup sends whole frames.
+        if self.manual_watch_setup_mailbox.depth():
+            self.manual_watch_setup_layer.set(self.manual_watch_setup_mailbox.get())
+
+        # Watch setup sends how many minutes is watch still late.
+        if self.watch_setup_mailbox.depth():
+            remaining_minutes = self.watch_setup_mailbox.get()
+            if remaining_minutes is None:
+                self.watch_setup_layer.set(None)
+            else:
+                self.watch_setup_layer.set(
+                    ["Pricekajte, sat", f"se namjesta!{remaining_minutes:>4}"]
+                )
+
+        if self.ringing_mailbox.depth():
+            ringing = self.ringing_mailbox.get()
+            if ringing is None:
+                self.ringing_layer.set(None)
+            else:
+                # In the first line show ringing name and
+                # in the second line show which bells are ringing.
+                self.ringing_layer.set([ringing[0:16], ringing[17:]])
+
+        tick = self.clock.read()
+        if tick is not None and tick.sequence != self.last_sequence:
+            self.last_sequence = tick.sequence
+            # In the first line show current date and
+            # in the second line show current time.
+            self.clock_layer.set([tick.date_string(), tick.time_string()])
+
+    def record_mailboxes(self, metrics: Metrics) -> None:
+        """
+        Record depth of mailboxes and number of values coalesced in them.
+        """
+        for name, mailbox in [
+            ("watch_setup", self.watch_setup_mailbox),
+            ("ringing", self.ringing_mailbox),
+            ("manual_watch_setup", self.manual_watch_setup_mailbox),
+        ]:
+            metrics.gauge(
+                "belfry_mailbox_depth", "Values waiting in mailbox.", mailbox=name
+            ).set(mailbox.depth())
+            coalesced = metrics.counter(
+                "belfry_mailbox_coalesced_total",
+                "Values overwritten in mailbox before they were read.",
+                mailbox=name,
+            )
+            coalesced.inc(mailbox.coalesced() - coalesced.value)
+
+    def flush(self, metrics: Metrics) -> None:
+        """
+        Flush composed frame to the display and count bytes written to I2C bus.
+        """
+        bytes_before = lcd1602.BYTES_WRITTEN
+        self.compositor.flush()
+        metrics.counter(
+            "belfry_lcd_bytes_written_total", "Bytes written to display I2C bus."
+        ).inc(lcd1602.BYTES_WRITTEN - bytes_before)
 
 
 def display(
-    current_datetime_queue_in: multiprocessing.Queue,
-    message_queue_in: multiprocessing.Queue,
+    shared_clock: SharedClock,
+    watch_setup_mailbox: Mailbox,
+    ringing_mailbox: Mailbox,
+    manual_watch_setup_mailbox: Mailbox,
 ) -> None:
     """This is main display function.
 
-    It displays messages from current_datetime_queue and message_queue.
+    It displays current datetime from shared clock and states from mailboxes.
+    Mailboxes keep only the newest state, so display never shows stale states.
+    Each of them is drawn in its own layer and composed frame is flushed
+    to the display once per update.
     """
-    # Flags which indicates which information to show on display.
-    show_watch_setup = False
-    show_ringing = False
-    manual_watch_setup = False
+    screen = Screen(
+        shared_clock, watch_setup_mailbox, ringing_mailbox, manual_watch_setup_mailbox
+    )
+
+    last_flush = 0.0
+    metrics = Metrics("display")
 
     while True:
-        if not message_queue_in.empty():
-            recieved_message = message_queue_in.get()
-            if recieved_message == "Watch setup started!":
-                if not show_ringing and not manual_watch_setup:
-                    write(0, 0, "Pricekajte, sat")
-                    write(0, 1, "se namjesta!")
-                show_watch_setup = True
-            elif recieved_message == "Watch setup is done!":
-                show_watch_setup = False
-                if not show_ringing:
-                    clear()
-            elif "Ringing" in recieved_message:
-                show_ringing = True
-                if not manual_watch_setup:
-                    clear()
-                    # In the first line show ringing name.
-                    write(0, 0, recieved_message[8:24])
-                    # In the second line show which bells are ringing.
-                    write(0, 1, recieved_message[25:])
-            elif "Stop ringing" in recieved_message:
-                show_ringing = False
-                if not show_watch_setup:
-                    clear()
-            elif recieved_message == "Manual watch setup started.":
-                manual_watch_setup = True
-            elif recieved_message == "Manual watch setup done.":
-                manual_watch_setup = False
-
-        elif not current_datetime_queue_in.empty():
-            current_date_and_time = current_datetime_queue_in.get()
-            if not show_watch_setup and not show_ringing and not manual_watch_setup:
-                # In the first line show current date.
-                write(0, 0, current_date_and_time[0:8])
-                # In the second line show current time.
-                write(0, 1, current_date_and_time[9:17])
-
-        else:
-            continue
+        # Block until new tick or new state is published.
+        wait_for_change(shared_clock.doorbell, screen.changed, HOUSEKEEPING_INTERVAL)
+        metrics.loop_iterations.inc()
+        metrics.export()
+        # Do not flush more often than I2C bus can keep up with.
+        delay_until(last_flush + FLUSH_INTERVAL)
+        screen.record_mailboxes(metrics)
+        screen.update()
+        screen.flush(metrics)
+        last_flush = hardware.clock.monotonic()
@@ -0,0 +1,171 @@
+"""Fake hardware module.
+
+It contains fake RPi.GPIO and smbus2 which are used to run belfry
+modules off the Raspberry Pi, for example in benchmarks, they are
+selected with hardware.use("fake").
+Fake GPIO records every output pin transition and fake SMBus
+counts bytes written to the bus and time they would take. Fake clock
+sync check stands in for the kernel in clock_sync module.
+"""
+
+import time
+import types
+
+import hardware
+
+
+class FakeGPIO(types.ModuleType):
+    """
+    Fake RPi.GPIO module which keeps pin levels in memory.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self) -> None:
+        super().__init__("RPi.GPIO")
+        self.levels = {}
+        # List of (wall-clock time, pin, level) tuples.
+        self.transitions = []
+        # Edge detection callbacks of input pins.
+        self.edge_callbacks = {}
+
+    def setmode(self, mode: int) -> None:
+        pass
+
+    def setwarnings(self, flag: bool) -> None:
+        pass
+
+    def setup(self, pin: int, mode: int, pull_up_down: int = PUD_OFF) -> None:
+        if mode == self.IN and pull_up_down == self.PUD_UP:
+            self.levels[pin] = self.HIGH
+        else:
+            self.levels[pin] = self.LOW
+
+    def output(self, pin: int, value: int) -> None:
+        if self.levels.get(pin) != value:
+            self.transitions.append((hardware.clock.time(), pin, value))
+        self.levels[pin] = value
+
+    def input(self, pin: int) -> int:
+        return self.levels.get(pin, self.LOW)
+
+    def add_event_detect(
+        self, pin: int, edge: int, callback=None, bouncetime: int = None
+    ) -> None:
+        self.edge_callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin: int) -> None:
+        self.edge_callbacks.pop(pin, None)
+
+    def set_input(self, pin: int, value: int) -> None:
+        """
+        Set level of input pin, as if button was pressed or released,
+        edge detection callback is called if level changed.
+        """
+        previous = self.levels.get(pin, self.LOW)
+        self.levels[pin] = value
+        if value == previous or pin not in self.edge_callbacks:
+            return
+        edge, callback = self.edge_callbacks[pin]
+        if edge == self.BOTH or edge == (self.RISING if value else self.FALLING):
+            if callback is not None:
+                callback(pin)
+
+    def inject_edges(self, pin: int, edges: list[tuple[float, int]]) -> None:
+        """
+        Set input pin to levels one after another, each after its delay,
+        for example contact bounce: [(0, LOW), (0.002, HIGH), (0.001, LOW)].
+        """
+        for edge_delay, value in edges:
+            time.sleep(edge_delay)
+            self.set_input(pin, value)
+
+
+# I2C bus clock frequency, each byte takes 9 clock cycles.
+I2C_FREQUENCY = 100000  # [Hz]
+# Time of start and stop condition and system call of every transfer.
+I2C_TRANSFER_OVERHEAD = 0.00005  # [s]
+
+
+class FakeI2CMessage:
+    """
+    Fake smbus2.i2c_msg, only writing is supported.
+    """
+
+    def __init__(self, addr: int, data: list[int]) -> None:
+        self.addr = addr
+        self.data = list(data)
+
+    @classmethod
+    def write(cls, addr: int, data: list[int]) -> "FakeI2CMessage":
+        return cls(addr, data)
+
+
+class FakeSMBus:
+    """
+    Fake smbus2.SMBus which counts transfers and bytes written.
+    """
+
+    def __init__(self, bus: int = 1) -> None:
+        self.transfers = 0
+        self.bytes_written = 0
+        # Time which transfers would take on real I2C bus.
+        self.bus_time = 0.0
+        # Last byte written to each address.
+        self.outputs = {}
+
+    def _transfer(self, addr: int, data: list[int]) -> None:
+        self.transfers += 1
+        self.bytes_written += len(data)
+        # Address byte is sent before data.
+        self.bus_time += I2C_TRANSFER_OVERHEAD + (len(data) + 1) * 9 / I2C_FREQUENCY
+        if data:
+            self.outputs[addr] = data[-1]
+
+    def write_byte(self, addr: int, value: int) -> None:
+        self._transfer(addr, [value])
+
+    def write_i2c_block_data(self, addr: int, register: int, data: list[int]) -> None:
+        self._transfer(addr, [register] + list(data))
+
+    def i2c_rdwr(self, *messages: FakeI2CMessage) -> None:
+        for message in messages:
+            self._transfer(message.addr, message.data)
+
+    def close(self) -> None:
+        pass
+
+
+def fake_smbus() -> types.ModuleType:
+    """
+    Make fake smbus2 module.
+    """
+    smbus = types.ModuleType("smbus2")
+    smbus.SMBus = FakeSMBus
+    smbus.i2c_msg = FakeI2CMessage
+    return smbus
+
+
+class FakeClockSync:
+    """
+    Fake clock sync check which tells that clock is synchronized after delay.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.synchronized_at = hardware.clock.monotonic() + delay
+        self.checks = 0
+
+    def __call__(self) -> bool:
+        self.checks += 1
+        return hardware.clock.monotonic() >= self.synchronized_at
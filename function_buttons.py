@@ -13,9 +13,14 @@ it is in logical False state bell program is deactivated.
 
 import datetime
 import multiprocessing
-import time
 
-import RPi.GPIO as GPIO
+import hardware
+from buttons import PRESS, ButtonEvent, ButtonInput, EventInbox
+from channels import wait_for_change
+from clock import ClockTick, MinuteBoundaries, SharedClock
+from hardware import GPIO
+from metrics import Metrics
+from utils import HOUSEKEEPING_INTERVAL
 
 # Use Raspberry Pi 4B board pin numbers.
 GPIO.setmode(GPIO.BCM)
@@ -34,6 +39,9 @@ F1_LED = 21
 buttons = [F0_BUTTON, F1_BUTTON]
 leds = [F0_LED, F1_LED]
 
+# Program state elapses at most this late, if ticks come late or they are skipped.
+MAX_EXPIRE_LATENESS = 60 * 60  # [s]
+
 # Set up GPIO pin modes.
 for pin in buttons:
     GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
@@ -42,19 +50,6 @@ for pin in leds:
     GPIO.setup(pin, GPIO.OUT)
 
 
-def is_pressed(previous_pressed: bool, button: int) -> bool:
-    """This function checks if button is pressed.
-
-    Note: Button is pressed when input pin is LOW and
-    button previously was not pressed.
-    """
-    if not GPIO.input(button):
-        if previous_pressed == False:
-            return True
-    else:
-        return False
-
-
 def log_function_buttons_states(
     function_buttons_states: list[bool], current_datetime: datetime.datetime
 ) -> None:
@@ -107,11 +102,11 @@ def get_program_states() -> list:
 
     # Set states elapse datetime.
     states_datetime = [
-        datetime.datetime.now().replace(hour=13, minute=0, second=0),
-        datetime.datetime.now().replace(hour=15, minute=0, second=0),
+        hardware.clock.now().replace(hour=13, minute=0, second=0),
+        hardware.clock.now().replace(hour=15, minute=0, second=0),
     ]
     for i in range(len(states_datetime)):
-        if datetime.datetime.now() > states_datetime[i]:
+        if hardware.clock.now() > states_datetime[i]:
             states_datetime[i] = states_datetime[i] + datetime.timedelta(days=1)
 
     # Check for logged program states.
@@ -127,93 +122,133 @@ def get_program_states() -> list:
     return program_states
 
 
+class FunctionButtons:
+    """This class keeps function buttons and program states.
+
+    It is used by function buttons process and by asyncio runtime.
+    Every program states change is logged, so states persist
+    even if program restarts.
+    """
+
+    def __init__(self) -> None:
+        # Declare initial state.
+        self.program_states = get_program_states()
+        self.boundaries = MinuteBoundaries(MAX_EXPIRE_LATENESS)
+
+    def _log(self) -> None:
+        log_function_buttons_states(
+            current_datetime=hardware.clock.now(),
+            function_buttons_states=self.program_states,
+        )
+
+    def handle_event(self, event: ButtonEvent) -> bool:
+        """
+        Change program state when its button is pressed,
+        it returns True if program states changed.
+        """
+        if event.kind != PRESS or event.pin not in buttons:
+            return False
+        i = buttons.index(event.pin)
+        # Change current program state.
+        self.program_states[i] = not self.program_states[i]
+        self._log()
+        return True
+
+    def expire(self, tick: ClockTick) -> bool:
+        """
+        Set elapsed program states to False, it returns True if
+        program states changed. States elapse at minutes crossed
+        since the previous tick, so late or skipped tick does not miss it.
+        """
+        changed = False
+        for minute in self.boundaries.crossed(tick.to_datetime()):
+            # State 0 elapses when it is 13:00h.
+            if self.program_states[0] and minute.hour == 13 and minute.minute == 0:
+                # Change current program state.
+                self.program_states[0] = False
+                self._log()
+                changed = True
+            # State 1 elapses when it is 15:00h.
+            elif self.program_states[1] and minute.hour == 15 and minute.minute == 0:
+                # Change current program state.
+                self.program_states[1] = False
+                self._log()
+                changed = True
+        return changed
+
+    def show_states(self) -> None:
+        """
+        Set LEDs states based on program states.
+        """
+        for led, state in zip(leds, self.program_states):
+            if state:
+                GPIO.output(led, GPIO.HIGH)
+            else:
+                GPIO.output(led, GPIO.LOW)
+
+
 def function_buttons(
     states_queue_for_bells: multiprocessing.Queue,
-    current_datetime_queue_in: multiprocessing.Queue,
+    shared_clock: SharedClock,
     message_queue_in: multiprocessing.Queue,
 ) -> None:
     """This is main function for function buttons.
 
-    It checks button states and change program states if needed.
+    It waits for button events and ticks, and changes program states if needed.
     On program states change, it sends new program states to other processes.
-
-    Logging program states is used to persist states even if program restarts.
     """
-    # Declare initial states.
-    buttons_state = [False, False]
-    program_states = get_program_states()
+    buttons_and_states = FunctionButtons()
+    buttons_and_states.show_states()
+
+    # Button events ring the same doorbell as the clock.
+    button_events = EventInbox(shared_clock.doorbell)
+    button_input = ButtonInput(buttons)
+    button_input.subscribe(button_events)
+    button_input.start()
 
     # Manual watch setup is not currently performed.
     manual_watch_setup = False
+    # Sequence of the last processed tick.
+    last_sequence = 0
+    metrics = Metrics("function_buttons")
+    events_depth = metrics.queue_depth("button_events")
 
     while True:
+        # Block until new tick or button event.
+        wait_for_change(
+            shared_clock.doorbell,
+            lambda: shared_clock.sequence() != last_sequence or button_events.depth(),
+            HOUSEKEEPING_INTERVAL,
+        )
+        metrics.loop_iterations.inc()
+        metrics.export()
+        events_depth.set(button_events.depth())
+
         # Check if manual watch setup is performed.
-        if not message_queue_in.empty():
+        while not message_queue_in.empty():
             recieved_message = message_queue_in.get()
             if recieved_message == "Manual watch setup started.":
                 manual_watch_setup = True
             elif recieved_message == "Manual watch setup done.":
                 manual_watch_setup = False
 
-        if not manual_watch_setup:
-            # Get current buttons states.
-            for i, button, state in zip(range(len(buttons)), buttons, buttons_state):
-                buttons_state[i] = is_pressed(button=button, previous_pressed=state)
-                if buttons_state[i]:
-                    # Change current program state.
-                    program_states[i] = not program_states[i]
-                    # Send new program states to other processes.
-                    states_queue_for_bells.put(program_states)
-                    log_function_buttons_states(
-                        current_datetime=datetime.datetime.now(),
-                        function_buttons_states=program_states,
-                    )
-
-            # Debounce delay.
-            time.sleep(0.1)
-
-            if not current_datetime_queue_in.empty():
-                recieved_message = current_datetime_queue_in.get()
-                # Convert str to datetime.
-                current_datetime = datetime.datetime.strptime(
-                    recieved_message, "%d/%m/%y %H:%M:%S"
-                )
+        changed = False
+        while button_events.depth():
+            event = button_events.get()
+            # Function buttons are used for watch setup during manual watch setup.
+            if not manual_watch_setup:
+                changed = buttons_and_states.handle_event(event) or changed
+
+        tick = shared_clock.read()
+        if tick is not None and tick.sequence != last_sequence:
+            last_sequence = tick.sequence
+            # If state is elapsed set state to False.
+            changed = buttons_and_states.expire(tick) or changed
 
-                # If state is elapsed set state to False.
-                # State 0 elapses when it is 13:00h.
-                if (
-                    program_states[0]
-                    and current_datetime.hour == 13
-                    and current_datetime.minute == 0
-                    and current_datetime.second == 0
-                ):
-                    # Change current program state.
-                    program_states[0] = False
-                    # Send new program states to other processes.
-                    states_queue_for_bells.put(program_states)
-                    log_function_buttons_states(
-                        current_datetime=datetime.datetime.now(),
-                        function_buttons_states=program_states,
-                    )
-                # State 1 elapses when it is 15:00h.
-                elif (
-                    program_states[1]
-                    and current_datetime.hour == 15
-                    and current_datetime.minute == 0
-                    and current_datetime.second == 0
-                ):
-                    # Change current program state.
-                    program_states[1] = False
-                    # Send new program states to other processes.
-                    states_queue_for_bells.put(program_states)
-                    log_function_buttons_states(
-                        current_datetime=datetime.datetime.now(),
-                        function_buttons_states=program_states,
-                    )
-
-            # Set LEDs states based on program states.
-            for led, state in zip(leds, program_states):
-                if state:
-                    GPIO.output(led, GPIO.HIGH)
-                else:
-                    GPIO.output(led, GPIO.LOW)
+        if changed:
+            # Send new program states to other processes.
+            states_queue_for_bells.put(buttons_and_states.program_states)
+
+        # Manual watch setup uses LEDs while it is performed.
+        if not manual_watch_setup:
+            buttons_and_states.show_states()
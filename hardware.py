@@ -0,0 +1,114 @@
+"""Hardware module.
+
+Belfry modules get GPIO, SMBus and time through this module, so they
+run on Raspberry Pi, on fake hardware off the Pi, or in simulator
+in virtual time.
+
+Backend is selected by BELFRY_HARDWARE environment variable (real,
+fake or simulator) or by use(), before belfry modules are imported:
+
+    BELFRY_HARDWARE=fake python3 main.py
+
+Clock is looked up at every call as hardware.clock, so it can be
+replaced at any time, simulator replaces it with virtual clock.
+"""
+
+import datetime
+import os
+import time
+from time import perf_counter
+
+REAL = "real"
+FAKE = "fake"
+SIMULATOR = "simulator"
+
+# Backend which is used if use() is not called.
+DEFAULT_BACKEND = os.environ.get("BELFRY_HARDWARE", REAL)
+
+# Coarse sleep wakes up this long before the deadline,
+# the rest of the time is spent spinning on perf counter.
+SPIN_GUARD = 0.0005  # [s]
+
+
+class SystemClock:
+    """
+    Clock which tells real time.
+    """
+
+    spin_guard = SPIN_GUARD
+
+    def time(self) -> float:
+        """
+        Get wall-clock time, seconds since the epoch.
+        """
+        return time.time()
+
+    def monotonic(self) -> float:
+        """
+        Get monotonic time in seconds, used for deadlines and durations.
+        """
+        return perf_counter()
+
+    def now(self) -> datetime.datetime:
+        """
+        Get current local date and time.
+        """
+        return datetime.datetime.now()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def sleep_until(self, deadline: float) -> None:
+        """
+        Sleep until monotonic time reaches the deadline.
+        """
+        remaining = deadline - perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+clock = SystemClock()
+
+# Name of the selected backend, None until it is selected.
+backend = None
+
+
+def use(name: str):
+    """This function selects hardware backend and returns its GPIO module.
+
+    Backend can be selected only once, it has to be selected before
+    belfry modules are imported, because they set up GPIO pins on import.
+    """
+    global backend, GPIO, smbus
+    if backend == name:
+        return GPIO
+    if backend is not None:
+        raise RuntimeError(f"Hardware backend {backend} is already selected.")
+
+    if name == REAL:
+        import RPi.GPIO as gpio_module
+        import smbus2 as smbus_module
+    elif name == FAKE:
+        from fake_hardware import FakeGPIO, fake_smbus
+
+        gpio_module = FakeGPIO()
+        smbus_module = fake_smbus()
+    elif name == SIMULATOR:
+        from simulator import simulated_hardware
+
+        gpio_module, smbus_module = simulated_hardware()
+    else:
+        raise ValueError(f"Unknown hardware backend {name}.")
+
+    backend = name
+    GPIO = gpio_module
+    smbus = smbus_module
+    return GPIO
+
+
+def __getattr__(name: str):
+    # GPIO and smbus are loaded from default backend on first use.
+    if name in ("GPIO", "smbus"):
+        use(DEFAULT_BACKEND)
+        return globals()[name]
+    raise AttributeError(f"module {__name__} has no attribute {name}")
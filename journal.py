@@ -0,0 +1,213 @@
+"""Watch journal module.
+
+Journal is append-only text file in which every handle move is recorded
+twice, intent record is written before motor starts and commit record
+after it stops. Watch position and last moved handle are recovered by
+replaying the journal, and intent without commit tells exactly which
+motor pulse was interrupted by a power cut. Interrupted pulse is taken
+as done, motor had started, so watch setup continues from the handle
+position after it, and interrupted minute handle pulse is followed by
+hour handle pulse which synchronizes handles.
+
+Journal records look like this:
+
+    S 11:46 hour_handle      snapshot, watch position and last moved handle
+    I minute_handle 11:46    intent, handle is about to move
+    C minute_handle 11:46    commit, handle moved, watch position after move
+"""
+
+import os
+from typing import NamedTuple, Optional
+
+from utils import atomic_write
+
+JOURNAL_FILE = "watch_journal.txt"
+
+# Files used before the journal, they are read only if journal does not exist.
+LEGACY_WATCH_TIME_FILE = "watch_time.txt"
+LEGACY_HANDLES_MOVEMENT_LOG_FILE = "handles_movement_log.txt"
+
+# Journal is compacted into single snapshot when it has this many records.
+COMPACT_RECORDS = 1000
+
+# Watch has 12 hours dial.
+MINUTES_ON_DIAL = 12 * 60
+
+MINUTE_HANDLE_NAME = "minute_handle"
+HOUR_HANDLE_NAME = "hour_handle"
+BOTH_HANDLES_NAME = "both_handles"
+
+
+class JournalState(NamedTuple):
+    """
+    State of the watch recovered from the journal.
+    """
+
+    # Minute of 12 hours shown by handles.
+    position: int
+    # Name of the handle which moved last.
+    last_moved: str
+    # Name of the handle whose move was interrupted, None if no move was.
+    interrupted: Optional[str] = None
+
+
+def position_to_string(position: int) -> str:
+    """
+    Convert watch position to "HH:MM" string.
+    """
+    return f"{position // 60:02}:{position % 60:02}"
+
+
+def position_from_string(text: str) -> int:
+    """
+    Convert "HH:MM" or "HH:MM:SS" string to watch position.
+    """
+    hours, minutes = text.split(":")[:2]
+    return (int(hours) * 60 + int(minutes)) % MINUTES_ON_DIAL
+
+
+def apply_commit(state: JournalState, handles: str) -> JournalState:
+    """
+    Get state after handles moved, watch position changes when hour handle moves.
+    """
+    if handles == MINUTE_HANDLE_NAME:
+        return JournalState(state.position, MINUTE_HANDLE_NAME)
+    return JournalState((state.position + 1) % MINUTES_ON_DIAL, HOUR_HANDLE_NAME)
+
+
+def replay(lines: list[str]) -> JournalState:
+    """This function replays journal records and returns the recovered state.
+
+    Incomplete last line, which is left when power is cut while
+    the record is written, is ignored.
+    """
+    state = None
+    for line in lines:
+        record = line.split()
+        if len(record) != 3:
+            continue
+        kind, first, second = record
+        if kind == "S":
+            state = JournalState(position_from_string(first), second)
+        elif state is None:
+            continue
+        elif kind == "I":
+            state = state._replace(interrupted=first)
+        elif kind == "C" and first == state.interrupted:
+            state = apply_commit(state, first)
+    if state is None:
+        raise ValueError("Watch journal has no snapshot record.")
+    return state
+
+
+def read_legacy_state() -> JournalState:
+    """
+    Read state from files which were used before the journal.
+    """
+    with open(LEGACY_WATCH_TIME_FILE, "r") as txt_file:
+        position = position_from_string(txt_file.readline().strip())
+    try:
+        with open(LEGACY_HANDLES_MOVEMENT_LOG_FILE, "r") as txt_file:
+            last_moved = txt_file.readline().strip()
+    except FileNotFoundError:
+        last_moved = HOUR_HANDLE_NAME
+    if last_moved != MINUTE_HANDLE_NAME:
+        last_moved = HOUR_HANDLE_NAME
+    return JournalState(position, last_moved)
+
+
+class Journal:
+    """This class appends records to the watch journal.
+
+    Only one process may write to the journal. Commit records are not
+    synced right away, they are synced together with the next intent,
+    by sync() which writer calls when it is idle or before it reports
+    that the move is done, and by close().
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE) -> None:
+        self.path = path
+        self.state = None
+        self.records = 0
+        self.unsynced = False
+        self._file = None
+
+    def recover(self) -> JournalState:
+        """
+        Replay the journal, take interrupted move as done and compact it,
+        journal is created from legacy files if it does not exist.
+        """
+        try:
+            with open(self.path, "r") as txt_file:
+                self.state = replay(txt_file.readlines())
+        except FileNotFoundError:
+            self.state = read_legacy_state()
+        if self.state.interrupted is not None:
+            print(f"Last {self.state.interrupted} move was interrupted, taken as done.")
+            self.state = apply_commit(self.state, self.state.interrupted)
+        # Snapshot keeps the recovered state, interrupted move included.
+        self.compact()
+        return self.state
+
+    def compact(self) -> None:
+        """
+        Replace all records with single snapshot record.
+        """
+        if self._file is not None:
+            self._file.close()
+        atomic_write(self.path, self._snapshot_record(self.state.position))
+        self._file = open(self.path, "a")
+        self.records = 1
+        self.unsynced = False
+
+    def _snapshot_record(self, position: int) -> str:
+        return f"S {position_to_string(position)} {self.state.last_moved}\n"
+
+    def _append(self, record: str, sync: bool) -> None:
+        self._file.write(record)
+        self.records += 1
+        self.unsynced = True
+        if sync:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Make all appended records durable.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.unsynced = False
+
+    def close(self) -> None:
+        """
+        Sync the journal and close it.
+        """
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def append_intent(self, handles: str) -> None:
+        """
+        Record that handles are about to move, writer syncs it while handles
+        are moving so the motor start is not delayed.
+        """
+        self._append(f"I {handles} {position_to_string(self.state.position)}\n", False)
+        self.state = self.state._replace(interrupted=handles)
+
+    def append_commit(self, handles: str) -> None:
+        """
+        Record that handles have moved.
+        """
+        self.state = apply_commit(self.state, handles)
+        self._append(f"C {handles} {position_to_string(self.state.position)}\n", False)
+        if self.records >= COMPACT_RECORDS:
+            self.compact()
+
+    def append_snapshot(self, position: int, last_moved: str) -> None:
+        """
+        Record watch position and last moved handle set by hand.
+        """
+        self.state = JournalState(position, last_moved)
+        self._append(self._snapshot_record(position), True)
@@ -3,15 +3,49 @@ This is module for I2C communication with 16x2 Display, copied from:
 https://toptechboy.com/library-for-i2c-connection-of-the-lcd1602-to-the-raspberry-pi/
 """
 
-import time
-
-import smbus2 as smbus
+import hardware
+from hardware import smbus
 
 BUS = smbus.SMBus(1)
 
+# Send whole command or string to display in one I2C transfer,
+# if it is False every byte is sent by separate transfer.
+BATCH_TRANSFERS = True
+
+# HD44780 timings from datasheet. Enable pulse (450 ns) and execution time
+# of most commands (37 us) are shorter than sending one byte over I2C,
+# so only clear and return home commands have to be waited for.
+CLEAR_EXECUTION_TIME = 0.00152  # [s]
+SLOW_COMMANDS = [0x01, 0x02]  # Clear Screen, Return Home
+
+# Initialization by instruction, display is in 8-bit mode until the last
+# nibble switches it to 4-bit mode. Nibbles and waits after them.
+INIT_NIBBLES = [
+    (0x30, 0.0041),  # [s]
+    (0x30, 0.0001),  # [s]
+    (0x30, 0.0001),  # [s]
+    (0x20, 0.0001),  # [s]
+]
+
+# Bits of PCF8574 output byte.
+REGISTER_SELECT = 0x01
+ENABLE = 0x04
+BACKLIGHT = 0x08
+
+COLUMNS = 16
+ROWS = 2
+
+# Shadow framebuffer, characters which are currently on the display.
+SHADOW = [[" "] * COLUMNS for _ in range(ROWS)]
+
+# Number of bytes written to I2C bus.
+BYTES_WRITTEN = 0
+
 
 def write_word(addr, data) -> None:
     global BLEN
+    global BYTES_WRITTEN
+    BYTES_WRITTEN += 1
     temp = data
     if BLEN == 1:
         temp |= 0x08
@@ -20,12 +54,54 @@ def write_word(addr, data) -> None:
     BUS.write_byte(addr, temp)
 
 
+def nibble_bytes(value: int, mode: int) -> list[int]:
+    """This function gets PCF8574 output bytes which send one byte to display.
+
+    Display is in 4-bit mode, so high and low nibble are sent one after
+    another, each of them is latched on falling edge of enable bit.
+    """
+    high_nibble = (value & 0xF0) | mode
+    low_nibble = ((value & 0x0F) << 4) | mode
+    if BLEN == 1:
+        high_nibble |= BACKLIGHT
+        low_nibble |= BACKLIGHT
+    return [
+        high_nibble | ENABLE,
+        high_nibble,
+        low_nibble | ENABLE,
+        low_nibble,
+    ]
+
+
+def write_block(data: list[int]) -> None:
+    """
+    Write bytes to display in one I2C transfer.
+    """
+    global BYTES_WRITTEN
+    BYTES_WRITTEN += len(data)
+    BUS.i2c_rdwr(smbus.i2c_msg.write(LCD_ADDR, data))
+
+
+def send_init_nibble(nibble: int) -> None:
+    """
+    Send one initialization nibble, every byte in separate I2C transfer.
+    """
+    for byte in nibble_bytes(nibble, 0)[:2]:
+        write_word(LCD_ADDR, byte)
+
+
 def send_command(comm) -> None:
+    if BATCH_TRANSFERS:
+        write_block(nibble_bytes(comm, 0))
+        if comm in SLOW_COMMANDS:
+            hardware.clock.sleep(CLEAR_EXECUTION_TIME)
+        return
+
     # Send bit7-4 firstly
     buf = comm & 0xF0
     buf |= 0x04  # RS = 0, RW = 0, EN = 1
     write_word(LCD_ADDR, buf)
-    time.sleep(0.002)
+    hardware.clock.sleep(0.002)
     buf &= 0xFB  # Make EN = 0
     write_word(LCD_ADDR, buf)
 
@@ -33,17 +109,21 @@ def send_command(comm) -> None:
     buf = (comm & 0x0F) << 4
     buf |= 0x04  # RS = 0, RW = 0, EN = 1
     write_word(LCD_ADDR, buf)
-    time.sleep(0.002)
+    hardware.clock.sleep(0.002)
     buf &= 0xFB  # Make EN = 0
     write_word(LCD_ADDR, buf)
 
 
 def send_data(data) -> None:
+    if BATCH_TRANSFERS:
+        write_block(nibble_bytes(data, REGISTER_SELECT))
+        return
+
     # Send bit7-4 firstly
     buf = data & 0xF0
     buf |= 0x05  # RS = 1, RW = 0, EN = 1
     write_word(LCD_ADDR, buf)
-    time.sleep(0.002)
+    hardware.clock.sleep(0.002)
     buf &= 0xFB  # Make EN = 0
     write_word(LCD_ADDR, buf)
 
@@ -51,7 +131,7 @@ def send_data(data) -> None:
     buf = (data & 0x0F) << 4
     buf |= 0x05  # RS = 1, RW = 0, EN = 1
     write_word(LCD_ADDR, buf)
-    time.sleep(0.002)
+    hardware.clock.sleep(0.002)
     buf &= 0xFB  # Make EN = 0
     write_word(LCD_ADDR, buf)
 
@@ -64,14 +144,20 @@ def init(addr, bl) -> bool:
     LCD_ADDR = addr
     BLEN = bl
     try:
-        send_command(0x33)  # Must initialize to 8-line mode at first
-        time.sleep(0.005)
-        send_command(0x32)  # Then initialize to 4-line mode
-        time.sleep(0.005)
+        if BATCH_TRANSFERS:
+            # Reset nibbles are never batched, display needs time between them.
+            for nibble, wait in INIT_NIBBLES:
+                send_init_nibble(nibble)
+                hardware.clock.sleep(wait)
+        else:
+            send_command(0x33)  # Must initialize to 8-line mode at first
+            hardware.clock.sleep(0.005)
+            send_command(0x32)  # Then initialize to 4-line mode
+            hardware.clock.sleep(0.005)
         send_command(0x28)  # 2 Lines & 5*7 dots
-        time.sleep(0.005)
+        hardware.clock.sleep(0.005)
         send_command(0x0C)  # Enable display without cursor
-        time.sleep(0.005)
+        hardware.clock.sleep(0.005)
         send_command(0x01)  # Clear Screen
         BUS.write_byte(LCD_ADDR, 0x08)
     except:
@@ -82,6 +168,8 @@ def init(addr, bl) -> bool:
 
 def clear() -> None:
     send_command(0x01)  # Clear Screen
+    for row in SHADOW:
+        row[:] = [" "] * COLUMNS
 
 
 def openlight() -> None:  # Enable the backlight
@@ -99,14 +187,77 @@ def write(x, y, str) -> None:
     if y > 1:
         y = 1
 
+    # Remember what is on the display.
+    for column, chr in enumerate(str[: COLUMNS - x], start=x):
+        SHADOW[y][column] = chr
+
     # Move cursor
     addr = 0x80 + 0x40 * y + x
+
+    if BATCH_TRANSFERS:
+        # Send cursor move and all characters in one transfer.
+        data = nibble_bytes(addr, 0)
+        for chr in str:
+            data += nibble_bytes(ord(chr), REGISTER_SELECT)
+        write_block(data)
+        return
+
     send_command(addr)
 
     for chr in str:
         send_data(ord(chr))
 
 
+def changed_runs(frame: list[str]) -> list[tuple[int, int, str]]:
+    """This function compares frame with shadow framebuffer and returns
+    runs of changed characters as (x, y, text) tuples.
+
+    Runs separated by only one unchanged character are merged, because
+    rewriting that character costs the same as moving the cursor.
+    """
+    runs = []
+    for y, line in enumerate(frame):
+        line = line[:COLUMNS].ljust(COLUMNS)
+        changed = [x for x in range(COLUMNS) if line[x] != SHADOW[y][x]]
+        start = None
+        for x in changed:
+            if start is None:
+                start = end = x
+            elif x - end <= 2:
+                end = x
+            else:
+                runs.append((start, y, line[start : end + 1]))
+                start = end = x
+        if start is not None:
+            runs.append((start, y, line[start : end + 1]))
+    return runs
+
+
+def show(frame: list[str]) -> None:
+    """This function shows frame (one string for each row) on the display.
+
+    Only characters which differ from the shadow framebuffer are sent,
+    so display is updated without clear() and without flicker.
+    """
+    runs = changed_runs(frame)
+    if not runs:
+        return
+
+    if not BATCH_TRANSFERS:
+        for x, y, text in runs:
+            write(x, y, text)
+        return
+
+    # Send all cursor moves and characters in one transfer.
+    data = []
+    for x, y, text in runs:
+        data += nibble_bytes(0x80 + 0x40 * y + x, 0)
+        for column, chr in enumerate(text, start=x):
+            data += nibble_bytes(ord(chr), REGISTER_SELECT)
+            SHADOW[y][column] = chr
+    write_block(data)
+
+
 if __name__ == "__main__":
     init(0x27, 1)  # 27 is I2C address of display, 1 is backlight ON
     write(0, 0, "Test...")
@@ -0,0 +1,147 @@
+"""Liturgical calendar module.
+
+Date rules tell on which date of a year bell program rings, rules are
+written like rules of the time zone database:
+
+    12-25          fixed date, month and day
+    easter         Easter Sunday, Gregorian computus
+    easter+49      days after (or before, with -) Easter, here Pentecost
+    sun>=11-27     the first weekday on or after the date, here first
+                   Sunday of Advent, sun>=05-08 is the second Sunday of May
+    lastsun-10     the last weekday of the month
+
+Every rule may end with days offset, sun>=11-27+7 is second Sunday
+of Advent. Rules are expanded once per year into dates.
+"""
+
+import datetime
+import re
+from typing import NamedTuple, Optional
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+MINUTES_IN_DAY = 24 * 60
+
+EASTER = "easter"
+FIXED = "fixed"
+WEEKDAY_ON_OR_AFTER = "weekday_on_or_after"
+LAST_WEEKDAY = "last_weekday"
+
+DATE_RULE_PATTERN = re.compile(
+    r"(?:(?P<easter>easter)"
+    r"|(?P<after>mon|tue|wed|thu|fri|sat|sun)>=(?P<after_date>\d\d-\d\d)"
+    r"|last(?P<last>mon|tue|wed|thu|fri|sat|sun)-(?P<last_month>\d\d)"
+    r"|(?P<fixed_date>\d\d-\d\d))"
+    r"(?P<offset>[+-]\d+)?"
+)
+
+
+class DateRule(NamedTuple):
+    """
+    Parsed date rule.
+    """
+
+    kind: str
+    month: int = 0
+    day: int = 0
+    weekday: int = 0
+    # Days added to the date.
+    offset: int = 0
+
+
+def easter_date(year: int) -> datetime.date:
+    """
+    Get date of Easter Sunday in Gregorian calendar (Meeus/Jones/Butcher).
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    # Days from Paschal full moon to the next Sunday.
+    to_sunday = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * to_sunday) // 451
+    month, day = divmod(h + to_sunday - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def minute_of_date(date: datetime.date, hour: int, minute: int) -> int:
+    """
+    Convert date, hour and minute to minute since the start of the calendar.
+    """
+    return date.toordinal() * MINUTES_IN_DAY + hour * 60 + minute
+
+
+def parse_month_day(text: str) -> tuple[int, int]:
+    """
+    Convert "MM-DD" string to month and day, February 29 is allowed.
+    """
+    month, day = (int(part) for part in text.split("-"))
+    # Leap year, so every day which exists in any year is accepted.
+    datetime.date(2000, month, day)
+    return month, day
+
+
+def parse_date_rule(text: str) -> DateRule:
+    """
+    Parse date rule, it raises ValueError if rule is not valid.
+    """
+    match = DATE_RULE_PATTERN.fullmatch(text) if isinstance(text, str) else None
+    if match is None:
+        raise ValueError(f"date rule {text!r} is not valid")
+    offset = int(match["offset"] or 0)
+    try:
+        if match["easter"]:
+            return DateRule(EASTER, offset=offset)
+        if match["after"]:
+            month, day = parse_month_day(match["after_date"])
+            weekday = DAY_NAMES.index(match["after"])
+            return DateRule(WEEKDAY_ON_OR_AFTER, month, day, weekday, offset)
+        if match["last"]:
+            month = int(match["last_month"])
+            # Check month.
+            datetime.date(2000, month, 1)
+            weekday = DAY_NAMES.index(match["last"])
+            return DateRule(LAST_WEEKDAY, month, weekday=weekday, offset=offset)
+        month, day = parse_month_day(match["fixed_date"])
+        return DateRule(FIXED, month, day, offset=offset)
+    except ValueError:
+        raise ValueError(f"date in date rule {text!r} does not exist") from None
+
+
+def rule_date(rule: DateRule, year: int) -> Optional[datetime.date]:
+    """
+    Get date of the rule in the year, None if the date does not exist this year.
+    """
+    if rule.kind == EASTER:
+        date = easter_date(year)
+    elif rule.kind == LAST_WEEKDAY:
+        next_month = datetime.date(year + rule.month // 12, rule.month % 12 + 1, 1)
+        date = next_month - datetime.timedelta(days=1)
+        date -= datetime.timedelta(days=(date.weekday() - rule.weekday) % 7)
+    else:
+        try:
+            date = datetime.date(year, rule.month, rule.day)
+        except ValueError:
+            # February 29 in common year.
+            return None
+        if rule.kind == WEEKDAY_ON_OR_AFTER:
+            date += datetime.timedelta(days=(rule.weekday - date.weekday()) % 7)
+    return date + datetime.timedelta(days=rule.offset)
+
+
+def expand_date_rules(rules: list[DateRule], year: int) -> list[datetime.date]:
+    """
+    This function expands date rules into sorted dates of the year.
+    """
+    dates = set()
+    for rule in rules:
+        # Offset can move date of neighbouring year into this year.
+        rule_years = (year - 1, year, year + 1) if rule.offset else (year,)
+        for rule_year in rule_years:
+            date = rule_date(rule, rule_year)
+            if date is not None and date.year == year:
+                dates.add(date)
+    return sorted(dates)
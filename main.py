@@ -36,59 +36,110 @@ FREE GPIO PINS: 4, 25
 """
 
 import multiprocessing
-import time
 
+import asyncio_runtime
+import hardware
 from bells import bells
+from channels import Mailbox
+from clock import SharedClock
+from clock_sync import clock_synchronized, wait_for_clock_sync
 from display import display
 from function_buttons import function_buttons
 from lcd1602 import clear, init, write
 from manual_watch_setup import manual_watch_setup
-from watch import watch
+from metrics import Metrics
+from watch import HandleMotors, watch
+
+# Run all modules as asyncio tasks in one process instead of five processes.
+ASYNCIO_RUNTIME = False
 
 # Display init.
 init(0x27, 1)  # 27 is I2C address of display, 1 is backlight ON
 
 
-def show_initial_message() -> None:
-    """
-    This function shows initial message on startup.
+def show_initial_message() -> tuple[bool, float]:
+    """This function shows initial message until system clock is synchronized.
+
+    Belfry starts as soon as the clock is synchronized, at the latest
+    after clock sync timeout. It returns if clock is synchronized and
+    how long it waited.
     """
+    synchronized = clock_synchronized
+    if hardware.backend != hardware.REAL:
+        # Off the Raspberry Pi clock is not waited for.
+        from fake_hardware import FakeClockSync
+
+        synchronized = FakeClockSync()
+
     write(0, 0, "Hvaljen Isus i")
     write(0, 1, "Marija!")
-    time.sleep(10)
+    # Greeting is shown while the clock is checked the first time.
+    clock_is_synchronized, waited = wait_for_clock_sync(0, synchronized)
+    if not clock_is_synchronized:
+        clear()
+        write(0, 0, "Postavljanje")
+        write(0, 1, "vremena!")
+        clock_is_synchronized, waited = wait_for_clock_sync(
+            synchronized=synchronized
+        )
+        if not clock_is_synchronized:
+            print(f"Clock is not synchronized after {waited:.0f} s, starting anyway.")
     clear()
-    write(0, 0, "Postavljanje")
-    write(0, 1, "vremena!")
-    # Long delay is used to give the system time to initially
-    # set the correct time using the internet connection
-    time.sleep(110)
-    clear()
-
+    return clock_is_synchronized, waited
 
-def main() -> None:
-    # First show initial message.
-    show_initial_message()
 
+def export_startup_metrics(
+    startup_time: float, clock_is_synchronized: bool, clock_sync_wait: float
+) -> None:
+    """
+    Export how long startup took, metrics file is written only once.
+    """
+    metrics = Metrics("startup")
+    metrics.gauge(
+        "belfry_startup_seconds", "Time from start of belfry to start of workers."
+    ).set(startup_time)
+    metrics.gauge(
+        "belfry_clock_sync_wait_seconds", "Time waited for system clock sync."
+    ).set(clock_sync_wait)
+    metrics.gauge(
+        "belfry_clock_synchronized", "1 if system clock was synchronized at startup."
+    ).set(int(clock_is_synchronized))
+    metrics.export()
+
+
+def start_processes() -> SharedClock:
+    """
+    This function starts all belfry processes, it returns shared clock
+    which watch process publishes.
+    """
     # Queues for communication between processes.
-    message_queue_for_display = multiprocessing.Queue()
     states_queue_for_bells = multiprocessing.Queue()
     message_queue_for_buttons = multiprocessing.Queue()
     message_queue_for_watch = multiprocessing.Queue()
     message_queue_for_manual_watch_setup = multiprocessing.Queue()
 
-    # Queue for sending current datetime to display module.
-    current_datetime_for_display = multiprocessing.Queue()
+    # Worker which moves watch handles and records moves in the journal.
+    handle_motors = HandleMotors()
+    handle_motors.start()
 
-    # Queue for sending current datetime to bells module.
-    current_datetime_for_bells = multiprocessing.Queue()
+    # Shared clock for publishing current datetime to other processes.
+    shared_clock = SharedClock()
 
-    # Queue for sending current datetime to buttons module.
-    current_datetime_for_buttons = multiprocessing.Queue()
+    # Mailboxes for sending states to display module, they share
+    # doorbell with shared clock so display can wait for any of them.
+    watch_setup_mailbox = Mailbox(shared_clock.doorbell)
+    ringing_mailbox = Mailbox(shared_clock.doorbell)
+    manual_watch_setup_mailbox = Mailbox(shared_clock.doorbell)
 
     # Starting display process.
     multiprocessing.Process(
         target=display,
-        args=(current_datetime_for_display, message_queue_for_display),
+        args=(
+            shared_clock,
+            watch_setup_mailbox,
+            ringing_mailbox,
+            manual_watch_setup_mailbox,
+        ),
     ).start()
 
     # Start function buttons process.
@@ -96,7 +147,7 @@ def main() -> None:
         target=function_buttons,
         args=(
             states_queue_for_bells,
-            current_datetime_for_buttons,
+            shared_clock,
             message_queue_for_buttons,
         ),
     ).start()
@@ -105,9 +156,9 @@ def main() -> None:
     multiprocessing.Process(
         target=bells,
         args=(
-            current_datetime_for_bells,
+            shared_clock,
             states_queue_for_bells,
-            message_queue_for_display,
+            ringing_mailbox,
         ),
     ).start()
 
@@ -115,12 +166,11 @@ def main() -> None:
     multiprocessing.Process(
         target=watch,
         args=(
-            current_datetime_for_display,
-            current_datetime_for_bells,
-            current_datetime_for_buttons,
-            message_queue_for_display,
+            shared_clock,
+            watch_setup_mailbox,
             message_queue_for_watch,
             message_queue_for_manual_watch_setup,
+            handle_motors,
         ),
     ).start()
 
@@ -129,12 +179,29 @@ def main() -> None:
         target=manual_watch_setup,
         args=(
             message_queue_for_manual_watch_setup,
-            message_queue_for_display,
+            manual_watch_setup_mailbox,
             message_queue_for_buttons,
             message_queue_for_watch,
+            handle_motors,
         ),
     ).start()
 
+    return shared_clock
+
+
+def main() -> None:
+    start = hardware.clock.monotonic()
+    # First show initial message until clock is synchronized.
+    clock_is_synchronized, clock_sync_wait = show_initial_message()
+    export_startup_metrics(
+        hardware.clock.monotonic() - start, clock_is_synchronized, clock_sync_wait
+    )
+
+    if ASYNCIO_RUNTIME:
+        asyncio_runtime.run()
+    else:
+        start_processes()
+
 
 if __name__ == "__main__":
     main()
@@ -6,13 +6,22 @@ display and uses buttons for setup puproses.
 
 import datetime
 import multiprocessing
-import time
-
-import RPi.GPIO as GPIO
+import threading
+from typing import Optional
 
+import hardware
+from buttons import PRESS, RELEASE, ButtonEvent, ButtonInput, EventInbox, KeyRepeat
+from channels import Mailbox, wait_for_change
 from function_buttons import F0_BUTTON, F0_LED, F1_BUTTON, F1_LED
-from lcd1602 import clear, write
-from watch import HOUR_HANDLE, MINUTE_HANDLE, log_last_watch_time
+from hardware import GPIO
+from metrics import Metrics
+from utils import HOUSEKEEPING_INTERVAL
+from watch import (
+    HOUR_HANDLE,
+    MINUTE_HANDLE,
+    HandleMotors,
+    watch_position_from_time,
+)
 
 # Use Raspberry Pi 4B board pin numbers.
 GPIO.setmode(GPIO.BCM)
@@ -29,152 +38,224 @@ WATCH_SETUP_SWITCH = 12
 
 buttons = [UP_BUTTON, RIGHT_BUTTON, DOWN_BUTTON, LEFT_BUTTON]
 
+# Pins which manual watch setup listens to.
+input_pins = buttons + [WATCH_SETUP_SWITCH, F0_BUTTON, F1_BUTTON]
+
 # Set up GPIO pin modes.
 for pin in buttons + [WATCH_SETUP_SWITCH]:
     GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 
-def is_pressed(button: int) -> bool:
-    """This function checks if button (switch) is pressed (on).
-
-    Note: Button (switch) is pressed (on) when input pin is LOW.
+def manual_watch_setup_frame(
+    current_datetime: datetime.datetime, current_changing: str
+) -> list[str]:
+    """
+    This function makes display frame which shows watch time which is set,
+    hours or minutes which are currently changing are marked with "**".
     """
-    if not GPIO.input(button):
-        return True
+    if current_changing == "hours":
+        marker_column = 10
     else:
-        return False
+        marker_column = 13
+    return [
+        " Na satu: " + current_datetime.strftime("%H:%M"),
+        " " * marker_column + "**",
+    ]
 
 
-def start_watch_setup(switch: int, watch_setup_state: bool) -> bool:
-    """This function checks if watch setup switch is on.
+class ManualWatchSetup:
+    """This class handles watch setup switch and button events and keeps watch
+    time which is set by hand.
 
-    Note: Manual watch setup starts when switch input pin is LOW and
-    watch setup state previously was False.
+    It is used by manual watch setup process and by asyncio runtime.
+    It does not write to the display, it sends frames for display
+    to the manual watch setup mailbox.
     """
-    if not GPIO.input(switch):
-        if watch_setup_state == False:
-            return True
-    else:
-        return False
+
+    def __init__(self, manual_watch_setup_mailbox) -> None:
+        self._mailbox = manual_watch_setup_mailbox
+        self.watch_setup = False
+        self.automatic_watch_setup = False
+        # Watch setup switch state, as of the last switch event.
+        self.switch_on = False
+        self.current_datetime = None
+        self.current_changing = "minutes"
+        # Frame which was last sent to display.
+        self.shown_frame = None
+        # Held up and down buttons repeat with growing steps.
+        self.key_repeat = KeyRepeat()
+        # Watch position set by hand, it is set when manual watch setup is done.
+        self.watch_position = None
+
+    def handle_event(self, event: ButtonEvent) -> Optional[str]:
+        """
+        Handle switch or button event, it returns message for other
+        processes when manual watch setup starts or is done.
+        """
+        if event.pin == WATCH_SETUP_SWITCH:
+            if event.kind in (PRESS, RELEASE):
+                self.switch_on = event.kind == PRESS
+            return self.update()
+
+        # If manual watch setup is not activated buttons do nothing.
+        if not self.watch_setup:
+            return None
+
+        if event.kind == PRESS:
+            # Left button toggles to the hour setting.
+            if event.pin == LEFT_BUTTON:
+                self.current_changing = "hours"
+
+            # Right button toggles to the minutes setting.
+            elif event.pin == RIGHT_BUTTON:
+                self.current_changing = "minutes"
+
+            # Up button increments hour/minutes by one,
+            # down button decreases them, held buttons repeat.
+            elif event.pin in (UP_BUTTON, DOWN_BUTTON):
+                self._change(event.pin, 1)
+                self.key_repeat.press(event.pin, event.timestamp)
+
+        if event.kind == RELEASE and event.pin in (UP_BUTTON, DOWN_BUTTON):
+            self.key_repeat.release(event.pin)
+
+        # While F0 button is pressed, the hour handle move forward.
+        # This is used for hour handle fine tunning.
+        if event.pin == F0_BUTTON and event.kind in (PRESS, RELEASE):
+            level = GPIO.HIGH if event.kind == PRESS else GPIO.LOW
+            GPIO.output(HOUR_HANDLE, level)
+            GPIO.output(F0_LED, level)
+
+        # While F1 button is pressed, the minute handle move forward.
+        # This is used for minute handle fine tunning.
+        if event.pin == F1_BUTTON and event.kind in (PRESS, RELEASE):
+            level = GPIO.HIGH if event.kind == PRESS else GPIO.LOW
+            GPIO.output(MINUTE_HANDLE, level)
+            GPIO.output(F1_LED, level)
+
+        self._show()
+        return None
+
+    def update(self) -> Optional[str]:
+        """
+        Start or finish manual watch setup as watch setup switch says,
+        it returns message for other processes when manual watch setup
+        starts or is done.
+        """
+        # Manual watch setup can be activated only if automatic watch setup is
+        # not activated.
+        if self.automatic_watch_setup:
+            return None
+
+        # Check if manual watch setup is activated.
+        if self.switch_on and not self.watch_setup:
+            self.watch_setup = True
+            self.current_datetime = hardware.clock.now()
+            self._show()
+            return "Manual watch setup started."
+
+        # Check if manual watch setup is done.
+        if not self.switch_on and self.watch_setup:
+            self.watch_position = watch_position_from_time(self.current_datetime)
+            self.current_datetime = None
+            self.watch_setup = False
+            self.current_changing = "minutes"
+            self.shown_frame = None
+            self.key_repeat.release_all()
+            # Handles must not keep moving if fine tuning button is still held.
+            for pin in [HOUR_HANDLE, F0_LED, MINUTE_HANDLE, F1_LED]:
+                GPIO.output(pin, GPIO.LOW)
+            self._mailbox.put(None)
+            return "Manual watch setup done."
+        return None
+
+    def next_repeat(self) -> Optional[float]:
+        """
+        Get perf counter time when held up or down button repeats next.
+        """
+        return self.key_repeat.next_deadline()
+
+    def repeat(self, now: float) -> None:
+        """
+        Repeat held up and down buttons which are due by now.
+        """
+        repeats = self.key_repeat.due(now)
+        if not self.watch_setup or not repeats:
+            return
+        for pin, multiplier in repeats:
+            self._change(pin, multiplier)
+        self._show()
+
+    def _change(self, pin: int, multiplier: int) -> None:
+        step = self._step(multiplier)
+        if pin == UP_BUTTON:
+            self.current_datetime = self.current_datetime + step
+        else:
+            self.current_datetime = self.current_datetime - step
+
+    def _show(self) -> None:
+        # Send frame to display only when it changes.
+        frame = manual_watch_setup_frame(self.current_datetime, self.current_changing)
+        if frame != self.shown_frame:
+            self._mailbox.put(frame)
+            self.shown_frame = frame
+
+    def _step(self, multiplier: int) -> datetime.timedelta:
+        # Only minutes accelerate, hours always change by one.
+        if self.current_changing == "hours":
+            return datetime.timedelta(hours=1)
+        return datetime.timedelta(minutes=multiplier)
 
 
 def manual_watch_setup(
     message_queue_in: multiprocessing.Queue,
-    message_queue_for_display: multiprocessing.Queue,
+    manual_watch_setup_mailbox: Mailbox,
     message_queue_for_buttons: multiprocessing.Queue,
     message_queue_for_watch: multiprocessing.Queue,
+    handle_motors: HandleMotors,
 ):
     """
     This function is the main manual watch setup function.
+    It waits for switch and button events.
     """
-    watch_setup = False
-    current_datetime = None
-    current_changing = "minutes"
-    automatic_watch_setup = False
+    setup = ManualWatchSetup(manual_watch_setup_mailbox)
+
+    doorbell = threading.Condition()
+    button_events = EventInbox(doorbell)
+    button_input = ButtonInput(input_pins)
+    button_input.subscribe(button_events)
+    button_input.start()
+    metrics = Metrics("manual_watch_setup")
+    events_depth = metrics.queue_depth("button_events")
 
     while True:
+        # Block until button event or held button repeat,
+        # wake up sometimes to check messages.
+        timeout = HOUSEKEEPING_INTERVAL
+        next_repeat = setup.next_repeat()
+        if next_repeat is not None:
+            timeout = min(timeout, max(next_repeat - hardware.clock.monotonic(), 0))
+        wait_for_change(doorbell, button_events.depth, timeout)
+        metrics.loop_iterations.inc()
+        metrics.export()
+        events_depth.set(button_events.depth())
+
         # Check if automatic watch setup is activated.
-        if not message_queue_in.empty():
+        while not message_queue_in.empty():
             recieved_message = message_queue_in.get()
             if recieved_message == "Watch setup started!":
-                automatic_watch_setup = True
+                setup.automatic_watch_setup = True
             elif recieved_message == "Watch setup is done!":
-                automatic_watch_setup = False
+                setup.automatic_watch_setup = False
 
-        # Manual watch setup can be activated only if automatic watch setup is
-        # not activated.
-        if not automatic_watch_setup:
-            # Check if manual watch setup is activated.
-            if start_watch_setup(
-                switch=WATCH_SETUP_SWITCH, watch_setup_state=watch_setup
-            ):
-                watch_setup = True
-                message_queue_for_display.put("Manual watch setup started.")
-                message_queue_for_buttons.put("Manual watch setup started.")
-                message_queue_for_watch.put("Manual watch setup started.")
-            # Check if manual watch setup is done.
-            elif not is_pressed(button=WATCH_SETUP_SWITCH):
-                if watch_setup == True:
-                    log_last_watch_time(date_time=current_datetime.replace(second=0))
-                    current_datetime = None
-                    watch_setup = False
-                    current_changing = "minutes"
-                    clear()
-                    message_queue_for_display.put("Manual watch setup done.")
-                    message_queue_for_buttons.put("Manual watch setup done.")
-                    message_queue_for_watch.put("Manual watch setup done.")
-
-            # If manual watch setup is currently activated go through next lines.
-            if watch_setup:
-                # If current datetime for display is None, get current datetime.
-                if current_datetime == None:
-                    current_datetime = datetime.datetime.now()
-                    # There are some strange characters on display when here is no delay.
-                    time.sleep(0.5)
-                    clear()
-                    # Same here.
-                    time.sleep(0.5)
-                    # Show current datetime as default watch time on display
-                    write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-                    write(13, 1, "**")
-
-                # Left button toggles to the hour setting.
-                if is_pressed(LEFT_BUTTON):
-                    current_changing = "hours"
-                    clear()
-                    write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-                    write(10, 1, "**")
-
-                # Left button toggles to the minutes setting.
-                if is_pressed(RIGHT_BUTTON):
-                    current_changing = "minutes"
-                    clear()
-                    write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-                    write(13, 1, "**")
-
-                # Up button increments hour/minutes by one.
-                if is_pressed(UP_BUTTON):
-                    if current_changing == "minutes":
-                        current_datetime = current_datetime + datetime.timedelta(
-                            minutes=1
-                        )
-                        write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-                    elif current_changing == "hours":
-                        current_datetime = current_datetime + datetime.timedelta(
-                            hours=1
-                        )
-                        write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-
-                # Down button decreases hour/minutes by one.
-                if is_pressed(DOWN_BUTTON):
-                    if current_changing == "minutes":
-                        current_datetime = current_datetime - datetime.timedelta(
-                            minutes=1
-                        )
-                        write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-                    elif current_changing == "hours":
-                        current_datetime = current_datetime - datetime.timedelta(
-                            hours=1
-                        )
-                        write(1, 0, "Na satu: " + current_datetime.strftime("%H:%M"))
-
-                # While F0 button is pressed, the hour handle move forward.
-                # This is used for hour handle fine tunning.
-                if is_pressed(F0_BUTTON):
-                    GPIO.output(HOUR_HANDLE, GPIO.HIGH)
-                    GPIO.output(F0_LED, GPIO.HIGH)
-                if not is_pressed(F0_BUTTON):
-                    GPIO.output(HOUR_HANDLE, GPIO.LOW)
-                    GPIO.output(F0_LED, GPIO.LOW)
-
-                # While F1 button is pressed, the minute handle move forward.
-                # This is used for minute handle fine tunning.
-                if is_pressed(F1_BUTTON):
-                    GPIO.output(MINUTE_HANDLE, GPIO.HIGH)
-                    GPIO.output(F1_LED, GPIO.HIGH)
-                if not is_pressed(F1_BUTTON):
-                    GPIO.output(MINUTE_HANDLE, GPIO.LOW)
-                    GPIO.output(F1_LED, GPIO.LOW)
-
-        # Debounce delay.
-        time.sleep(0.1)
+        messages = [setup.update()]
+        while button_events.depth():
+            messages.append(setup.handle_event(button_events.get()))
+        setup.repeat(hardware.clock.monotonic())
+
+        for message in messages:
+            if message == "Manual watch setup done.":
+                handle_motors.set_position(setup.watch_position)
+            if message is not None:
+                message_queue_for_buttons.put(message)
+                message_queue_for_watch.put(message)
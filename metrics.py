@@ -0,0 +1,173 @@
+"""Metrics module.
+
+Workers keep counters, gauges and histograms in plain process memory,
+so updating them costs only an addition. Every worker exports its
+metrics in Prometheus text format to its own file, which node exporter
+textfile collector reads:
+
+    node_exporter --collector.textfile.directory=/home/pi/belfry/metrics
+
+Files are written at most once per export interval and they are
+replaced atomically, so collector never reads half written file.
+"""
+
+import bisect
+import os
+from typing import Optional
+
+import hardware
+from utils import atomic_write
+
+# Directory to which metrics are exported, empty string disables export.
+METRICS_DIRECTORY = os.environ.get("BELFRY_METRICS_DIRECTORY", "metrics")
+EXPORT_INTERVAL = 15  # [s]
+
+# Upper bounds of latency histogram buckets.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1]  # [s]
+
+
+def escape_label_value(value) -> str:
+    """
+    Escape backslash, double quote and new line in label value of text format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """
+    Metric which only grows.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def samples(self, name: str, labels: str) -> list[str]:
+        return [f"{name}{{{labels}}} {self.value:g}"]
+
+
+class Gauge:
+    """
+    Metric which is set to current value.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name: str, labels: str) -> list[str]:
+        return [f"{name}{{{labels}}} {self.value:g}"]
+
+
+class Histogram:
+    """
+    Metric which counts observed values in buckets.
+    """
+
+    def __init__(self, buckets: list[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # Counts of values which fall into each bucket, not cumulative.
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        bucket = bisect.bisect_left(self.buckets, value)
+        if bucket < len(self.counts):
+            self.counts[bucket] += 1
+
+    def samples(self, name: str, labels: str) -> list[str]:
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        samples.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        samples.append(f"{name}_sum{{{labels}}} {self.sum:g}")
+        samples.append(f"{name}_count{{{labels}}} {self.count}")
+        return samples
+
+
+class Metrics:
+    """This class keeps metrics of one worker and exports them.
+
+    Metric is created on first use and the same metric is returned for
+    the same name and labels afterwards. Every metric has worker label.
+    Worker calls export() in its loop, file is written only when
+    export interval has passed since the last export.
+    """
+
+    def __init__(self, worker: str, directory: str = METRICS_DIRECTORY) -> None:
+        self.worker = worker
+        self.directory = directory
+        # Metric name: (type, help, {labels: metric}).
+        self._metrics = {}
+        self._next_export = 0.0
+        self.loop_iterations = self.counter(
+            "belfry_loop_iterations_total", "Iterations of worker loop."
+        )
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return self._metric(Counter, "counter", name, help, labels)
+
+    def gauge(self, name: str, help: str, **labels: str) -> Gauge:
+        return self._metric(Gauge, "gauge", name, help, labels)
+
+    def histogram(self, name: str, help: str, **labels: str) -> Histogram:
+        return self._metric(Histogram, "histogram", name, help, labels)
+
+    def queue_depth(self, queue: str) -> Gauge:
+        """
+        Get gauge of messages or events waiting in the queue.
+        """
+        return self.gauge(
+            "belfry_queue_depth", "Messages waiting in queue.", queue=queue
+        )
+
+    def _metric(self, make, kind: str, name: str, help: str, labels: dict):
+        _, _, series = self._metrics.setdefault(name, (kind, help, {}))
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = make()
+        return series[key]
+
+    def render(self) -> str:
+        """
+        Get all metrics in Prometheus text format.
+        """
+        lines = []
+        for name, (kind, help, series) in self._metrics.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in series.items():
+                labels = ",".join(
+                    f'{label}="{escape_label_value(value)}"'
+                    for label, value in (("worker", self.worker),) + key
+                )
+                lines.extend(metric.samples(name, labels))
+        return "\n".join(lines) + "\n"
+
+    def export(self, now: Optional[float] = None) -> bool:
+        """
+        Write metrics file if export interval has passed,
+        it returns True if file was written.
+        """
+        if now is None:
+            now = hardware.clock.monotonic()
+        if not self.directory or now < self._next_export:
+            return False
+        self._next_export = now + EXPORT_INTERVAL
+        os.makedirs(self.directory, exist_ok=True)
+        # File does not have to survive power cut, it is only replaced atomically.
+        atomic_write(
+            os.path.join(self.directory, f"belfry_{self.worker}.prom"),
+            self.render(),
+            sync=False,
+        )
+        return True
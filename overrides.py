@@ -0,0 +1,312 @@
+"""Bell overrides module.
+
+Overrides change bell schedule on chosen dates, without changing
+the schedule file:
+
+    skip       no ringing, of all programs or only of program with given
+               name, during the whole day or only at given time
+    add        extra ringing at given time
+    replace    ringing at given time is replaced by another one
+
+Every override applies from its first to its last date. Overrides
+are kept in JSON file which is edited with this module:
+
+    python3 overrides.py skip 2026-12-24 --time 12:00
+    python3 overrides.py add 2026-10-24 16:00 --bells A B --name Vjencanje
+    python3 overrides.py replace 2026-10-19 12:00 --to 2026-10-25 --bells A --name Podne
+    python3 overrides.py list
+    python3 overrides.py remove 3
+
+Bells process loads the file again when it changes, overrides whose
+last date has passed are pruned from the file every day.
+"""
+
+import argparse
+import datetime
+import json
+import os
+from typing import Optional
+
+from liturgical_calendar import minute_of_date
+from schedule import check_keys, parse_bells, parse_duration, parse_name, parse_time
+from utils import atomic_write
+
+OVERRIDES_FILE = "bell_overrides.json"
+
+SKIP = "skip"
+ADD = "add"
+REPLACE = "replace"
+
+# Override spans at most this many days, it is indexed by days.
+MAX_OVERRIDE_DAYS = 366
+
+DEFAULT_DURATION = 120  # [s]
+
+OVERRIDE_KEYS = {
+    "id",
+    "action",
+    "first_date",
+    "last_date",
+    "time",
+    "program",
+    "name",
+    "bells",
+    "duration",
+}
+
+
+def parse_date(text) -> datetime.date:
+    """
+    Convert "YYYY-MM-DD" string to date.
+    """
+    try:
+        return datetime.date.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise ValueError(f'date has to be "YYYY-MM-DD", not {text!r}') from None
+
+
+def check_override(entry: dict, bell_pins: dict[str, int]) -> None:
+    """
+    Check that override from overrides file is valid, it raises ValueError if not.
+    """
+    check_keys(entry, OVERRIDE_KEYS)
+    if not isinstance(entry.get("id"), int):
+        raise ValueError("id has to be a number")
+    action = entry.get("action")
+    if action not in (SKIP, ADD, REPLACE):
+        raise ValueError(f"action has to be {SKIP}, {ADD} or {REPLACE}")
+
+    first_date = parse_date(entry.get("first_date"))
+    last_date = parse_date(entry.get("last_date"))
+    if not 0 <= (last_date - first_date).days < MAX_OVERRIDE_DAYS:
+        raise ValueError(f"override has to span 1 to {MAX_OVERRIDE_DAYS} days")
+
+    if action == SKIP:
+        if "time" in entry:
+            parse_time(entry["time"])
+        if "program" in entry:
+            parse_name(entry["program"])
+        if set(entry) & {"name", "bells", "duration"}:
+            raise ValueError("skip override has no name, bells or duration")
+        return
+
+    parse_time(entry.get("time"))
+    parse_name(entry.get("name"))
+    parse_bells(entry.get("bells"), bell_pins)
+    parse_duration(entry.get("duration"))
+    if "program" in entry:
+        raise ValueError(f"{action} override has no program")
+
+
+def override_program(entry: dict, bell_pins: dict[str, int]) -> dict:
+    """
+    Convert add or replace override to bell program dict.
+    """
+    hour, minute = parse_time(entry["time"])
+    return {
+        "name": entry["name"],
+        "function_button": None,
+        "bells": parse_bells(entry["bells"], bell_pins),
+        "hour": hour,
+        "minute": minute,
+        "day": [],
+        "duration": entry["duration"],
+    }
+
+
+def read_overrides(path: str = OVERRIDES_FILE) -> list[dict]:
+    """
+    Read overrides from the file, there are no overrides if it does not exist.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as json_file:
+        try:
+            overrides = json.load(json_file)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Overrides are not valid JSON: {error}.") from None
+    if not isinstance(overrides, list):
+        raise ValueError("Overrides file has to have a list of overrides.")
+    return overrides
+
+
+def write_overrides(overrides: list[dict], path: str = OVERRIDES_FILE) -> None:
+    """
+    Write overrides to the file, sorted by their first date.
+    """
+    overrides = sorted(overrides, key=lambda entry: (entry["first_date"], entry["id"]))
+    atomic_write(path, json.dumps(overrides, indent=2) + "\n")
+
+
+def load_overrides(path: str, bell_pins: dict[str, int]) -> list[dict]:
+    """This function reads and checks overrides from the file.
+
+    It raises ValueError which tells which override is not valid and why.
+    """
+    overrides = read_overrides(path)
+    for entry in overrides:
+        try:
+            check_override(entry, bell_pins)
+        except ValueError as error:
+            override_id = entry.get("id") if isinstance(entry, dict) else None
+            raise ValueError(f"Override {override_id}: {error}.") from None
+    return overrides
+
+
+def prune_overrides(path: str, today: datetime.date) -> int:
+    """This function removes overrides whose last date has passed from the file.
+
+    File is read again right before it is written, so overrides added
+    in the meantime are kept. It returns number of pruned overrides.
+    """
+    overrides = read_overrides(path)
+    active = [
+        entry
+        for entry in overrides
+        if not isinstance(entry, dict)
+        or not isinstance(entry.get("last_date"), str)
+        or entry["last_date"] >= today.isoformat()
+    ]
+    if len(active) != len(overrides):
+        write_overrides(active, path)
+    return len(overrides) - len(active)
+
+
+class OverrideIndex:
+    """This class indexes overrides by days and minutes of date.
+
+    Every override is expanded once into all days it spans, so overrides
+    for a minute are found with dict lookups, no matter how many
+    overrides there are. Keys are the same as keys of yearly schedule
+    in bells module, date ordinal for a day and minute of date.
+    """
+
+    def __init__(
+        self, overrides: list[dict] = (), bell_pins: Optional[dict[str, int]] = None
+    ) -> None:
+        # Day or minute key: program names which are skipped, None skips all.
+        self.skipped_days = {}
+        self.skipped_minutes = {}
+        # Minute key: added bell programs.
+        self.added_minutes = {}
+
+        for entry in overrides:
+            first_date = parse_date(entry["first_date"])
+            last_date = parse_date(entry["last_date"])
+            program = None
+            if entry["action"] != SKIP:
+                program = override_program(entry, bell_pins)
+            for offset in range((last_date - first_date).days + 1):
+                date = first_date + datetime.timedelta(days=offset)
+                self._index(entry, date, program)
+
+    def _index(self, entry: dict, date: datetime.date, program: Optional[dict]) -> None:
+        if "time" not in entry:
+            day_skips = self.skipped_days.setdefault(date.toordinal(), [])
+            day_skips.append(entry.get("program"))
+            return
+        minute_key = minute_of_date(date, *parse_time(entry["time"]))
+        if entry["action"] == SKIP:
+            skipped = self.skipped_minutes.setdefault(minute_key, [])
+            skipped.append(entry.get("program"))
+            return
+        if entry["action"] == REPLACE:
+            self.skipped_minutes.setdefault(minute_key, []).append(None)
+        self.added_minutes.setdefault(minute_key, []).append(program)
+
+    def apply(self, day_key: int, minute_key: int, programs: list[dict]) -> list[dict]:
+        """
+        Get bell programs which ring at the minute after overrides are applied.
+        """
+        skipped = self.skipped_days.get(day_key, []) + self.skipped_minutes.get(
+            minute_key, []
+        )
+        if skipped:
+            programs = [
+                program
+                for program in programs
+                if None not in skipped and program["name"] not in skipped
+            ]
+        return programs + self.added_minutes.get(minute_key, [])
+
+
+def describe_override(entry: dict) -> str:
+    """
+    Get one line description of the override for the list command.
+    """
+    dates = entry["first_date"]
+    if entry["last_date"] != entry["first_date"]:
+        dates += f" - {entry['last_date']}"
+    text = f"{entry['id']:>3}  {entry['action']:<8} {dates:<23}"
+    text += f" {entry.get('time', 'all day'):<7}"
+    if entry["action"] == SKIP:
+        return text + f"  {entry.get('program', 'all programs')}"
+    return (
+        text + f"  {entry['name']}, bells {' '.join(entry['bells'])},"
+        f" {entry['duration']:g}s"
+    )
+
+
+if __name__ == "__main__":
+    import hardware
+
+    # Command only edits overrides file, it never touches GPIO.
+    hardware.use(hardware.FAKE)
+    from bells import bell_names
+
+    parser = argparse.ArgumentParser(description="Edit bell overrides.")
+    parser.add_argument("--file", default=OVERRIDES_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list overrides")
+
+    remove_parser = commands.add_parser("remove", help="remove override")
+    remove_parser.add_argument("id", type=int)
+
+    skip_parser = commands.add_parser(SKIP, help="skip ringing")
+    skip_parser.add_argument("first_date")
+    skip_parser.add_argument("--to", dest="last_date", help="last date")
+    skip_parser.add_argument("--time", help="skip only ringing at HH:MM")
+    skip_parser.add_argument("--program", help="skip only program with this name")
+
+    for action in (ADD, REPLACE):
+        action_parser = commands.add_parser(action, help=f"{action} ringing")
+        action_parser.add_argument("first_date")
+        action_parser.add_argument("time", help="HH:MM")
+        action_parser.add_argument("--to", dest="last_date", help="last date")
+        action_parser.add_argument("--bells", nargs="+", required=True)
+        action_parser.add_argument("--name", required=True)
+        action_parser.add_argument("--duration", type=int, default=DEFAULT_DURATION)
+
+    arguments = parser.parse_args()
+    overrides = read_overrides(arguments.file)
+
+    if arguments.command == "list":
+        for entry in sorted(overrides, key=lambda entry: entry["first_date"]):
+            print(describe_override(entry))
+    elif arguments.command == "remove":
+        remaining = [entry for entry in overrides if entry["id"] != arguments.id]
+        if len(remaining) == len(overrides):
+            parser.error(f"there is no override {arguments.id}")
+        write_overrides(remaining, arguments.file)
+    else:
+        entry = {
+            "id": max((entry["id"] for entry in overrides), default=0) + 1,
+            "action": arguments.command,
+            "first_date": arguments.first_date,
+            "last_date": arguments.last_date or arguments.first_date,
+        }
+        for key in ("time", "program", "name", "bells", "duration"):
+            if getattr(arguments, key, None) is not None:
+                entry[key] = getattr(arguments, key)
+        try:
+            check_override(entry, bell_names)
+        except ValueError as error:
+            parser.error(str(error))
+        write_overrides(overrides + [entry], arguments.file)
+        print(describe_override(entry))
+
+    # Pruned after listing, so just passed overrides can still be seen.
+    pruned = prune_overrides(arguments.file, datetime.date.today())
+    if pruned:
+        print(f"{pruned} expired overrides pruned.")
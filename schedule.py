@@ -0,0 +1,264 @@
+"""Bell schedule file module.
+
+Bell programs are loaded from schedule file, TOML or JSON, which is
+validated and converted to bell program dicts used by bells module.
+Schedule file looks like this:
+
+    [[program]]
+    name = "Podne"
+    bells = ["A", "B", "C", "D"]
+    time = "12:00"
+    days = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    duration = 120
+
+Program which rings on feasts has dates instead of days, list of date
+rules like "12-25", "easter+49" or "sun>=11-27", see liturgical_calendar
+module. Program which is activated by function button has
+function_button instead of days. JSON file has the same structure,
+{"program": [...]}.
+
+Processes which use the schedule watch the file and load it again
+when it changes, so programs are changed without restarting belfry.
+"""
+
+import json
+import os
+from typing import Optional
+
+try:
+    import tomllib
+except ImportError:
+    # Python older than 3.11.
+    import tomli as tomllib
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+from liturgical_calendar import DAY_NAMES, parse_date_rule
+
+BELL_SCHEDULE_FILE = "bell_schedule.toml"
+
+# Bell program name is shown in the first row of 16x2 display.
+MAX_NAME_LENGTH = 16
+MAX_DURATION = 15 * 60  # [s]
+
+PROGRAM_KEYS = {
+    "name",
+    "bells",
+    "time",
+    "days",
+    "dates",
+    "function_button",
+    "duration",
+}
+
+
+def parse_time(text) -> tuple[int, int]:
+    """
+    Convert "HH:MM" string to hour and minute.
+    """
+    try:
+        hour, minute = (int(part) for part in text.split(":"))
+    except (AttributeError, ValueError):
+        raise ValueError(f'time has to be "HH:MM", not {text!r}') from None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"time {text!r} does not exist")
+    return hour, minute
+
+
+def parse_name(name) -> str:
+    """
+    Check that bell program name fits the display.
+    """
+    if not isinstance(name, str) or not 0 < len(name) <= MAX_NAME_LENGTH:
+        raise ValueError(f"name has to have 1 to {MAX_NAME_LENGTH} characters")
+    return name
+
+
+def parse_bells(bells, bell_pins: dict[str, int]) -> list[int]:
+    """
+    Convert list of bell names to bell pins.
+    """
+    if not isinstance(bells, list) or not bells:
+        raise ValueError("bells has to be a list of bells")
+    for bell in bells:
+        if bell not in bell_pins:
+            raise ValueError(f"unknown bell {bell!r}, bells are {', '.join(bell_pins)}")
+    if len(set(bells)) != len(bells):
+        raise ValueError("bells are repeated")
+    return [bell_pins[bell] for bell in bells]
+
+
+def parse_duration(duration) -> float:
+    """
+    Check that ringing duration is a number of seconds in allowed range.
+    """
+    if (
+        isinstance(duration, bool)
+        or not isinstance(duration, (int, float))
+        or not 0 < duration <= MAX_DURATION
+    ):
+        raise ValueError(f"duration has to be 1 to {MAX_DURATION} seconds")
+    return duration
+
+
+def check_keys(entry, keys: set[str]) -> None:
+    """
+    Check that entry is a table which has only known keys.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError("entry has to be a table")
+    unknown_keys = set(entry) - keys
+    if unknown_keys:
+        raise ValueError(f"unknown keys {', '.join(sorted(unknown_keys))}")
+
+
+def parse_program(
+    entry: dict, bell_pins: dict[str, int], function_buttons: int
+) -> dict:
+    """
+    Validate one program from schedule file and convert it to bell program dict.
+    """
+    check_keys(entry, PROGRAM_KEYS)
+    name = parse_name(entry.get("name"))
+    bells = parse_bells(entry.get("bells"), bell_pins)
+    hour, minute = parse_time(entry.get("time"))
+
+    days = entry.get("days", [])
+    if not isinstance(days, list):
+        raise ValueError("days has to be a list of days")
+    for day in days:
+        if day not in DAY_NAMES:
+            raise ValueError(f"unknown day {day!r}, days are {', '.join(DAY_NAMES)}")
+
+    dates = entry.get("dates", [])
+    if not isinstance(dates, list):
+        raise ValueError("dates has to be a list of date rules")
+    date_rules = [parse_date_rule(date) for date in dates]
+
+    function_button = entry.get("function_button")
+    # Bool and float are equal to int, but they are not valid button indexes.
+    if function_button is not None and (
+        type(function_button) is not int
+        or not 0 <= function_button < function_buttons
+    ):
+        raise ValueError(f"there is no function button {function_button!r}")
+    if [bool(days), bool(dates), function_button is not None].count(True) != 1:
+        raise ValueError("program needs one of days, dates or function_button")
+
+    duration = parse_duration(entry.get("duration"))
+
+    return {
+        "name": name,
+        "function_button": function_button,
+        "bells": bells,
+        "hour": hour,
+        "minute": minute,
+        "day": sorted(DAY_NAMES.index(day) for day in set(days)),
+        "dates": date_rules,
+        "duration": duration,
+    }
+
+
+def parse_schedule(
+    schedule: dict, bell_pins: dict[str, int], function_buttons: int
+) -> list[dict]:
+    """This function validates schedule and converts it to bell programs.
+
+    Bell names are converted to pins with bell_pins, function_buttons
+    is the number of function buttons. It raises ValueError which tells
+    which program is not valid and why.
+    """
+    if not isinstance(schedule, dict) or set(schedule) - {"program"}:
+        raise ValueError("schedule has to have only program list")
+    entries = schedule.get("program", [])
+    if not isinstance(entries, list):
+        raise ValueError("schedule has to have only program list")
+
+    programs = []
+    for number, entry in enumerate(entries, 1):
+        try:
+            programs.append(parse_program(entry, bell_pins, function_buttons))
+        except ValueError as error:
+            raise ValueError(f"Program {number}: {error}.") from None
+    return programs
+
+
+def load_schedule(
+    path: str, bell_pins: dict[str, int], function_buttons: int
+) -> list[dict]:
+    """
+    Load bell programs from TOML or JSON schedule file.
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as json_file:
+            try:
+                schedule = json.load(json_file)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"Schedule is not valid JSON: {error}.") from None
+    else:
+        with open(path, "rb") as toml_file:
+            try:
+                schedule = tomllib.load(toml_file)
+            except tomllib.TOMLDecodeError as error:
+                raise ValueError(f"Schedule is not valid TOML: {error}.") from None
+    return parse_schedule(schedule, bell_pins, function_buttons)
+
+
+class ScheduleWatcher:
+    """This class tells when schedule file, or overrides file, has changed.
+
+    It uses inotify if pyinotify is installed, otherwise it compares
+    modification time and size of the file on every check. Directory
+    is watched, not the file, because editors replace the whole file.
+    changed() never blocks, process calls it between ticks.
+    """
+
+    def __init__(self, path: str = BELL_SCHEDULE_FILE) -> None:
+        self.path = path
+        self._changed = False
+        self._notifier = None
+        if pyinotify is not None:
+            watch_manager = pyinotify.WatchManager()
+            # Zero timeout, events are only checked, never waited for.
+            self._notifier = pyinotify.Notifier(
+                watch_manager, self._handle_event, timeout=0
+            )
+            watch_manager.add_watch(
+                os.path.dirname(os.path.abspath(path)),
+                pyinotify.IN_CLOSE_WRITE
+                | pyinotify.IN_MOVED_TO
+                | pyinotify.IN_DELETE
+                | pyinotify.IN_MOVED_FROM,
+            )
+        else:
+            self._signature = self._file_signature()
+
+    def _handle_event(self, event) -> None:
+        if event.name == os.path.basename(self.path):
+            self._changed = True
+
+    def _file_signature(self) -> Optional[tuple[int, int]]:
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return status.st_mtime_ns, status.st_size
+
+    def changed(self) -> bool:
+        """
+        Check if schedule file has changed since the last check.
+        """
+        if self._notifier is not None:
+            if self._notifier.check_events():
+                self._notifier.read_events()
+                self._notifier.process_events()
+            changed, self._changed = self._changed, False
+            return changed
+
+        signature = self._file_signature()
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
@@ -0,0 +1,412 @@
+"""Simulator module.
+
+It runs whole belfry, watch, bells, function buttons, display and
+manual watch setup, in asyncio runtime on simulated hardware in virtual
+time. Event loop never waits, when all tasks wait it moves virtual
+clock straight to the next timer, so a day of belfry runs in seconds.
+
+Simulator presses buttons at given virtual times and records every
+output pin transition and every frame shown on the display. It can
+drop published ticks, like overloaded belfry would miss them:
+
+    python3 simulator.py --start 2026-10-18T06:00 --hours 24 --late 90
+    python3 simulator.py --hours 24 --drop-ticks 0.5
+    python3 simulator.py --overrides bell_overrides.json
+
+Belfry loads bell schedule file of the repository, or another one given
+with --schedule, and overrides file if it is given.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import io
+import os
+import random
+import selectors
+import shutil
+import tempfile
+import types
+from time import perf_counter
+from typing import Optional
+
+import hardware
+from fake_hardware import FakeGPIO, FakeSMBus, fake_smbus
+
+# Bell schedule file which belfry loads in simulation by default.
+SCHEDULE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bell_schedule.toml"
+)
+
+# 16x2 display behind PCF8574 I2C expander, expander bits.
+REGISTER_SELECT = 0x01
+ENABLE = 0x04
+DISPLAY_COLUMNS = 16
+DISPLAY_ROWS = 2
+# HD44780 commands which change what display shows.
+CLEAR = 0x01
+RETURN_HOME = 0x02
+SET_DDRAM_ADDRESS = 0x80
+# DDRAM address of the second row.
+SECOND_ROW_ADDRESS = 0x40
+
+# Simulated button is held this long.
+BUTTON_PRESS_DURATION = 0.2  # [s]
+
+
+class VirtualClock:
+    """This class is clock which tells virtual time.
+
+    Time moves only when it is advanced, sleeping advances it right
+    away, so there is nothing to spin on and spin guard is zero.
+    """
+
+    spin_guard = 0.0
+
+    def __init__(self, start: datetime.datetime) -> None:
+        self._epoch = start.timestamp()
+        self._monotonic = 0.0
+
+    def time(self) -> float:
+        return self._epoch + self._monotonic
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def sleep_until(self, deadline: float) -> None:
+        self._monotonic = max(self._monotonic, deadline)
+
+    def advance(self, seconds: float) -> None:
+        """
+        Move virtual time forward.
+        """
+        if seconds > 0:
+            self._monotonic += seconds
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    """This class is selector which advances virtual clock instead of waiting.
+
+    File descriptors of the event loop are still polled, but without
+    waiting, if none of them is ready the clock is advanced by timeout.
+    """
+
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout: Optional[float] = None) -> list:
+        events = super().select(0)
+        if not events:
+            if timeout is None:
+                raise RuntimeError("Simulation has nothing to wait for.")
+            self._clock.advance(timeout)
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    This class is event loop whose timers run on virtual clock.
+    """
+
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__(VirtualSelector(clock))
+        self._virtual_clock = clock
+
+    def time(self) -> float:
+        return self._virtual_clock.monotonic()
+
+
+class InlineExecutor(concurrent.futures.Executor):
+    """This class is executor which runs calls right away in the calling thread.
+
+    Simulated hardware calls do not block, so there is no need for threads,
+    and calls are done in the same virtual time in which they were made.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+        return future
+
+
+class SimulatedSMBus(FakeSMBus):
+    """This class is fake SMBus with 16x2 display behind PCF8574 I2C expander.
+
+    Bytes written to the expander are decoded like HD44780 controller
+    decodes them in 4-bit mode, nibble is latched on falling edge of
+    enable bit. Every transfer which changes what the display shows
+    records new frame.
+    """
+
+    def __init__(self, bus: int = 1) -> None:
+        super().__init__(bus)
+        self.rows = [[" "] * DISPLAY_COLUMNS for _ in range(DISPLAY_ROWS)]
+        # List of (date and time, frame) tuples, frame is list of rows.
+        self.frames = []
+        self._address = 0
+        self._enable = False
+        self._high_nibble = None
+
+    def frame(self) -> list[str]:
+        """
+        Get rows which the display shows.
+        """
+        return ["".join(row) for row in self.rows]
+
+    def _transfer(self, addr: int, data: list[int]) -> None:
+        super()._transfer(addr, data)
+        frame = self.frame()
+        for value in data:
+            enable = bool(value & ENABLE)
+            if self._enable and not enable:
+                self._latch(value >> 4, bool(value & REGISTER_SELECT))
+            self._enable = enable
+        if self.frame() != frame:
+            self.frames.append((hardware.clock.now(), self.frame()))
+
+    def _latch(self, nibble: int, data: bool) -> None:
+        if self._high_nibble is None:
+            self._high_nibble = nibble
+            return
+        value = self._high_nibble << 4 | nibble
+        self._high_nibble = None
+
+        if data:
+            row = int(self._address >= SECOND_ROW_ADDRESS)
+            column = self._address - row * SECOND_ROW_ADDRESS
+            if column < DISPLAY_COLUMNS:
+                self.rows[row][column] = chr(value)
+            self._address += 1
+        elif value & SET_DDRAM_ADDRESS:
+            self._address = value & ~SET_DDRAM_ADDRESS
+        elif value == CLEAR:
+            self.rows = [[" "] * DISPLAY_COLUMNS for _ in range(DISPLAY_ROWS)]
+            self._address = 0
+        elif value == RETURN_HOME:
+            self._address = 0
+
+
+def simulated_hardware() -> tuple[FakeGPIO, types.ModuleType]:
+    """
+    Make GPIO and smbus2 modules of simulated hardware, see hardware.use().
+    """
+    smbus = fake_smbus()
+    smbus.SMBus = SimulatedSMBus
+    return FakeGPIO(), smbus
+
+
+class Simulator:
+    """This class runs belfry in virtual time on simulated hardware.
+
+    Belfry runs in temporary directory with its own function buttons
+    states and journal, and with copies of schedule and overrides files,
+    watch shows given position when simulation starts. Simulated hardware
+    is shared by belfry modules, so only one simulation may run at a time.
+    """
+
+    def __init__(
+        self,
+        start: datetime.datetime,
+        watch_position: Optional[int] = None,
+        program_states: Optional[list[bool]] = None,
+        dropped_ticks: float = 0,
+        schedule_file: Optional[str] = SCHEDULE_FILE,
+        overrides_file: Optional[str] = None,
+    ) -> None:
+        hardware.use(hardware.SIMULATOR)
+        from watch import HOUR_HANDLE_DELAY, HOUR_HANDLE_START, watch_position_from_time
+
+        self.start = start
+        self.watch_position = watch_position
+        if watch_position is None:
+            # Watch shows the new minute only after hour handle moved.
+            self.watch_position = watch_position_from_time(
+                start
+                - datetime.timedelta(seconds=HOUR_HANDLE_START + HOUR_HANDLE_DELAY)
+            )
+        self.program_states = program_states or [False, False]
+        # Probability that published tick is dropped.
+        self.dropped_ticks = dropped_ticks
+        # Files are copied to temporary directory, None runs without the file.
+        self.schedule_file = schedule_file and os.path.abspath(schedule_file)
+        self.overrides_file = overrides_file and os.path.abspath(overrides_file)
+        self.clock = None
+        # Button presses, (virtual time, pin, duration) tuples.
+        self._presses = []
+        # List of (date and time, pin, level) tuples.
+        self.transitions = []
+        # List of (date and time, frame) tuples.
+        self.frames = []
+        # Everything belfry printed.
+        self.output = ""
+
+    def press(
+        self,
+        pin: int,
+        at: datetime.datetime,
+        duration: float = BUTTON_PRESS_DURATION,
+    ) -> None:
+        """
+        Press button, or turn switch on, at given date and time for duration.
+        """
+        self._presses.append(((at - self.start).total_seconds(), pin, duration))
+
+    def run(self, seconds: float) -> None:
+        """
+        Run belfry from the start for given virtual time.
+        """
+        import lcd1602
+        from journal import JOURNAL_FILE, position_to_string
+        from overrides import OVERRIDES_FILE
+        from schedule import BELL_SCHEDULE_FILE
+
+        gpio = hardware.GPIO
+        gpio.transitions.clear()
+        lcd1602.BUS.frames.clear()
+
+        repository = os.getcwd()
+        directory = tempfile.mkdtemp()
+        system_clock = hardware.clock
+        self.clock = VirtualClock(self.start)
+        hardware.clock = self.clock
+        output = io.StringIO()
+        loop = VirtualTimeLoop(self.clock)
+        try:
+            os.chdir(directory)
+            with open("function_buttons.txt", "w") as txt_file:
+                for state in self.program_states:
+                    txt_file.write(f"{state} {self.start:%d/%m/%y %H:%M:%S} \n")
+            with open(JOURNAL_FILE, "w") as txt_file:
+                txt_file.write(
+                    f"S {position_to_string(self.watch_position)} hour_handle\n"
+                )
+            if self.schedule_file is not None:
+                shutil.copyfile(self.schedule_file, BELL_SCHEDULE_FILE)
+            if self.overrides_file is not None:
+                shutil.copyfile(self.overrides_file, OVERRIDES_FILE)
+
+            with contextlib.redirect_stdout(output):
+                lcd1602.init(0x27, 1)
+                loop.run_until_complete(self._run(seconds))
+        finally:
+            loop.close()
+            hardware.clock = system_clock
+            os.chdir(repository)
+            shutil.rmtree(directory)
+
+        self.output = output.getvalue()
+        self.transitions = [
+            (self._datetime(wall_time), pin, level)
+            for wall_time, pin, level in gpio.transitions
+        ]
+        self.frames = list(lcd1602.BUS.frames)
+
+    async def _run(self, seconds: float) -> None:
+        from asyncio_runtime import Runtime, start_tasks
+
+        loop = asyncio.get_running_loop()
+        gpio = hardware.GPIO
+        for at, pin, duration in self._presses:
+            loop.call_at(at, gpio.set_input, pin, gpio.LOW)
+            loop.call_at(at + duration, gpio.set_input, pin, gpio.HIGH)
+
+        runtime = Runtime(InlineExecutor())
+        if self.dropped_ticks:
+            self._drop_ticks(runtime.clock)
+        tasks = start_tasks(runtime)
+        done, _ = await asyncio.wait(
+            tasks, timeout=seconds, return_when=asyncio.FIRST_EXCEPTION
+        )
+        # Tasks which belfry tasks started are stopped as well.
+        running = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        # Raise exception if any of the tasks failed.
+        for task in done:
+            task.result()
+
+    def _drop_ticks(self, clock) -> None:
+        # The same ticks are dropped in every run.
+        generator = random.Random(0)
+        publish = clock.publish
+
+        def publish_some(current_datetime: datetime.datetime) -> None:
+            if generator.random() >= self.dropped_ticks:
+                publish(current_datetime)
+
+        clock.publish = publish_some
+
+    def _datetime(self, wall_time: float) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(wall_time)
+
+    def pulses(self, pin: int) -> int:
+        """
+        Get how many times output pin was turned on.
+        """
+        return sum(
+            1
+            for _, transition_pin, level in self.transitions
+            if transition_pin == pin and level
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run belfry in virtual time.")
+    parser.add_argument(
+        "--start",
+        type=datetime.datetime.fromisoformat,
+        default=datetime.datetime.now().replace(microsecond=0),
+    )
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument(
+        "--late", type=int, default=0, help="how many minutes watch is late"
+    )
+    parser.add_argument(
+        "--drop-ticks", type=float, default=0, help="probability of dropped tick"
+    )
+    parser.add_argument("--schedule", default=SCHEDULE_FILE, help="bell schedule file")
+    parser.add_argument("--overrides", help="bell overrides file")
+    arguments = parser.parse_args()
+
+    hardware.use(hardware.SIMULATOR)
+
+    from bells import output_pins as bell_pins
+    from journal import MINUTES_ON_DIAL
+    from watch import HOUR_HANDLE, MINUTE_HANDLE
+
+    simulator = Simulator(
+        arguments.start,
+        dropped_ticks=arguments.drop_ticks,
+        schedule_file=arguments.schedule,
+        overrides_file=arguments.overrides,
+    )
+    simulator.watch_position = (
+        simulator.watch_position - arguments.late
+    ) % MINUTES_ON_DIAL
+    start_time = perf_counter()
+    simulator.run(arguments.hours * 60 * 60)
+    elapsed = perf_counter() - start_time
+
+    print(f"{arguments.hours:g} hours simulated in {elapsed:.1f}s")
+    print(
+        f"handle pulses: minute {simulator.pulses(MINUTE_HANDLE)},"
+        f" hour {simulator.pulses(HOUR_HANDLE)}"
+    )
+    for pin in bell_pins:
+        print(f"bell on pin {pin}: {simulator.pulses(pin)} ringings")
+    print(f"{len(simulator.frames)} display frames, last one:")
+    for row in simulator.frames[-1][1]:
+        print(f"  |{row}|")
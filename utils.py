@@ -3,13 +3,70 @@
 This module contains custom all purpouse utilities.
 """
 
-from time import perf_counter
+import asyncio
+import os
 
+import hardware
 
-def delay(seconds: float) -> None:
+# Processes waiting for queues wake up at least this often for housekeeping.
+HOUSEKEEPING_INTERVAL = 1  # [s]
+
+
+def delay_until(deadline: float) -> float:
+    """This function waits until monotonic clock reaches the deadline.
+
+    It sleeps until the deadline minus short guard band and then spins
+    only for the rest of the time, so CPU is not busy while waiting.
+    It returns overshoot, how many seconds passed after the deadline.
+    """
+    clock = hardware.clock
+    clock.sleep_until(deadline - clock.spin_guard)
+    now = clock.monotonic()
+    while now < deadline:
+        now = clock.monotonic()
+    return now - deadline
+
+
+async def async_delay_until(deadline: float) -> float:
+    """This function waits until monotonic clock reaches the deadline without
+    blocking the asyncio event loop for most of the time.
+
+    Only the guard band before the deadline is spent spinning.
+    It returns overshoot, how many seconds passed after the deadline.
+    """
+    clock = hardware.clock
+    remaining = deadline - clock.monotonic() - clock.spin_guard
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    return delay_until(deadline)
+
+
+def delay(seconds: float) -> float:
     """
     This function waits until the set time has passed.
+    It returns overshoot, how many seconds passed after the set time.
+    """
+    return delay_until(hardware.clock.monotonic() + seconds)
+
+
+def atomic_write(path: str, text: str, sync: bool = True) -> None:
+    """This function writes text to file atomically.
+
+    Text is written to temporary file which then replaces the old file,
+    so readers see either old or new content, and if sync is True
+    the file has either old or new content on power cut as well.
     """
-    start_time = perf_counter()
-    while perf_counter() < start_time + seconds:
-        pass
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as txt_file:
+        txt_file.write(text)
+        if sync:
+            txt_file.flush()
+            os.fsync(txt_file.fileno())
+    os.replace(temporary_path, path)
+    if sync:
+        # Rename is durable only when directory which holds the file is synced.
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
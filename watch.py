@@ -9,12 +9,26 @@ according to that there are two electric motors.
 """
 
 import datetime
+import math
 import multiprocessing
-from time import perf_counter
-
-import RPi.GPIO as GPIO
-
-from utils import delay
+import queue
+from typing import Optional
+
+import hardware
+from channels import Mailbox
+from clock import SharedClock
+from hardware import GPIO
+from journal import (
+    BOTH_HANDLES_NAME,
+    HOUR_HANDLE_NAME,
+    JOURNAL_FILE,
+    MINUTE_HANDLE_NAME,
+    MINUTES_ON_DIAL,
+    Journal,
+    position_to_string,
+)
+from metrics import Metrics
+from utils import HOUSEKEEPING_INTERVAL, delay, delay_until
 
 # Use Raspberry Pi 4B board pin numbers.
 GPIO.setmode(GPIO.BCM)
@@ -38,187 +52,496 @@ HOUR_HANDLE_DELAY = 3.07  # [s]
 MINUTE_HANDLE_START = 57  # [s]
 HOUR_HANDLE_START = 2  # [s]
 
-ONE_SECOND = 1
+# Both handles are moved at the same time in watch setup if mechanism allows it.
+CONCURRENT_CATCH_UP = True
+# Pause between two watch setup steps.
+CATCH_UP_STEP_GAP = 0.2  # [s]
 
+# Handle move command which moves both handles at the same time.
+BOTH_HANDLES = (MINUTE_HANDLE, HOUR_HANDLE)
 
-def log_minute_handle_move() -> None:
-    """
-    Log that minute handle has moved.
-    """
-    with open("handles_movement_log.txt", "w") as txt_file:
-        txt_file.write("minute_handle")
+# Names under which handle moves are recorded in the journal.
+HANDLE_NAMES = {
+    MINUTE_HANDLE: MINUTE_HANDLE_NAME,
+    HOUR_HANDLE: HOUR_HANDLE_NAME,
+    BOTH_HANDLES: BOTH_HANDLES_NAME,
+}
+
+# Commands for handle motors worker.
+MOVE = "move"
+SET_POSITION = "set_position"
+MARK_SYNCHRONIZED = "mark_synchronized"
+STOP = "stop"
 
+# Idle handle motors worker syncs the journal after this delay.
+JOURNAL_SYNC_DELAY = 0.5  # [s]
 
-def log_hour_handle_move() -> None:
+ONE_SECOND = 1
+
+
+def handle_delay(handle: int) -> float:
     """
-    Log that hour handle has moved.
+    Get how long motor of the handle has to run to move the handle.
     """
-    with open("handles_movement_log.txt", "w") as txt_file:
-        txt_file.write("hour_handle")
+    if handle == MINUTE_HANDLE:
+        return MINUTE_HANDLE_DELAY
+    return HOUR_HANDLE_DELAY
 
 
-def move_minute_handle() -> None:
+def move_minute_handle(while_moving=None) -> None:
     """
     This function sets GPIO pin to HIGH which turns on electric motor.
     Minute handle moves as long as the GPIO pin is in HIGH state.
+    Function while_moving is called after the motor is turned on.
     """
     print("-=--=- start moving: Minute handle  -=--=-")
     GPIO.output(MINUTE_HANDLE, GPIO.HIGH)
-    delay(seconds=MINUTE_HANDLE_DELAY)
+    start_time = hardware.clock.monotonic()
+    if while_moving is not None:
+        while_moving()
+    delay_until(start_time + MINUTE_HANDLE_DELAY)
     GPIO.output(MINUTE_HANDLE, GPIO.LOW)
     print("-=--=- stop moving: Minute handle  -=--=-")
-    log_minute_handle_move()
 
 
-def move_hour_handle() -> None:
+def move_hour_handle(while_moving=None) -> None:
     """
     This function sets GPIO pin to HIGH which turns on electric motor.
     Hour handle moves as long as the GPIO pin is in HIGH state.
+    Function while_moving is called after the motor is turned on.
     """
     print("-=- start moving: Hour handle -=-")
     GPIO.output(HOUR_HANDLE, GPIO.HIGH)
-    delay(HOUR_HANDLE_DELAY)
+    start_time = hardware.clock.monotonic()
+    if while_moving is not None:
+        while_moving()
+    delay_until(start_time + HOUR_HANDLE_DELAY)
     GPIO.output(HOUR_HANDLE, GPIO.LOW)
     print("-=- stop moving: Hour handle  -=-")
-    log_hour_handle_move()
 
 
-def log_last_watch_time(date_time: datetime.datetime) -> None:
+def move_both_handles(while_moving=None) -> None:
     """
-    Log recieved time to text file.
+    This function sets both GPIO pins to HIGH, so minute and hour handle
+    move at the same time. Each pin is set to LOW after its handle delay.
+    Function while_moving is called after the motors are turned on.
     """
-    with open("watch_time.txt", "w") as txt_file:
-        txt_file.write(f"{date_time.strftime('%H:%M:%S')}")
-
-
-def get_last_watch_time() -> datetime.datetime:
+    print("-=- start moving: Minute and hour handle -=-")
+    GPIO.output(MINUTE_HANDLE, GPIO.HIGH)
+    GPIO.output(HOUR_HANDLE, GPIO.HIGH)
+    start_time = hardware.clock.monotonic()
+    if while_moving is not None:
+        while_moving()
+    for handle, handle_delay in sorted(
+        [(MINUTE_HANDLE, MINUTE_HANDLE_DELAY), (HOUR_HANDLE, HOUR_HANDLE_DELAY)],
+        key=lambda handle_and_delay: handle_and_delay[1],
+    ):
+        delay_until(start_time + handle_delay)
+        GPIO.output(handle, GPIO.LOW)
+    print("-=- stop moving: Minute and hour handle -=-")
+
+
+def record_handle_move(
+    metrics: Metrics, handle, pulse_start_latency: float, on_time: float
+) -> None:
+    """
+    Record pulse start latency and motor on-time of handle move in metrics.
     """
-    Get last watch time from text file.
+    metrics.histogram(
+        "belfry_pulse_start_latency_seconds",
+        "Time between handle move request and motor start.",
+    ).observe(pulse_start_latency)
+    for pin in handle if handle == BOTH_HANDLES else (handle,):
+        metrics.counter(
+            "belfry_motor_on_seconds_total",
+            "Time for which handle motor was turned on.",
+            handle=HANDLE_NAMES[pin],
+        ).inc(on_time)
+
+
+def execute_handle_command(
+    journal: Journal,
+    command: str,
+    argument,
+    requested_at: float,
+    metrics: Optional[Metrics] = None,
+) -> float:
+    """This function executes one handle motors command and records it in the journal.
+
+    It returns pulse start latency of handle move, zero for other commands.
     """
-    with open("watch_time.txt", "r") as txt_file:
-        last_watch_time = (
-            datetime.datetime.strptime(txt_file.readline(), "%H:%M:%S")
-            .time()
-            .replace(second=0)
+    latency = 0.0
+    if command == MOVE:
+        handle_moves = {
+            MINUTE_HANDLE: move_minute_handle,
+            HOUR_HANDLE: move_hour_handle,
+            BOTH_HANDLES: move_both_handles,
+        }
+        journal.append_intent(HANDLE_NAMES[argument])
+        start_time = hardware.clock.monotonic()
+        latency = start_time - requested_at
+        # Make the intent durable while handle moves.
+        handle_moves[argument](while_moving=journal.sync)
+        if metrics is not None:
+            record_handle_move(
+                metrics, argument, latency, hardware.clock.monotonic() - start_time
+            )
+        journal.append_commit(HANDLE_NAMES[argument])
+    elif command == SET_POSITION:
+        journal.append_snapshot(argument, HOUR_HANDLE_NAME)
+    elif command == MARK_SYNCHRONIZED:
+        journal.append_snapshot(journal.state.position, HOUR_HANDLE_NAME)
+    return latency
+
+
+def handle_motors_worker(
+    journal: Journal,
+    commands: multiprocessing.Queue,
+    done: multiprocessing.Queue,
+    pulse_start_latency: multiprocessing.Value,
+    watch_position: multiprocessing.Value,
+    minute_handle_last_moved: multiprocessing.Value,
+) -> None:
+    """This is main function of handle motors worker process.
+
+    It executes commands from commands queue one by one, and reports
+    completion of the commands which are waited for, after the journal
+    is synced. Worker is the only writer of the journal, every handle
+    move is recorded in it before motor starts and after it stops.
+    Recovered state is shared with other processes, so they never read
+    the journal. Stop command closes the journal and ends the worker.
+    """
+    metrics = Metrics("handle_motors")
+    commands_depth = metrics.queue_depth("handle_commands")
+
+    while True:
+        metrics.loop_iterations.inc()
+        metrics.export()
+        # Sync the journal if there is no new command for a while.
+        timeout = JOURNAL_SYNC_DELAY if journal.unsynced else HOUSEKEEPING_INTERVAL
+        try:
+            command, argument, requested_at, report_done = commands.get(timeout=timeout)
+        except queue.Empty:
+            if journal.unsynced:
+                journal.sync()
+            continue
+        commands_depth.set(commands.qsize())
+
+        if command == STOP:
+            journal.close()
+            done.put(0.0)
+            return
+
+        latency = execute_handle_command(
+            journal, command, argument, requested_at, metrics
         )
-    return last_watch_time
+        if command == MOVE:
+            pulse_start_latency.value = latency
 
+        watch_position.value = journal.state.position
+        minute_handle_last_moved.value = (
+            journal.state.last_moved == MINUTE_HANDLE_NAME
+        )
+        if report_done:
+            # Move reported as done has to survive the exit of the process.
+            if journal.unsynced:
+                journal.sync()
+            done.put(latency)
 
-def handles_synchronized() -> bool:
-    """
-    This function checks the last movement of handles and returns True
-    if handles are synchronized and False if not.
-
-    Handle are not synchronized if some problem occurred that caused
-    the program to stop after moving the minute handle and
-    before moving hour handle.
-    In this case the hour handle did not move and now must move
-    so the handles stay synchronized.
-    """
-    try:
-        with open("handles_movement_log.txt", "r") as txt_file:
-            last_movement = txt_file.readline()
-        if last_movement == "hour_handle":
-            return True
-        elif last_movement == "minute_handle":
-            return False
-        else:
-            return True
-    except FileNotFoundError:
-        return True
 
+class HandleMotors:
+    """This class controls long-lived worker process which moves handles.
 
-def minute_handle_last_moved() -> bool:
+    Worker is started only once, so there is no process spawning
+    overhead when handle has to move. Only one process at a time may
+    wait for commands to be done. Worker is not a daemon process, it
+    keeps running after the process which started it ends, until stop()
+    is called.
     """
-    This function checks if minute handle last moved.
+
+    def __init__(self, journal_path: str = JOURNAL_FILE) -> None:
+        self._journal = Journal(journal_path)
+        self._commands = multiprocessing.Queue()
+        self._done = multiprocessing.Queue()
+        # Time between move request and pulse start of the last move.
+        self.pulse_start_latency = multiprocessing.Value("d", 0.0)
+        self._watch_position = multiprocessing.Value("i", 0)
+        self._minute_handle_last_moved = multiprocessing.Value("b", False)
+
+    def start(self) -> None:
+        """
+        Recover watch state from the journal and start worker process.
+        """
+        state = self._journal.recover()
+        self._watch_position.value = state.position
+        self._minute_handle_last_moved.value = state.last_moved == MINUTE_HANDLE_NAME
+        multiprocessing.Process(
+            target=handle_motors_worker,
+            args=(
+                self._journal,
+                self._commands,
+                self._done,
+                self.pulse_start_latency,
+                self._watch_position,
+                self._minute_handle_last_moved,
+            ),
+        ).start()
+
+    def _send(self, command: str, argument, wait: bool) -> Optional[float]:
+        self._commands.put((command, argument, hardware.clock.monotonic(), wait))
+        if wait:
+            return self._done.get()
+        return None
+
+    def move(self, handle: int, wait: bool = False) -> Optional[float]:
+        """This function requests handle move.
+
+        If wait is True it blocks until handle has moved and
+        returns pulse start latency.
+        """
+        return self._send(MOVE, handle, wait)
+
+    def set_position(self, position: int) -> None:
+        """
+        Record watch position set by hand, it blocks until it is recorded.
+        """
+        self._send(SET_POSITION, position, True)
+
+    def stop(self) -> None:
+        """
+        Stop worker after the commands given before, it blocks until journal is closed.
+        """
+        self._send(STOP, None, True)
+
+    def mark_synchronized(self) -> None:
+        """
+        Record that handles are synchronized, even though minute handle moved last.
+        """
+        self._send(MARK_SYNCHRONIZED, None, False)
+
+    def watch_position(self) -> int:
+        """
+        Get watch position, minute of 12 hours shown by handles.
+        """
+        return self._watch_position.value
+
+    def minute_handle_last_moved(self) -> bool:
+        """
+        This function checks if minute handle last moved.
+        """
+        return bool(self._minute_handle_last_moved.value)
+
+    def handles_synchronized(self) -> bool:
+        """
+        This function checks the last movement of handles and returns True
+        if handles are synchronized and False if not.
+
+        Handle are not synchronized if some problem occurred that caused
+        the program to stop after moving the minute handle and
+        before moving hour handle.
+        In this case the hour handle did not move and now must move
+        so the handles stay synchronized.
+        """
+        return not self.minute_handle_last_moved()
+
+
+def watch_position_from_time(date_time: datetime.datetime) -> int:
     """
-    try:
-        with open("handles_movement_log.txt", "r") as txt_file:
-            last_movement = txt_file.readline()
-        if last_movement == "minute_handle":
-            return True
-        else:
-            return False
-    except FileNotFoundError:
-        return True
+    Convert time to watch position, minute of 12 hours shown by handles.
+    """
+    return (date_time.hour * 60 + date_time.minute) % MINUTES_ON_DIAL
 
 
 def watch_setup(
     minutes: int,
-    last_watch_datetime: datetime.datetime,
     watch_setup_queue: multiprocessing.Queue,
+    handle_motors: HandleMotors,
+    watch_setup_mailbox: Mailbox,
 ) -> None:
     """
     This function is called when there is difference between current and
     watch time, this function calls moving hour and minute handles as many
     times as the watch is late (in minutes).
+    Every handle move is recorded in the journal by handle motors worker.
+    How many minutes is watch still late is sent to watch setup mailbox.
     """
-    iterations = 0
-
     # First check if handles moved identically in last handle movement.
-    if not handles_synchronized():
+    if not handle_motors.handles_synchronized():
         # If they not, move hour handle to synchronize them.
         print("Hour handle has not moved last time!")
         print(f"      # 0. watch setup iteration (only hour handle moves).")
-        move_hour_handle()
-        log_last_watch_time(
-            date_time=last_watch_datetime.replace(second=0)
-            + datetime.timedelta(minutes=1)
-        )
+        handle_motors.move(HOUR_HANDLE, wait=True)
         minutes = minutes - 1
         if minutes == 0:
             print("   ** Watch setup is done. **")
             watch_setup_queue.put("Watch setup is done!")
             return
 
-    # If difference is more than 12 hours, substract 12 hours.
-    if minutes > 720:  # 12 * 60 minutes = 720 minutes
-        iterations = minutes - 720
-    else:
-        iterations = minutes
+    # Watch has 12 hours dial, so it never has to move more than 12 hours.
+    iterations = minutes % MINUTES_ON_DIAL
 
     print(f"--- Required {iterations} iterations. ---")
 
     for iteration in range(iterations):
         print(f"      # {iteration + 1}. watch setup iteration.")
 
-        # Move minute handle.
-        minute_handle_process = multiprocessing.Process(target=move_minute_handle)
-        minute_handle_process.start()
-        minute_handle_process.join()
+        if CONCURRENT_CATCH_UP:
+            # Move minute and hour handle at the same time.
+            handle_motors.move(BOTH_HANDLES, wait=True)
+        else:
+            # Move minute handle.
+            handle_motors.move(MINUTE_HANDLE, wait=True)
 
-        # Move hour handle.
-        hour_handle_process = multiprocessing.Process(target=move_hour_handle)
-        hour_handle_process.start()
-        hour_handle_process.join()
+            # Move hour handle.
+            handle_motors.move(HOUR_HANDLE, wait=True)
 
-        # Log new watch time.
-        log_last_watch_time(
-            date_time=last_watch_datetime.replace(second=0)
-            + datetime.timedelta(minutes=iteration + 1)
-        )
+        watch_setup_mailbox.put(iterations - iteration - 1)
+
+        # Give the mechanism a moment before the next step.
+        if iteration + 1 < iterations:
+            delay(CATCH_UP_STEP_GAP)
 
     print("   ** Watch setup is done. **")
     watch_setup_queue.put("Watch setup is done!")
 
 
-def wait_until_next_second(counter_from_which_it_is_waiting: float) -> None:
+class TickScheduler:
+    """This class schedules watch ticks on wall-clock second boundaries.
+
+    It waits until absolute perf counter deadlines which are aligned to
+    the wall-clock second, so ticks do not drift. If the loop did not
+    manage to wait for some tick, overrun is counted and reported
+    together with skipped seconds.
     """
-    Wait one second from retrieved perf counter state.
+
+    def __init__(self) -> None:
+        # Wall-clock second of the last tick.
+        self.last_tick = None
+        self.overruns = 0
+        self.skipped_seconds = 0
+
+    def wait_for_next_tick(self) -> datetime.datetime:
+        """
+        Wait until the next wall-clock second and return its datetime.
+        """
+        deadline, tick_datetime = self.schedule_next_tick()
+        delay_until(deadline)
+        return tick_datetime
+
+    def schedule_next_tick(self) -> tuple[float, datetime.datetime]:
+        """
+        Get perf counter deadline and datetime of the next tick,
+        caller has to wait until the deadline.
+        """
+        wall_now = hardware.clock.time()
+        counter_now = hardware.clock.monotonic()
+        current_second = math.floor(wall_now)
+
+        if self.last_tick is None or current_second < self.last_tick - ONE_SECOND:
+            if self.last_tick is not None:
+                print("Wall-clock time stepped back, ticks are aligned again.")
+            next_tick = current_second + ONE_SECOND
+        else:
+            next_tick = self.last_tick + ONE_SECOND
+            if wall_now > next_tick:
+                # Loop did not finish before this tick was due.
+                self.overruns += 1
+                skipped = current_second - next_tick
+                if skipped > 0:
+                    self.skipped_seconds += skipped
+                    print(f"Watch tick overrun, skipped {skipped} seconds!")
+                    next_tick = current_second
+
+        self.last_tick = next_tick
+        return counter_now + next_tick - wall_now, datetime.datetime.fromtimestamp(
+            next_tick
+        )
+
+
+class WatchController:
+    """This class decides what watch handles have to do at every tick.
+
+    It is used by watch process and by asyncio runtime, so handle motors
+    only have to support move() without waiting and mark_synchronized().
     """
-    execution_time = perf_counter() - counter_from_which_it_is_waiting
-    if execution_time < ONE_SECOND:
-        while perf_counter() < counter_from_which_it_is_waiting + ONE_SECOND:
-            pass
+
+    def __init__(self) -> None:
+        # Flag which indicates that app is on startup.
+        self.app_on_startup = True
+        # Flag which indicates that minute handle has moved in previous iteration.
+        self.minute_handle_moved = True
+        """
+        When watch setup ends after minute handle movement and before
+        hour handle movement, hour handle moves but minute handle did not move,
+        this flag is used to track this.
+        """
+
+    def setup_needed(
+        self, current_datetime: datetime.datetime, watch_position: int
+    ) -> int:
+        """
+        Get how many minutes watch has to catch up in watch setup,
+        zero if watch setup is not needed now.
+        """
+        # Calculate how many minutes is watch late.
+        time_delta = (
+            watch_position_from_time(current_datetime) - watch_position
+        ) % MINUTES_ON_DIAL
+
+        if self.app_on_startup and time_delta > 0:
+            return time_delta
+
+        # If there is time delta go to watch setup mode,
+        # ignore time delta if watch handles are moving right now in normal mode.
+        if (
+            time_delta > 0
+            and current_datetime.second > HOUR_HANDLE_START + HOUR_HANDLE_DELAY + 1
+            and current_datetime.second < MINUTE_HANDLE_START - 1
+        ):
+            print(f"Current watch time is: {position_to_string(watch_position)}")
+            print(f"Current time is: {current_datetime.strftime('%H:%M:%S')}")
+            print(
+                f"Difference between curret time and watch time is {time_delta} minutes!"
+            )
+            print("   ** Turning to watch setup mode. **")
+            return time_delta
+        return 0
+
+    def move_handles(self, current_datetime: datetime.datetime, handle_motors) -> None:
+        """
+        Start moving handles when it is time for it.
+        """
+        # Check if is it time for minute handle moving, if it is, move minute handle.
+        if current_datetime.second == MINUTE_HANDLE_START:
+            handle_motors.move(MINUTE_HANDLE)
+
+        # Check if is it time for hour handle moving, if it is, move hour handle.
+        if current_datetime.second == HOUR_HANDLE_START:
+            if not handle_motors.minute_handle_last_moved():
+                self.minute_handle_moved = False
+            handle_motors.move(HOUR_HANDLE)
+
+        if (
+            not self.minute_handle_moved
+            and current_datetime.second > HOUR_HANDLE_START + HOUR_HANDLE_DELAY + 1
+            and current_datetime.second
+            < MINUTE_HANDLE_START - MINUTE_HANDLE_DELAY - 1
+        ):
+            # If hour handle moved but minute handle did not move, move minute handle
+            # after the hour handle has has moved.
+            handle_motors.move(MINUTE_HANDLE)
+            self.minute_handle_moved = True
+            # Record that handles are synchronized so the algorithm
+            # won't assume that they are not because minute handle moved last.
+            handle_motors.mark_synchronized()
 
 
 def watch(
-    current_datetime_for_display: multiprocessing.Queue,
-    current_datetime_for_bells: multiprocessing.Queue,
-    current_datetime_for_buttons: multiprocessing.Queue,
-    message_queue_for_display: multiprocessing.Queue,
+    shared_clock: SharedClock,
+    watch_setup_mailbox: Mailbox,
     message_queue_in: multiprocessing.Queue,
     message_queue_for_manual_watch_setup: multiprocessing.Queue,
+    handle_motors: HandleMotors,
 ) -> None:
     """This function is main watch function.
 
@@ -231,26 +554,27 @@ def watch(
     watch_is_setting = False
     # Queue for communication with watch setup process.
     watch_setup_queue = multiprocessing.Queue()
-    # Flag which indicates that app is on startup.
-    app_on_startup = True
-    # Flag which indicates that minute handle has moved in previous iteration.
-    minute_handle_moved = True
-    """
-    When watch setup ends after minute handle movement and before 
-    hour handle movement, hour handle moves but minute handle did not move,
-    this flag is used to track this.
-    """
+    # Decides when handles move and when watch setup starts.
+    watch_controller = WatchController()
+    # Ticks are aligned to the wall-clock seconds.
+    tick_scheduler = TickScheduler()
+    metrics = Metrics("watch")
+    tick_lateness = metrics.histogram(
+        "belfry_tick_lateness_seconds", "How late watch wakes up for tick."
+    )
+    catch_up_minutes = metrics.counter(
+        "belfry_catch_up_minutes_total", "Minutes caught up by watch setup."
+    )
 
     while True:
-        # Get current perf counter state, date and time.
-        loop_start_time = perf_counter()
-        current_datetime = datetime.datetime.now()
+        # Wait for the next second, get current date and time.
+        current_datetime = tick_scheduler.wait_for_next_tick()
+        tick_lateness.observe(hardware.clock.time() - tick_scheduler.last_tick)
 
-        # Send tick to other processes.
-        current_datetime_message = current_datetime.strftime("%d/%m/%y %H:%M:%S")
-        current_datetime_for_display.put(current_datetime_message)
-        current_datetime_for_bells.put(current_datetime_message)
-        current_datetime_for_buttons.put(current_datetime_message)
+        # Publish tick to other processes.
+        shared_clock.publish(current_datetime)
+        metrics.loop_iterations.inc()
+        metrics.export()
 
         if not message_queue_in.empty():
             recieved_message = message_queue_in.get()
@@ -261,102 +585,34 @@ def watch(
 
         if watch_is_setting:
             if watch_setup_queue.empty():
-                # Wait and go to next loop iteration if watch is in setup mode.
-                wait_until_next_second(counter_from_which_it_is_waiting=loop_start_time)
+                # Go to next loop iteration if watch is in setup mode.
                 continue
             else:
                 recieved_message = watch_setup_queue.get()
                 if recieved_message == "Watch setup is done!":
                     # Continue with normal work, go further in this loop.
                     watch_is_setting = False
-                    app_on_startup = False
-                    message_queue_for_display.put("Watch setup is done!")
+                    watch_controller.app_on_startup = False
+                    watch_setup_mailbox.put(None)
                     message_queue_for_manual_watch_setup.put("Watch setup is done!")
 
-        # Get last watch time.
-        last_watch_time = get_last_watch_time()
-
-        # Convert it to datetime so that current datetime and last watch time can be compared.
-        last_watch_time = datetime.datetime.combine(
-            current_datetime.date(), last_watch_time
+        time_delta = watch_controller.setup_needed(
+            current_datetime, handle_motors.watch_position()
         )
-
-        # Calculate the time difference.
-        if current_datetime < last_watch_time:
-            # If current_datetime is earlier in the day, assume that last_watch_time is from yesterday.
-            last_watch_time = datetime.datetime.combine(
-                current_datetime.date() - datetime.timedelta(days=1),
-                last_watch_time.time(),
-            )
-        time_delta = current_datetime - last_watch_time
-
-        # Convert time difference to minutes.
-        time_delta = int(time_delta.total_seconds() / 60)
-
-        if app_on_startup and time_delta > 0:
-            watch_is_setting = True
-            multiprocessing.Process(
-                target=watch_setup,
-                args=(time_delta, last_watch_time, watch_setup_queue),
-            ).start()
-            message_queue_for_display.put("Watch setup started!")
-            message_queue_for_manual_watch_setup.put("Watch setup started!")
-            wait_until_next_second(counter_from_which_it_is_waiting=loop_start_time)
-            continue
-
-        # If there is time delta go to watch setup mode,
-        # ignore time delta if watch handles are moving right now in normal mode.
-        if (
-            time_delta > 0
-            and current_datetime.second > HOUR_HANDLE_START + HOUR_HANDLE_DELAY + 1
-            and current_datetime.second < MINUTE_HANDLE_START - 1
-        ):
-            print(f"Current watch time is: {last_watch_time.strftime('%H:%M:%S')}")
-            print(f"Current time is: {current_datetime.strftime('%H:%M:%S')}")
-            print(
-                f"Difference between curret time and watch time is {time_delta} minutes!"
-            )
-            print("   ** Turning to watch setup mode. **")
+        if time_delta:
             watch_is_setting = True
+            catch_up_minutes.inc(time_delta)
+            watch_setup_mailbox.put(time_delta)
             multiprocessing.Process(
                 target=watch_setup,
-                args=(time_delta, last_watch_time, watch_setup_queue),
+                args=(
+                    time_delta,
+                    watch_setup_queue,
+                    handle_motors,
+                    watch_setup_mailbox,
+                ),
             ).start()
-            message_queue_for_display.put("Watch setup started!")
             message_queue_for_manual_watch_setup.put("Watch setup started!")
-            wait_until_next_second(counter_from_which_it_is_waiting=loop_start_time)
             continue
 
-        # Check if is it time for minute handle moving, if it is, move minute handle.
-        if int(current_datetime.strftime("%S")) == MINUTE_HANDLE_START:
-            minute_handle_process = multiprocessing.Process(target=move_minute_handle)
-            minute_handle_process.start()
-
-        # Check if is it time for hour handle moving, if it is, move hour handle.
-        if int(current_datetime.strftime("%S")) == HOUR_HANDLE_START:
-            if not minute_handle_last_moved():
-                minute_handle_moved = False
-            hour_handle_process = multiprocessing.Process(target=move_hour_handle)
-            hour_handle_process.start()
-            log_last_watch_time(
-                date_time=last_watch_time.replace(second=0)
-                + datetime.timedelta(minutes=1)
-            )
-
-        if (
-            not minute_handle_moved
-            and int(current_datetime.strftime("%S"))
-            > HOUR_HANDLE_START + HOUR_HANDLE_DELAY + 1
-            and int(current_datetime.strftime("%S"))
-            < MINUTE_HANDLE_START - MINUTE_HANDLE_DELAY - 1
-        ):
-            # If hour handle moved but minute handle did not move, move minute handle
-            # after the hour handle has has moved.
-            minute_handle_process = multiprocessing.Process(target=move_minute_handle)
-            minute_handle_process.start()
-            minute_handle_moved = True
-            # Override minute handle move log with hour handle move log so the algorithm
-            # won't assume that handles are not synchronized.
-            log_hour_handle_move()
-
-        wait_until_next_second(counter_from_which_it_is_waiting=loop_start_time)
+        watch_controller.move_handles(current_datetime, handle_motors)